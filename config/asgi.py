@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Route the plan/auth/settings endpoints to smartplan.async_views
+os.environ.setdefault('SMARTPLAN_ASYNC_VIEWS', 'true')
+# Async requests don't reuse a thread's connection, so persistent ones would pile up
+os.environ.setdefault('SMARTPLAN_DB_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -53,7 +53,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'smartplan.middleware.AsyncWhiteNoiseMiddleware',
+    'smartplan.middleware.RequestMetricsMiddleware',
+    'smartplan.middleware.ReplicaRoutingMiddleware',  # before sessions, so session saves count as writes
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,13 +91,84 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Applied by Django on every new SQLite connection (OPTIONS['init_command'])
+SMARTPLAN_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',  # readers and the writer no longer block each other
+    'synchronous': 'NORMAL',  # fsync at checkpoints only; durable enough with WAL
+    'busy_timeout': 5000,  # ms to wait for the write lock before "database is locked"
+    'mmap_size': 256 * 1024 * 1024,  # bytes of the file read through mmap
+    'cache_size': -32000,  # page cache per connection, in KiB when negative
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections (and their page cache) across requests; config/asgi.py sets 0
+        'CONN_MAX_AGE': int(os.getenv('SMARTPLAN_DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SMARTPLAN_SQLITE_PRAGMAS.items()),
+            # Take the write lock at BEGIN, so a transaction that read first
+            # waits for busy_timeout instead of failing on lock upgrade
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# Read replicas: comma-separated SQLite files kept in sync with db.sqlite3
+# outside Django (Litestream, LiteFS, ...). They are opened read-only and get
+# safe-request reads through smartplan.routers.PrimaryReplicaRouter.
+def sqlite_replica(path):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro',
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'init_command': ';'.join(
+                f'PRAGMA {name}={value}' for name, value in SMARTPLAN_SQLITE_PRAGMAS.items()
+                if name not in ('journal_mode', 'synchronous')  # can't be set on a read-only file
+            ),
+        },
+        # Tests read the test database through it instead of creating a copy
+        'TEST': {'MIRROR': 'default'},
+    }
+
+
+SMARTPLAN_DB_REPLICAS = []  # aliases in DATABASES
+for index, path in enumerate(filter(None, os.getenv('SMARTPLAN_DB_REPLICA_FILES', '').split(',')), start=1):
+    DATABASES[f'replica{index}'] = sqlite_replica(path)
+    SMARTPLAN_DB_REPLICAS.append(f'replica{index}')
+# Only routed to when listed in SMARTPLAN_DB_REPLICAS; smartplan.tests does
+DATABASES['replica'] = sqlite_replica(BASE_DIR / 'var' / 'replica.sqlite3')
+
+DATABASE_ROUTERS = ['smartplan.routers.PrimaryReplicaRouter']
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'generations': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SMARTPLAN_GENERATION_CACHE_DIR', BASE_DIR / 'var' / 'generation_cache'),
+        'TIMEOUT': 60 * 60 * 24 * 7,
+        'OPTIONS': {
+            'MAX_ENTRIES': 50000,
+        },
+    },
+    # Seen by every worker process on the host; point it at Redis/Memcached when running on several hosts
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('SMARTPLAN_SHARED_CACHE_DIR', BASE_DIR / 'var' / 'shared_cache'),
+        'TIMEOUT': None,
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -135,6 +208,10 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'frontend', 'dist'),
 ]
 
+# User uploads (logos, contact imports); kept out of the source tree
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('SMARTPLAN_MEDIA_ROOT', BASE_DIR / 'var' / 'media')
+
 # Whitenoise configuration
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
 
@@ -177,14 +254,14 @@ SESSION_COOKIE_HTTPONLY = True
 # Rest Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
+        'smartplan.authentication.CachedTokenAuthentication',
+        'smartplan.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'smartplan.renderers.JSONRenderer',
     ],
 }
 
@@ -199,3 +276,84 @@ SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 SESSION_COOKIE_AGE = 1209600  # 2 weeks
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = False  # Set to True in production
+
+# Plan generation
+SMARTPLAN_LLM_CLIENT = os.getenv('SMARTPLAN_LLM_CLIENT', 'smartplan.generation.StubLLMClient')
+SMARTPLAN_WORKER_CONCURRENCY = int(os.getenv('SMARTPLAN_WORKER_CONCURRENCY', 4))
+SMARTPLAN_JOB_TIMEOUT = int(os.getenv('SMARTPLAN_JOB_TIMEOUT', 600))  # seconds
+SMARTPLAN_BULK_PLAN_LIMIT = 1000  # max plans per POST /api/plans/bulk/
+SMARTPLAN_EXPORT_CHUNK_SIZE = 500  # plans read per query by /api/plans/export/ and export_plans
+SMARTPLAN_TOUCHPOINT_BATCH_SIZE = 500  # plans expanded into calendar touchpoints per statement
+SMARTPLAN_CALENDAR_MAX_DAYS = 92  # longest range /api/calendar/ accepts
+
+# Database write retries and replica routing
+SMARTPLAN_DB_LOCK_RETRIES = 5  # tries for writes that hit "database is locked" (smartplan.db.retry_on_lock)
+SMARTPLAN_DB_LOCK_BACKOFF = 0.05  # seconds before the first retry, doubled each time
+SMARTPLAN_DB_PIN_SECONDS = 10  # clients that write read from the primary this long
+SMARTPLAN_DB_PIN_CACHE_ALIAS = 'default'
+SMARTPLAN_DB_REPLICA_CHECK_INTERVAL = 30  # seconds between replica health checks
+SMARTPLAN_DB_PRIMARY_MODELS = ['authtoken.token', 'sessions.session']  # never read from a replica
+
+# Serve the plan/auth/settings endpoints from the async views (config/asgi.py turns this on)
+SMARTPLAN_ASYNC_VIEWS = os.getenv('SMARTPLAN_ASYNC_VIEWS', 'false').lower() == 'true'
+SMARTPLAN_PASSWORD_HASH_WORKERS = 4  # threads hashing passwords for the async auth views
+
+# Plan.content / GeneratedPlan.content compression ('zstd' needs the zstandard package)
+SMARTPLAN_COMPRESSION_CODEC = os.getenv('SMARTPLAN_COMPRESSION_CODEC', 'zlib')
+SMARTPLAN_COMPRESSION_LEVEL = 6
+SMARTPLAN_COMPRESSION_DICTIONARIES = {}  # plan_type -> path of a trained zstd dictionary
+SMARTPLAN_STUB_TOKEN_DELAY = float(os.getenv('SMARTPLAN_STUB_TOKEN_DELAY', 0))  # seconds between stub tokens
+SMARTPLAN_STREAM_FLUSH_INTERVAL = 1.0  # min seconds between Plan.content writes while streaming
+SMARTPLAN_STREAM_TICKET_MAX_AGE = 60  # seconds an ?ticket= for the stream/export URLs stays valid
+SMARTPLAN_PROMPT_CACHE_SIZE = 256  # compiled prompt templates kept in memory
+SMARTPLAN_CATALOG_CACHE_ALIAS = 'shared'  # pre-rendered /api/templates/ response; must be shared by all processes
+SMARTPLAN_SETTINGS_CACHE_ALIAS = 'shared'  # pre-rendered /api/users/settings/ responses; must be shared by all processes
+SMARTPLAN_SETTINGS_CACHE_TTL = 60 * 60  # seconds
+
+# Model response cache: in-process LRU in front of the 'generations' cache alias
+SMARTPLAN_RESPONSE_CACHE = os.getenv('SMARTPLAN_RESPONSE_CACHE', 'true').lower() == 'true'
+SMARTPLAN_RESPONSE_CACHE_ALIAS = 'generations'
+SMARTPLAN_RESPONSE_CACHE_SIZE = 1024
+SMARTPLAN_RESPONSE_CACHE_TTL = 60 * 60 * 24 * 7  # 1 week
+
+# Token authentication cache: a per-process LRU in front of a cache shared by all processes
+SMARTPLAN_AUTH_CACHE_SIZE = 10000
+SMARTPLAN_AUTH_CACHE_TTL = 60  # seconds
+SMARTPLAN_AUTH_CACHE_ALIAS = os.getenv('SMARTPLAN_AUTH_CACHE_ALIAS', 'shared') or None  # logout/deactivation reach every process
+SMARTPLAN_AUTH_CACHE_LOCAL_TTL = 5  # seconds another process may still accept a revoked token
+
+# Logo uploads: stored once per content hash, variants rendered on a background pool
+SMARTPLAN_LOGO_WORKERS = 2
+SMARTPLAN_LOGO_VARIANTS = {
+    # name: (max width, max height, format)
+    'thumbnail': (128, 128, 'PNG'),
+    'email_header': (600, 200, 'PNG'),
+    'webp': (1024, 1024, 'WEBP'),
+}
+
+# Past-client contact CSV imports, loaded on a background pool
+SMARTPLAN_CONTACT_IMPORT_WORKERS = 2
+SMARTPLAN_CONTACT_IMPORT_BATCH_SIZE = 1000  # rows validated, deduplicated and inserted together
+SMARTPLAN_CONTACT_IMPORT_MAX_BYTES = 20 * 1024 * 1024
+SMARTPLAN_CONTACT_DEFAULT_COUNTRY_CODE = '1'  # for phone numbers written without a +
+
+# Request instrumentation: Server-Timing headers, /api/metrics and sampled request logs
+SMARTPLAN_SERVER_TIMING = os.getenv('SMARTPLAN_SERVER_TIMING', 'true').lower() == 'true'
+SMARTPLAN_METRICS_TOKEN = os.getenv('SMARTPLAN_METRICS_TOKEN', '')  # /api/metrics needs "Bearer <token>"; staff only if unset
+SMARTPLAN_LOG_SAMPLE_RATE = float(os.getenv('SMARTPLAN_LOG_SAMPLE_RATE', 0.01))  # share of requests logged
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'smartplan': {
+            'handlers': ['console'],
+            'level': os.getenv('SMARTPLAN_LOG_LEVEL', 'INFO'),
+        },
+    },
+}
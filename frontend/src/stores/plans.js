@@ -2,9 +2,13 @@ import { defineStore } from 'pinia'
 import axios, { authRequest } from '@/utils/axios'
 import { useAuthStore } from './auth'
 
+// The plan list only needs card metadata, so skip the large `content` column
+const PLAN_LIST_FIELDS = 'id,title,plan_type,channels,timeline,status,created_at,updated_at'
+
 export const usePlansStore = defineStore('plans', {
   state: () => ({
     plans: [],
+    nextPlansUrl: null,
     currentPlan: null,
     isLoading: false,
     error: null
@@ -15,8 +19,9 @@ export const usePlansStore = defineStore('plans', {
       this.isLoading = true
       try {
         console.log('Fetching plans...')
-        const response = await authRequest('get', '/api/plans/')
-        this.plans = response.data
+        const response = await authRequest('get', `/api/plans/?fields=${PLAN_LIST_FIELDS}`)
+        this.plans = response.data.results
+        this.nextPlansUrl = response.data.next
         console.log('Plans fetched successfully:', this.plans.length)
         return this.plans
       } catch (error) {
@@ -28,6 +33,23 @@ export const usePlansStore = defineStore('plans', {
       }
     },
 
+    async fetchMorePlans() {
+      if (!this.nextPlansUrl) return this.plans
+      this.isLoading = true
+      try {
+        const response = await authRequest('get', this.nextPlansUrl)
+        this.plans.push(...response.data.results)
+        this.nextPlansUrl = response.data.next
+        return this.plans
+      } catch (error) {
+        console.error('Fetch more plans error:', error.response?.data || error.message)
+        this.error = error.message || 'Failed to fetch plans'
+        throw error
+      } finally {
+        this.isLoading = false
+      }
+    },
+
     async createPlan(planData) {
       this.isLoading = true
       const authStore = useAuthStore()
@@ -1,6 +1,11 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Plan, GeneratedPlan, UserProfile
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Max, Min, QuerySet
+from django.utils.functional import cached_property
+from . import search
+from .models import CustomUser, Plan, GeneratedPlan, UserProfile, GenerationJob, PlanStep
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
@@ -21,21 +26,112 @@ class CustomUserAdmin(UserAdmin):
     search_fields = ('email', 'full_name')
     ordering = ('email',)
 
-class PlanAdmin(admin.ModelAdmin):
+class EstimatedCountPaginator(Paginator):
+    """Paginator that never runs an unbounded ``COUNT(*)``.
+
+    Unfiltered changelists use the row estimate from ``sqlite_stat1`` (kept
+    by ``ANALYZE``/``PRAGMA optimize``) or, failing that, the highest primary
+    key. Filtered ones count at most ``count_limit`` matching rows, so pages
+    past the limit are not reachable; narrow the filter instead.
+    """
+
+    count_limit = 10000
+
+    def estimated_table_count(self, queryset):
+        connection = connections[queryset.db]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                try:
+                    # The first number of every stat row is the table's row count
+                    cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1',
+                                   [queryset.model._meta.db_table])
+                    row = cursor.fetchone()
+                except DatabaseError:  # never analyzed
+                    row = None
+            if row:
+                return int(row[0].split()[0])
+        return queryset.aggregate(last=Max('pk'))['last'] or 0
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            return self.estimated_table_count(queryset)
+        return queryset.order_by()[:self.count_limit].count()
+
+class IndexedRangeQuerySet(QuerySet):
+    # SQLite only answers a lone MIN() or MAX() from an index; together they
+    # scan it. date_hierarchy asks for both, so run them one at a time.
+    def aggregate(self, *args, **kwargs):
+        if not args and len(kwargs) > 1 and all(isinstance(value, (Min, Max)) for value in kwargs.values()):
+            result = {}
+            for name, value in kwargs.items():
+                result.update(super().aggregate(**{name: value}))
+            return result
+        return super().aggregate(*args, **kwargs)
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big for exact counts and FK dropdowns."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    deferred_fields = ()
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request).defer(*self.deferred_fields)
+        return IndexedRangeQuerySet(self.model, query=queryset.query, using=queryset.db)
+
+class FullTextSearchMixin:
+    """Answer the admin search box from the FTS5 index instead of LIKE scans over ``search_fields``."""
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not search.is_enabled():
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(search.match_filter(self.model, search_term)), False
+
+class PlanStepInline(admin.TabularInline):
+    model = PlanStep
+    fields = ('position', 'day_offset', 'channel', 'title', 'content')
+    extra = 0
+
+class PlanAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('title', 'user', 'created_at', 'updated_at')
     list_filter = ('created_at', 'updated_at')
+    list_select_related = ('user',)
     search_fields = ('title', 'description')
+    raw_id_fields = ('user',)
+    deferred_fields = ('content',)
+    inlines = [PlanStepInline]
 
-class GeneratedPlanAdmin(admin.ModelAdmin):
+class GeneratedPlanAdmin(FullTextSearchMixin, LargeTableAdmin):
     list_display = ('plan', 'user', 'created_at')
     list_filter = ('created_at',)
-    search_fields = ('content',)
+    list_select_related = ('plan', 'user')
+    raw_id_fields = ('plan', 'user')
+    deferred_fields = ('content', 'plan__content')
+    # Searches content and plan titles through the FTS index; these LIKE
+    # fields are only the fallback on non-SQLite databases.
+    search_fields = ('plan__title', 'user__email')
 
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ('user',)
+    list_select_related = ('user',)
     search_fields = ('user__username', 'user__email')
 
+class GenerationJobAdmin(LargeTableAdmin):
+    list_display = ('id', 'plan', 'status', 'attempts', 'worker', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    list_select_related = ('plan',)
+    deferred_fields = ('plan__content',)
+    # No plain created_at index here; the primary key follows creation order
+    date_hierarchy = None
+    ordering = ('-id',)
+    raw_id_fields = ('plan', 'template')
+
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(Plan, PlanAdmin)
 admin.site.register(GeneratedPlan, GeneratedPlanAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
+admin.site.register(GenerationJob, GenerationJobAdmin)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class SmartplanConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'smartplan'
+
+    def ready(self):
+        from . import signals  # noqa: F401
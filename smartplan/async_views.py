@@ -0,0 +1,382 @@
+"""Async versions of the plan, auth and settings endpoints for ASGI deployments.
+
+``smartplan.urls`` routes to these instead of ``views`` when
+``SMARTPLAN_ASYNC_VIEWS`` is on. Reads use the async ORM directly; writes
+that need a transaction or signal-heavy saves hop to a thread once, and
+password hashing runs on a small bounded pool so it never blocks the
+event loop. Responses match the DRF views.
+"""
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.http import HttpResponse, HttpResponseNotModified, QueryDict
+from django.http.multipartparser import MultiPartParser
+from django.middleware.csrf import get_token
+from django.utils import timezone
+from django.utils.http import parse_etags
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from rest_framework import status
+from rest_framework.authentication import CSRFCheck
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import APIException, AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+from .bulk import channel_errors
+from .generation import active_template, enqueue_generation, regenerate_changed_segments, template_options
+from .instrumentation import phase
+from .logos import logo_payload, set_user_logo
+from .models import Plan
+from .pagination import KeysetPagination
+from .renderers import JSONRenderer
+from .serializers import PlanReadSerializer, PlanSerializer
+from .settings_snapshot import (
+    BRANDING_FIELDS, BUSINESS_FIELDS, SOCIAL_FIELDS, apply_changes, aget_snapshot,
+)
+from .steps import aattach_step_content
+
+User = get_user_model()
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.SMARTPLAN_PASSWORD_HASH_WORKERS, thread_name_prefix='smartplan-hash'
+)
+
+
+async def run_hasher(func, *args):
+    """Run a password hasher call on the bounded hashing pool."""
+    return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+def parse_json(request):
+    if not request.body:
+        return {}
+    return json.loads(request.body)
+
+
+def parse_multipart(request):
+    # Django only parses multipart bodies for POST; settings uploads use PUT
+    return MultiPartParser(request.META, request, request.upload_handlers, request.encoding).parse()
+
+
+async def parse_data(request):
+    """The request body as DRF's default parsers (JSON, form, multipart) give it in ``request.data``."""
+    if request.content_type == 'multipart/form-data':
+        data, files = await sync_to_async(parse_multipart, thread_sensitive=False)(request)
+        data = data.copy()
+        data.update(files)
+        return data
+    if request.content_type == 'application/x-www-form-urlencoded':
+        return QueryDict(request.body, encoding=request.encoding)
+    return parse_json(request)
+
+
+async def authenticate(request):
+    with phase('auth'):
+        return await _authenticate(request)
+
+
+async def _authenticate(request):
+    """Return ``(user, error_response)`` from a token header or the session.
+
+    Session-authenticated unsafe requests get the same CSRF check as DRF's
+    ``SessionAuthentication``.
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        try:
+            user, _ = await CachedTokenAuthentication().aauthenticate_credentials(header[6:].strip())
+        except AuthenticationFailed as e:
+            return None, json_response({'detail': e.detail}, status.HTTP_401_UNAUTHORIZED)
+        return user, None
+
+    user = await request.auser()
+    if not user.is_authenticated or not user.is_active:
+        return None, None
+    if request.method not in SAFE_METHODS:
+        check = CSRFCheck(lambda request: None)
+        check.process_request(request)
+        reason = check.process_view(request, None, (), {})
+        if reason:
+            return None, json_response({'detail': f'CSRF Failed: {reason}'}, status.HTTP_403_FORBIDDEN)
+    return user, None
+
+
+def async_api_view(methods, authenticated=True):
+    """Minimal ``@api_view`` for async functions: method check, auth and DRF-style errors."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({'detail': f'Method "{request.method}" not allowed.'},
+                                     status.HTTP_405_METHOD_NOT_ALLOWED)
+            if authenticated:
+                user, error = await authenticate(request)
+                if error is not None:
+                    return error
+                if user is None:
+                    response = json_response({'detail': 'Authentication credentials were not provided.'},
+                                             status.HTTP_401_UNAUTHORIZED)
+                    response['WWW-Authenticate'] = 'Token'
+                    return response
+                request.user = user
+            try:
+                return await view(request, *args, **kwargs)
+            except json.JSONDecodeError as e:
+                return json_response({'detail': f'JSON parse error - {e}'}, status.HTTP_400_BAD_REQUEST)
+            except APIException as e:
+                return json_response({'detail': e.detail}, e.status_code)
+        return wrapper
+    return decorator
+
+
+@async_api_view(['POST'], authenticated=False)
+async def register_user(request):
+    try:
+        data = await parse_data(request)
+        email = data.get('email')
+        password = data.get('password')
+        full_name = data.get('full_name', '')
+
+        if not email or not password:
+            return json_response({'error': 'Email and password are required'},
+                                 status.HTTP_400_BAD_REQUEST)
+
+        if await User.objects.filter(email=email).aexists():
+            return json_response({'error': 'Email already registered'},
+                                 status.HTTP_400_BAD_REQUEST)
+
+        user = User(email=User.objects.normalize_email(email), full_name=full_name)
+        user.password = await run_hasher(make_password, password)
+        await user.asave()
+
+        token, _ = await Token.objects.aget_or_create(user=user)
+
+        return json_response({
+            'token': token.key,
+            'user': {
+                'id': user.id,
+                'email': user.email,
+                'full_name': user.full_name
+            }
+        }, status.HTTP_201_CREATED)
+
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@ensure_csrf_cookie
+@async_api_view(['POST'], authenticated=False)
+async def login_user(request):
+    data = await parse_data(request)
+    email = data.get('email')
+    password = data.get('password')
+
+    try:
+        user = await User.objects.aget(email=email)
+    except User.DoesNotExist:
+        return json_response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+
+    if not await run_hasher(check_password, password, user.password):
+        return json_response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+
+    token, _ = await Token.objects.aget_or_create(user=user)
+    response = json_response({
+        'token': token.key,
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'full_name': user.full_name
+        }
+    })
+    response['X-CSRFToken'] = get_token(request)
+    return response
+
+
+@async_api_view(['GET'])
+async def get_user(request):
+    user = request.user
+    return json_response({
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'name': f"{user.first_name} {user.last_name}".strip(),
+            'business_name': user.business_name
+        }
+    })
+
+
+@ensure_csrf_cookie
+@async_api_view(['GET', 'PUT'])
+async def user_settings(request):
+    if request.method == 'GET':
+        body, etag = await aget_snapshot(request.user.pk)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    try:
+        # Compare against the stored row, not a possibly cached request.user
+        user = await User.objects.aget(pk=request.user.pk)
+        changed = []
+        logo = None
+
+        if request.content_type == 'multipart/form-data':
+            data, files = await sync_to_async(parse_multipart, thread_sensitive=False)(request)
+            if 'branding' in data:
+                changed += apply_changes(user, json.loads(data['branding']), BRANDING_FIELDS)
+            logo = files.get('logo')
+            if logo is not None:
+                # Stored by content hash; variants and old-file cleanup run in the background
+                await sync_to_async(set_user_logo)(user, logo)
+                changed += ['logo', 'logo_asset']
+            keys = [*data.keys(), *files.keys()]
+        else:
+            data = parse_json(request)
+            if 'business' in data:
+                changed += apply_changes(user, data['business'], BUSINESS_FIELDS)
+            if 'social' in data:
+                changed += apply_changes(user, data['social'], SOCIAL_FIELDS)
+            keys = list(data.keys())
+
+        fields = [field for field in changed if field not in ('logo', 'logo_asset')]
+        if fields:
+            await user.asave(update_fields=fields)
+        response = {
+            'message': 'Settings updated successfully',
+            'updated_fields': keys,
+            'changed_fields': changed
+        }
+        if logo is not None:
+            response['branding'] = await sync_to_async(logo_payload)(user)
+        return json_response(response)
+
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+@async_api_view(['GET', 'POST'])
+async def plan_list_create(request):
+    if request.method == 'GET':
+        plans = Plan.objects.filter(user=request.user)
+
+        fields = None
+        if request.GET.get('fields'):
+            fields = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+            invalid = set(fields) - set(PlanSerializer.Meta.fields)
+            if invalid:
+                return json_response({'error': f'Invalid fields: {sorted(invalid)}. Must be among: {PlanSerializer.Meta.fields}'},
+                                     status.HTTP_400_BAD_REQUEST)
+
+        reader = PlanReadSerializer(fields)
+        rows = plans.values(*set(reader.columns()) | {'id', 'created_at'})
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(rows, request)
+        if 'content' in reader.fields:
+            await aattach_step_content(page)
+        return json_response({'next': paginator.get_next_link(), 'results': reader.many(page)})
+
+    try:
+        data = await parse_data(request)
+        plan_type = data.get('plan_type')
+        channels = data.get('channels', [])
+        timeline = data.get('timeline')
+
+        if not plan_type:
+            return json_response({'error': 'plan_type is required'}, status.HTTP_400_BAD_REQUEST)
+        if not channels:
+            return json_response({'error': 'channels is required'}, status.HTTP_400_BAD_REQUEST)
+        if not timeline:
+            return json_response({'error': 'timeline is required'}, status.HTTP_400_BAD_REQUEST)
+        if channel_errors(channels):
+            return json_response({'error': channel_errors(channels)[0]}, status.HTTP_400_BAD_REQUEST)
+        if plan_type not in [choice[0] for choice in Plan.PLAN_TYPES]:
+            return json_response({'error': f'Invalid plan_type. Must be one of: {[choice[0] for choice in Plan.PLAN_TYPES]}'},
+                                 status.HTTP_400_BAD_REQUEST)
+        if timeline not in [choice[0] for choice in Plan.TIMELINE_CHOICES]:
+            return json_response({'error': f'Invalid timeline. Must be one of: {[choice[0] for choice in Plan.TIMELINE_CHOICES]}'},
+                                 status.HTTP_400_BAD_REQUEST)
+        try:
+            template = await sync_to_async(active_template)(data.get('template'))
+            options = await sync_to_async(template_options)(template, data.get('options'))
+        except ValueError as e:
+            return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+        plan = await Plan.objects.acreate(
+            user=request.user,
+            title=f"New SmartPlan - {timezone.now().strftime('%B %d, %Y')}",
+            plan_type=plan_type,
+            channels=channels,
+            timeline=timeline,
+            template=template,
+            options=options,
+            status='draft'
+        )
+        bypass_cache = str(data.get('bypass_cache', '')).lower() in ('1', 'true', 'yes')
+        await sync_to_async(enqueue_generation)(plan, template, bypass_cache=bypass_cache)
+
+        return json_response({
+            'id': plan.id,
+            'title': plan.title,
+            'plan_type': plan.plan_type,
+            'channels': plan.channels,
+            'timeline': plan.timeline,
+            'template': plan.template_id,
+            'options': plan.options,
+            'status': plan.status,
+            'created_at': plan.created_at,
+            'message': 'Plan created successfully'
+        }, status.HTTP_201_CREATED)
+
+    except Exception as e:
+        return json_response({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+
+
+def update_plan(plan, data):
+    """The PUT half of ``plan_detail``; runs in a thread because it writes in transactions."""
+    previous = plan.status, plan.channels, plan.timeline
+    serializer = PlanSerializer(plan, data=data, partial=True)
+    if not serializer.is_valid():
+        return serializer.errors, status.HTTP_400_BAD_REQUEST
+    plan = serializer.save()
+    if previous[0] == 'completed' and 'content' not in serializer.validated_data:
+        regenerate_changed_segments(plan, previous[1], previous[2])
+    return serializer.data, status.HTTP_200_OK
+
+
+@async_api_view(['GET', 'PUT', 'DELETE'])
+async def plan_detail(request, plan_id):
+    if request.method == 'GET':
+        reader = PlanReadSerializer()
+        row = await Plan.objects.filter(id=plan_id, user=request.user).values(*reader.columns()).afirst()
+        if row is None:
+            return json_response({'message': 'Plan not found'}, status.HTTP_404_NOT_FOUND)
+        await aattach_step_content([row])
+        return json_response(reader.to_representation(row))
+
+    try:
+        plan = await Plan.objects.aget(id=plan_id, user=request.user)
+    except Plan.DoesNotExist:
+        return json_response({'message': 'Plan not found'}, status.HTTP_404_NOT_FOUND)
+
+    if request.method == 'PUT':
+        data, code = await sync_to_async(update_plan)(plan, await parse_data(request))
+        return json_response(data, code)
+
+    await plan.adelete()
+    return HttpResponse(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,144 @@
+import copy
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import authentication, exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .caching import LRUCache
+from .instrumentation import phase
+
+
+class TokenCache:
+    """``token key -> (user, token)`` cache used by ``CachedTokenAuthentication``.
+
+    Entries live in a bounded in-process LRU with a TTL. When
+    ``SMARTPLAN_AUTH_CACHE_ALIAS`` names a Django cache, it is used as a
+    shared second tier so invalidations reach every process; local entries
+    then only live ``local_ttl`` seconds, which bounds how long another
+    process can serve a stale entry. Every caller gets its own copy of the
+    user and token, so one request can't change another's.
+    """
+
+    def __init__(self, maxsize, ttl, alias=None, local_ttl=None):
+        self.ttl = ttl
+        self.alias = alias
+        self.local = LRUCache(maxsize, local_ttl if alias and local_ttl is not None else ttl)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'invalidations': 0}
+
+    @property
+    def shared(self):
+        return caches[self.alias] if self.alias else None
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    @staticmethod
+    def shared_key(key):
+        # Never put raw tokens into an external cache
+        return 'auth-token:' + hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def copied(entry):
+        user, token = copy.copy(entry[0]), copy.copy(entry[1])
+        token.user = user
+        return user, token
+
+    def get(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('hits')
+            return self.copied(entry)
+        if self.shared is not None:
+            entry = self.shared.get(self.shared_key(key))
+            if entry is not None:
+                self._count('shared_hits')
+                self.local.set(key, entry)
+                return self.copied(entry)
+        self._count('misses')
+        return None
+
+    def set(self, key, entry):
+        self.local.set(key, self.copied(entry))
+        if self.shared is not None:
+            self.shared.set(self.shared_key(key), entry, timeout=self.ttl)
+
+    def invalidate(self, *keys):
+        for key in keys:
+            self.local.delete(key)
+        if self.shared is not None and keys:
+            self.shared.delete_many([self.shared_key(key) for key in keys])
+        self._count('invalidations', len(keys))
+
+    def invalidate_user(self, user_id):
+        self.local.delete_where(lambda entry: entry[0].pk == user_id)
+        self.invalidate(*Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+    def clear(self):
+        self.local.clear()
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = 0
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, entries=len(self.local))
+        lookups = stats['hits'] + stats['shared_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['hits'] + stats['shared_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+token_cache = TokenCache(
+    maxsize=settings.SMARTPLAN_AUTH_CACHE_SIZE,
+    ttl=settings.SMARTPLAN_AUTH_CACHE_TTL,
+    alias=settings.SMARTPLAN_AUTH_CACHE_ALIAS,
+    local_ttl=settings.SMARTPLAN_AUTH_CACHE_LOCAL_TTL,
+)
+
+
+class TimedAuthentication:
+    """Counts time spent in ``authenticate`` as the request's ``auth`` phase."""
+
+    def authenticate(self, request):
+        with phase('auth'):
+            return super().authenticate(request)
+
+
+class SessionAuthentication(TimedAuthentication, authentication.SessionAuthentication):
+    pass
+
+
+class CachedTokenAuthentication(TimedAuthentication, TokenAuthentication):
+    """``TokenAuthentication`` that skips the Token/User join for recently seen tokens.
+
+    Cached entries are dropped when a token is deleted (logout) and whenever
+    its user is saved, which covers deactivation.
+    """
+
+    def authenticate_credentials(self, key):
+        entry = token_cache.get(key)
+        if entry is not None:
+            return entry
+        entry = super().authenticate_credentials(key)
+        token_cache.set(key, entry)
+        return entry
+
+    async def aauthenticate_credentials(self, key):
+        """Async variant for plain async views; cache hits never leave the event loop."""
+        entry = token_cache.get(key)
+        if entry is not None:
+            return entry
+        try:
+            token = await Token.objects.select_related('user').aget(key=key)
+        except Token.DoesNotExist:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        entry = (token.user, token)
+        token_cache.set(key, entry)
+        return entry
@@ -0,0 +1,162 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .. import schedule
+from ..catalog import invalidate_catalog
+from ..models import Contact, ContactImport, CustomUser, GeneratedPlan, Plan, PlanStep, Template, TemplateOption
+from ..steps import plan_segments, sections_to_steps, segment_title
+
+PASSWORD = 'benchmark-password'
+WORDS = (
+    'market home buyer seller listing neighborhood open house closing client referral '
+    'update value offer price tour follow staging mortgage appraisal inspection'
+).split()
+
+
+class Dataset:
+    """Ids and credentials of a seeded benchmark dataset."""
+
+    def __init__(self):
+        self.users = []  # (user_id, email, token)
+        self.admin_token = None
+        self.plans = {}  # user_id -> [plan_id]
+        self.imports = []  # (token, plan_id, contact import id), one per user
+        self.template_ids = []
+        self.counts = {}
+
+    def user(self, i):
+        return self.users[i % len(self.users)]
+
+    def plan(self, i):
+        user_id, email, token = self.user(i)
+        plans = self.plans[user_id]
+        return token, plans[(i // len(self.users)) % len(plans)]
+
+    def contact_import(self, i):
+        return self.imports[i % len(self.imports)]
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def plan_sections(rng, channels, timeline):
+    return [
+        {'title': segment_title(day, channel), 'content': ' '.join(sentence(rng) for _ in range(4)),
+         'day_offset': day, 'channel': channel}
+        for day, channel in plan_segments(channels, timeline)
+    ]
+
+
+def create_users(count, prefix='bench', rng=None):
+    """Create ``count`` users sharing one password hash, each with an API token."""
+    password = make_password(PASSWORD)
+    users = CustomUser.objects.bulk_create([
+        CustomUser(email=f'{prefix}-{i}@example.com', full_name=f'Benchmark User {i}', password=password,
+                   business_name=f'Realty {i}', target_market=sentence(rng) if rng else '')
+        for i in range(count)
+    ])
+    tokens = Token.objects.bulk_create([Token(user=user, key=Token.generate_key()) for user in users])
+    return [(user.pk, user.email, token.key) for user, token in zip(users, tokens)]
+
+
+def create_plans(user_ids, count, rng, generated_per_plan=0):
+    """Create ``count`` completed plans per user with their steps and generated versions."""
+    channel_names = [choice[0] for choice in Plan.CHANNEL_CHOICES]
+    plans = []
+    sections = []
+    for user_id in user_ids:
+        for i in range(count):
+            channels = rng.sample(channel_names, rng.randint(1, len(channel_names)))
+            timeline = rng.choice(['30days', '60days', '90days'])
+            plans.append(Plan(
+                user_id=user_id, title=f'{rng.choice(WORDS).title()} campaign {i}', description=sentence(rng),
+                plan_type=rng.choice(['past-clients', 'open-house']), channels=channels,
+                timeline=timeline, status='completed',
+            ))
+            sections.append(plan_sections(rng, channels, timeline))
+
+    plans = Plan.objects.bulk_create(plans, batch_size=500)
+    PlanStep.objects.bulk_create(
+        [step for plan, parts in zip(plans, sections) for step in sections_to_steps(plan, parts)],
+        batch_size=1000,
+    )
+    generated = GeneratedPlan.objects.bulk_create([
+        GeneratedPlan(user_id=plan.user_id, plan=plan, content='\n\n'.join(
+            f"## {section['title']}\n{section['content']}" for section in parts
+        ))
+        for plan, parts in zip(plans, sections)
+        for _ in range(generated_per_plan)
+    ], batch_size=500)
+    # bulk_create skips the signal that keeps touchpoints current
+    schedule.expand_plans([plan.pk for plan in plans])
+    return plans
+
+
+def contacts_csv(rows, prefix='contact'):
+    lines = ['First Name,Last Name,Email,Phone']
+    lines += [f'Client,{i},{prefix}-{i}@example.com,+1415555{i:04d}' for i in range(rows)]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def create_contacts(plans, count):
+    """Add ``count`` imported contacts to each of ``plans``, with the completed import that loaded them."""
+    Contact.objects.bulk_create([
+        Contact(plan=plan, first_name='Client', last_name=str(i), email=f'contact-{i}@example.com',
+                phone=f'+1415555{i:04d}')
+        for plan in plans for i in range(count)
+    ], batch_size=1000)
+    size = len(contacts_csv(count))
+    return ContactImport.objects.bulk_create([
+        ContactImport(plan=plan, size=size, status='completed', processed_rows=count, processed_bytes=size,
+                      created_count=count)
+        for plan in plans
+    ])
+
+
+def seed(users=10, plans_per_user=20, generated_per_plan=1, templates=5, seed=0, contacts_per_plan=50):
+    """Fill an empty database with a synthetic, reproducible dataset."""
+    rng = random.Random(seed)
+    dataset = Dataset()
+    with transaction.atomic():
+        created = Template.objects.bulk_create([
+            Template(name=f'Template {i}', description=sentence(rng),
+                     prompt_template='Write a {timeline} {plan_type} plan for {business_name}.')
+            for i in range(templates)
+        ])
+        TemplateOption.objects.bulk_create([
+            TemplateOption(template=template, name=f'option-{j}', description=sentence(rng, 6),
+                           option_type='text', default_value='')
+            for template in created for j in range(3)
+        ])
+        dataset.template_ids = [template.pk for template in created]
+
+        dataset.users = create_users(users, rng=rng)
+        admin = CustomUser.objects.create_superuser(email='bench-admin@example.com', password=PASSWORD)
+        dataset.admin_token = Token.objects.create(user=admin).key
+
+        plans = create_plans([user_id for user_id, _, _ in dataset.users], plans_per_user, rng, generated_per_plan)
+        for plan in plans:
+            dataset.plans.setdefault(plan.user_id, []).append(plan.pk)
+
+        # Each user's first plan takes the contact scenarios, which need a past-clients plan
+        first_plans = [plan for plan in plans if plan.pk == dataset.plans[plan.user_id][0]]
+        Plan.objects.filter(pk__in=[plan.pk for plan in first_plans]).update(plan_type='past-clients')
+        tokens = {user_id: token for user_id, _, token in dataset.users}
+        dataset.imports = [
+            (tokens[job.plan.user_id], job.plan_id, job.pk) for job in create_contacts(first_plans, contacts_per_plan)
+        ]
+        invalidate_catalog()
+
+    dataset.counts = {
+        'users': users,
+        'plans': len(plans),
+        'plan_steps': PlanStep.objects.count(),
+        'generated_plans': GeneratedPlan.objects.count(),
+        'contacts': Contact.objects.count(),
+        'templates': templates,
+    }
+    return dataset
@@ -0,0 +1,203 @@
+import json
+import statistics
+import subprocess
+import threading
+import time
+import warnings
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import django
+from django.conf import settings
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.db import connection
+from django.test import Client
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.test.testcases import LiveServerThread
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+RESULTS_VERSION = 1
+
+# The stream endpoint is an async view; sync clients collect its events in one go
+warnings.filterwarnings('ignore', message='StreamingHttpResponse must consume asynchronous iterators')
+
+
+def encode_body(data, multipart=False):
+    """``(body, content_type)`` of a request; ``multipart`` sends ``data`` as form fields and files."""
+    if multipart:
+        return encode_multipart(BOUNDARY, data), MULTIPART_CONTENT
+    return (json.dumps(data).encode() if data is not None else b''), 'application/json'
+
+
+class ClientTransport:
+    """Requests through Django's test client, counting the queries each one runs."""
+
+    name = 'client'
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def request(self, method, path, data, token, multipart=False):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client()
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        body, content_type = encode_body(data, multipart)
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.generic(method, path, body, content_type=content_type, headers=headers)
+            if response.streaming:
+                b''.join(response)
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, len(queries)
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """Requests over HTTP to a threaded WSGI server started in this process.
+
+    Queries run on the server's threads, so they are not counted.
+    """
+
+    name = 'server'
+
+    def __init__(self):
+        self.server = LiveServerThread('localhost', StaticFilesHandler)
+        self.server.daemon = True
+        self.server.start()
+        self.server.is_ready.wait()
+        if self.server.error:
+            raise self.server.error
+        self.base_url = f'http://localhost:{self.server.port}'
+
+    def request(self, method, path, data, token, multipart=False):
+        body, content_type = encode_body(data, multipart)
+        headers = {'Content-Type': content_type}
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        started = time.perf_counter()
+        try:
+            with urlopen(Request(self.base_url + path, data=body or None, headers=headers, method=method)) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        return status, time.perf_counter() - started, None
+
+    def close(self):
+        self.server.terminate()
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def run_scenario(scenario, dataset, transport, requests, concurrency, warmup=0):
+    """Drive one scenario with ``concurrency`` clients and summarize it."""
+    requests = min(requests, scenario.max_requests or requests)
+    state = scenario.prepare(dataset, warmup + requests) if scenario.prepare else None
+    calls = [scenario.build(dataset, i, state) for i in range(warmup + requests)]
+
+    def call(args):
+        return transport.request(scenario.method, *args, multipart=scenario.multipart)
+
+    for args in calls[:warmup]:
+        call(args)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(call, calls[warmup:]))
+    elapsed = time.perf_counter() - started
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [seconds * 1000 for _, seconds, _ in results]
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'name': scenario.name,
+        'route': scenario.url_name,
+        'method': scenario.method,
+        'requests': len(results),
+        'concurrency': concurrency,
+        'errors': sum(count for status, count in statuses.items() if status != scenario.expected),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput': round(len(results) / elapsed, 2),
+        'latency_ms': {
+            'mean': round(statistics.mean(latencies), 3),
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies), 3),
+        },
+        'queries': {
+            'mean': round(statistics.mean(queries), 2),
+            'max': max(queries),
+        } if queries else None,
+    }
+
+
+def git_revision():
+    """``(commit, dirty)`` of the checkout, or ``(None, None)`` outside git."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        changes = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                                 capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(changes)
+
+
+def build_report(results, dataset, transport, options):
+    commit, dirty = git_revision()
+    return {
+        'version': RESULTS_VERSION,
+        'commit': commit,
+        'dirty': dirty,
+        'created_at': timezone.now().isoformat(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'transport': transport.name,
+        'options': options,
+        'dataset': dataset.counts,
+        'scenarios': results,
+    }
+
+
+def default_output_path(report):
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S')
+    commit = (report['commit'] or 'nogit')[:10] + ('-dirty' if report['dirty'] else '')
+    return Path(settings.BASE_DIR) / 'var' / 'benchmarks' / f'api-{stamp}-{commit}.json'
+
+
+def write_report(report, path=None):
+    path = Path(path) if path else default_output_path(report)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    return path
+
+
+def compare_reports(baseline, current):
+    """Yield ``(name, metric, before, after, change)`` for scenarios in both reports."""
+    before = {(s['name'], s['method']): s for s in baseline['scenarios']}
+    for scenario in current['scenarios']:
+        old = before.get((scenario['name'], scenario['method']))
+        if old is None:
+            continue
+        for metric, get in (
+            ('req/s', lambda s: s['throughput']),
+            ('p50 ms', lambda s: s['latency_ms']['p50']),
+            ('p99 ms', lambda s: s['latency_ms']['p99']),
+            ('queries', lambda s: s['queries']['mean'] if s['queries'] else None),
+        ):
+            a, b = get(old), get(scenario)
+            if a is None or b is None:
+                continue
+            change = (b - a) / a * 100 if a else 0.0
+            yield scenario['name'], metric, a, b, change
@@ -0,0 +1,159 @@
+import random
+import uuid
+from datetime import timedelta
+
+from django.core.files.base import ContentFile
+from django.urls import URLPattern, URLResolver, reverse
+from django.utils import timezone
+
+from .. import urls
+from .dataset import PASSWORD, WORDS, contacts_csv, create_plans, create_users
+
+
+class Scenario:
+    """One benchmarked request shape against a named route.
+
+    ``build(dataset, i, state)`` returns ``(path, data, token)`` for the
+    ``i``-th request; ``prepare(dataset, count)`` creates anything the
+    requests consume (rows to delete, tokens to log out) and its return value
+    is passed to ``build`` as ``state``.
+    """
+
+    def __init__(self, name, url_name, method, build, expected=200, prepare=None, max_requests=None, multipart=False):
+        self.name = name
+        self.url_name = url_name
+        self.method = method
+        self.build = build
+        self.expected = expected
+        self.prepare = prepare
+        # Caps endpoints that are slow by design (password hashing) so a run stays short
+        self.max_requests = max_requests
+        self.multipart = multipart  # send the data as a form with files instead of JSON
+
+
+def user_get(url_name):
+    def build(dataset, i, state):
+        return reverse(url_name), None, dataset.user(i)[2]
+    return build
+
+
+def plan_get(url_name, query=''):
+    def build(dataset, i, state):
+        token, plan_id = dataset.plan(i)
+        return reverse(url_name, kwargs={'plan_id': plan_id}) + query, None, token
+    return build
+
+
+def new_plan_spec(i):
+    return {'plan_type': 'past-clients', 'channels': ['email', 'text'], 'timeline': '30days', 'title': f'Bench plan {i}'}
+
+
+def plan_update(dataset, i, state):
+    token, plan_id = dataset.plan(i)
+    return reverse('plan-detail', kwargs={'plan_id': plan_id}), {'title': f'Renamed plan {i}'}, token
+
+
+def contact_import_detail(dataset, i, state):
+    token, plan_id, import_id = dataset.contact_import(i)
+    return reverse('contact-import-detail', kwargs={'plan_id': plan_id, 'import_id': import_id}), None, token
+
+
+def contact_upload(dataset, i, state):
+    token, plan_id, _ = dataset.contact_import(i)
+    upload = ContentFile(contacts_csv(20, prefix=f'upload-{i}'), name='contacts.csv')
+    return reverse('contact-import', kwargs={'plan_id': plan_id}), {'file': upload}, token
+
+
+def prepare_logout(dataset, count):
+    return create_users(count, prefix=f'bench-logout-{uuid.uuid4().hex[:8]}')
+
+
+def prepare_delete(dataset, count):
+    user_ids = [user_id for user_id, _, _ in dataset.users]
+    tokens = {user_id: token for user_id, _, token in dataset.users}
+    per_user = -(-count // len(user_ids))
+    plans = create_plans(user_ids, per_user, random.Random(count))
+    return [(tokens[plan.user_id], plan.pk) for plan in plans]
+
+
+SCENARIOS = [
+    Scenario('api root', 'api-root', 'GET', user_get('api-root')),
+    Scenario('template list', 'template-list', 'GET', user_get('template-list')),
+    Scenario('template detail', 'template-detail', 'GET', lambda dataset, i, state: (
+        reverse('template-detail', kwargs={'pk': dataset.template_ids[i % len(dataset.template_ids)]}),
+        None, dataset.user(i)[2],
+    )),
+    Scenario('csrf', 'csrf', 'GET', lambda dataset, i, state: (reverse('csrf'), None, None)),
+    Scenario('register', 'register', 'POST', lambda dataset, i, state: (
+        reverse('register'), {'email': f'bench-register-{state}-{i}@example.com', 'password': PASSWORD}, None,
+    ), expected=201, prepare=lambda dataset, count: uuid.uuid4().hex[:8], max_requests=50),
+    Scenario('login', 'login', 'POST', lambda dataset, i, state: (
+        reverse('login'), {'email': dataset.user(i)[1], 'password': PASSWORD}, None,
+    ), max_requests=50),
+    Scenario('logout', 'logout', 'POST', lambda dataset, i, state: (
+        reverse('logout'), None, state[i][2],
+    ), prepare=prepare_logout),
+    Scenario('current user', 'user', 'GET', user_get('user')),
+    Scenario('settings', 'user_settings', 'GET', user_get('user_settings')),
+    Scenario('settings update', 'user_settings', 'PUT', lambda dataset, i, state: (
+        reverse('user_settings'), {'business': {'name': f'Realty {i}', 'phone': str(i)}}, dataset.user(i)[2],
+    )),
+    Scenario('plan list', 'plan-list-create', 'GET', user_get('plan-list-create')),
+    Scenario('plan list (sparse)', 'plan-list-create', 'GET', lambda dataset, i, state: (
+        reverse('plan-list-create') + '?fields=id,title,status&limit=100', None, dataset.user(i)[2],
+    )),
+    Scenario('plan create', 'plan-list-create', 'POST', lambda dataset, i, state: (
+        reverse('plan-list-create'), new_plan_spec(i), dataset.user(i)[2],
+    ), expected=201),
+    Scenario('plan search', 'plan-search', 'GET', lambda dataset, i, state: (
+        reverse('plan-search') + f'?q={WORDS[i % len(WORDS)]}', None, dataset.user(i)[2],
+    )),
+    Scenario('plan bulk create', 'plan-bulk-create', 'POST', lambda dataset, i, state: (
+        reverse('plan-bulk-create'), {'plans': [new_plan_spec(i * 10 + j) for j in range(10)]}, dataset.user(i)[2],
+    ), expected=201),
+    Scenario('plan export', 'plan-export', 'GET', user_get('plan-export')),
+    Scenario('plan export (csv, gzip)', 'plan-export', 'GET', lambda dataset, i, state: (
+        reverse('plan-export') + '?format=csv&gzip=1', None, dataset.user(i)[2],
+    )),
+    Scenario('plan detail', 'plan-detail', 'GET', plan_get('plan-detail')),
+    Scenario('plan update', 'plan-detail', 'PUT', plan_update),
+    Scenario('plan delete', 'plan-detail', 'DELETE', lambda dataset, i, state: (
+        reverse('plan-detail', kwargs={'plan_id': state[i][1]}), None, state[i][0],
+    ), expected=204, prepare=prepare_delete),
+    Scenario('plan steps', 'plan-steps', 'GET', plan_get('plan-steps')),
+    Scenario('plan steps (one channel)', 'plan-steps', 'GET', plan_get('plan-steps', '?channel=email&day_to=13')),
+    Scenario('plan stream (replay)', 'plan-stream', 'GET', plan_get('plan-stream')),
+    Scenario('stream ticket', 'stream-ticket', 'POST', lambda dataset, i, state: (
+        reverse('stream-ticket'), {}, dataset.user(i)[2],
+    )),
+    Scenario('plan contacts', 'plan-contacts', 'GET', lambda dataset, i, state: (
+        reverse('plan-contacts', kwargs={'plan_id': dataset.contact_import(i)[1]}), None, dataset.contact_import(i)[0],
+    )),
+    Scenario('contact import detail', 'contact-import-detail', 'GET', contact_import_detail),
+    Scenario('calendar (week)', 'calendar', 'GET', user_get('calendar')),
+    Scenario('calendar (quarter, one channel)', 'calendar', 'GET', lambda dataset, i, state: (
+        reverse('calendar') + '?end=' + (timezone.localdate() + timedelta(days=90)).isoformat() + '&channel=email',
+        None, dataset.user(i)[2],
+    )),
+    Scenario('cache stats', 'cache-stats', 'GET', lambda dataset, i, state: (
+        reverse('cache-stats'), None, dataset.admin_token,
+    )),
+    Scenario('metrics', 'metrics', 'GET', lambda dataset, i, state: (reverse('metrics'), None, dataset.admin_token)),
+    # Last: the queued imports keep writing in the background after their requests return
+    Scenario('contact import', 'contact-import', 'POST', contact_upload, expected=202, multipart=True),
+]
+
+
+def route_names(patterns=None):
+    names = set()
+    for pattern in urls.urlpatterns if patterns is None else patterns:
+        if isinstance(pattern, URLResolver):
+            names |= route_names(pattern.url_patterns)
+        elif isinstance(pattern, URLPattern) and pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def uncovered_routes():
+    """Names of routes in ``smartplan.urls`` that no scenario exercises."""
+    return sorted(route_names() - {scenario.url_name for scenario in SCENARIOS})
@@ -0,0 +1,118 @@
+from django.db import transaction
+from django.utils import timezone
+
+from . import schedule
+from .db import retry_on_lock
+from .generation import enqueue_generations, template_options
+from .models import Plan, Template
+
+PLAN_TYPES = frozenset(choice[0] for choice in Plan.PLAN_TYPES)
+TIMELINES = frozenset(choice[0] for choice in Plan.TIMELINE_CHOICES)
+CHANNELS = frozenset(choice[0] for choice in Plan.CHANNEL_CHOICES)
+TITLE_MAX_LENGTH = Plan._meta.get_field('title').max_length
+
+
+def channel_errors(channels):
+    """Messages for a ``channels`` value that is not a list of known channel names (empty if it is)."""
+    if not isinstance(channels, list):
+        return ['Channels must be a list']
+    return [f'Invalid channel: {channel}' for channel in channels if not isinstance(channel, str) or channel not in CHANNELS]
+
+
+def validate_plan_spec(spec, templates=None):
+    """Return ``(cleaned, errors)`` for one bulk plan spec; ``templates`` maps id -> active ``Template``."""
+    if not isinstance(spec, dict):
+        return None, {'non_field_errors': ['Each plan must be an object']}
+
+    errors = {}
+    plan_type = spec.get('plan_type')
+    timeline = spec.get('timeline')
+    channels = spec.get('channels')
+    title = spec.get('title')
+    description = spec.get('description', '')
+    template = spec.get('template')
+
+    if not plan_type:
+        errors['plan_type'] = ['plan_type is required']
+    elif not isinstance(plan_type, str) or plan_type not in PLAN_TYPES:
+        errors['plan_type'] = [f'Invalid plan_type. Must be one of: {sorted(PLAN_TYPES)}']
+
+    if not timeline:
+        errors['timeline'] = ['timeline is required']
+    elif not isinstance(timeline, str) or timeline not in TIMELINES:
+        errors['timeline'] = [f'Invalid timeline. Must be one of: {sorted(TIMELINES)}']
+
+    if not channels:
+        errors['channels'] = ['channels is required']
+    elif channel_errors(channels):
+        errors['channels'] = channel_errors(channels)
+
+    if title is not None and (not isinstance(title, str) or len(title) > TITLE_MAX_LENGTH):
+        errors['title'] = [f'title must be a string of at most {TITLE_MAX_LENGTH} characters']
+    if not isinstance(description, str):
+        errors['description'] = ['description must be a string']
+    if template is not None and (
+        not isinstance(template, int) or isinstance(template, bool) or template not in (templates or {})
+    ):
+        errors['template'] = [f'Invalid template: {template!r}']
+    else:
+        try:
+            options = template_options((templates or {}).get(template), spec.get('options'))
+        except ValueError as e:
+            errors['options'] = [str(e)]
+
+    if errors:
+        return None, errors
+    return {
+        'plan_type': plan_type,
+        'timeline': timeline,
+        'channels': channels,
+        'title': title,
+        'description': description,
+        'template': (templates or {}).get(template),
+        'options': options,
+    }, None
+
+
+@retry_on_lock
+def bulk_create_plans(user, specs, generate=True):
+    """Validate every spec, then insert all valid ones with one ``bulk_create``.
+
+    Returns ``(plans, errors)`` where ``errors`` is a list of
+    ``{'index': i, 'errors': {...}}`` for the rejected specs.
+    """
+    default_title = f"New SmartPlan - {timezone.now().strftime('%B %d, %Y')}"
+    template_ids = {
+        spec['template'] for spec in specs
+        if isinstance(spec, dict) and isinstance(spec.get('template'), int) and not isinstance(spec['template'], bool)
+    }
+    templates = (
+        Template.objects.filter(is_active=True).prefetch_related('options').in_bulk(template_ids)
+        if template_ids else {}
+    )
+    plans = []
+    errors = []
+    for index, spec in enumerate(specs):
+        cleaned, spec_errors = validate_plan_spec(spec, templates)
+        if spec_errors:
+            errors.append({'index': index, 'errors': spec_errors})
+            continue
+        plans.append(Plan(
+            user=user,
+            title=cleaned['title'] or default_title,
+            description=cleaned['description'],
+            plan_type=cleaned['plan_type'],
+            channels=cleaned['channels'],
+            timeline=cleaned['timeline'],
+            template=cleaned['template'],
+            options=cleaned['options'],
+            status='generating' if generate else 'draft',
+        ))
+
+    if plans:
+        with transaction.atomic():
+            plans = Plan.objects.bulk_create(plans)
+            schedule.expand_plans([plan.pk for plan in plans])
+            if generate:
+                enqueue_generations(plans)
+    return plans, errors
@@ -0,0 +1,35 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.renderers import JSONRenderer
+
+from .models import Template
+from .serializers import TemplateSerializer
+
+CATALOG_CACHE_KEY = 'smartplan:template-catalog'
+
+
+def catalog_cache():
+    return caches[settings.SMARTPLAN_CATALOG_CACHE_ALIAS]
+
+
+def build_catalog():
+    """Serialize the active template catalog once and cache ``(body, etag)``."""
+    # Shared by every reader, so never built from a replica that may lag
+    templates = Template.objects.using(DEFAULT_DB_ALIAS).filter(is_active=True).prefetch_related('options')
+    body = JSONRenderer().render(TemplateSerializer(templates, many=True).data)
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    catalog_cache().set(CATALOG_CACHE_KEY, (body, etag), timeout=None)
+    return body, etag
+
+
+def get_catalog():
+    return catalog_cache().get(CATALOG_CACHE_KEY) or build_catalog()
+
+
+def invalidate_catalog():
+    catalog_cache().delete(CATALOG_CACHE_KEY)
+    # Rebuild from committed data so readers never cache a rolled-back edit
+    transaction.on_commit(build_catalog)
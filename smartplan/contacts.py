@@ -0,0 +1,290 @@
+"""Past-client contact lists and their CSV imports.
+
+An upload is stored with a ``ContactImport`` row and loaded on a small
+thread pool once the request commits. A first pass over the file picks
+UTF-8 or, failing that, Windows-1252. The file is then read as a stream:
+``SMARTPLAN_CONTACT_IMPORT_BATCH_SIZE`` rows at a time are normalized and
+validated, rows whose email or phone is already on the plan are dropped
+(looked up through the unique indexes on ``Contact``) and the rest are
+inserted with one ``bulk_create``. Each batch commits together with the
+import's counters, so progress can be polled and an interrupted import
+resumes after its last batch (``manage.py process_contact_imports``).
+"""
+import codecs
+import csv
+import io
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .db import retry_on_lock
+from .models import Contact, ContactImport
+
+logger = logging.getLogger(__name__)
+
+HEADER_ALIASES = {
+    'email': 'email', 'e mail': 'email', 'email address': 'email',
+    'phone': 'phone', 'phone number': 'phone', 'mobile': 'phone', 'mobile phone': 'phone', 'cell': 'phone',
+    'cell phone': 'phone',
+    'first name': 'first_name', 'firstname': 'first_name', 'first': 'first_name', 'given name': 'first_name',
+    'last name': 'last_name', 'lastname': 'last_name', 'last': 'last_name', 'surname': 'last_name',
+    'name': 'name', 'full name': 'name',
+}
+EXTENSION_RE = re.compile(r'\s*(?:x|ext\.?|extension)\s*\d+\s*$', re.IGNORECASE)
+MAX_INVALID_ROWS = 50  # invalid lines kept on the import for the client to show
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SMARTPLAN_CONTACT_IMPORT_WORKERS, thread_name_prefix='smartplan-contacts'
+            )
+    return _executor
+
+
+def normalize_email(value):
+    """``(email, error)``; an empty value is allowed and returned as ``''``."""
+    value = value.strip().lower()
+    if not value:
+        return '', None
+    try:
+        validate_email(value)
+    except ValidationError:
+        return None, f'invalid email {value!r}'
+    return value, None
+
+
+def normalize_phone(value, country_code=None):
+    """``(phone, error)`` with the phone in E.164; numbers without ``+`` get ``country_code``."""
+    value = EXTENSION_RE.sub('', value.strip())
+    if not value:
+        return '', None
+    country_code = settings.SMARTPLAN_CONTACT_DEFAULT_COUNTRY_CODE if country_code is None else country_code
+    digits = ''.join(char for char in value if char.isdigit())
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif len(digits) == 10 and country_code:
+        digits = country_code + digits
+    elif not (country_code and len(digits) == len(country_code) + 10 and digits.startswith(country_code)):
+        digits = ''
+    if not 8 <= len(digits) <= 15:
+        return None, f'invalid phone {value!r}'
+    return '+' + digits, None
+
+
+def header_key(name):
+    return ' '.join(name.strip().lower().replace('_', ' ').replace('-', ' ').split())
+
+
+def map_columns(header):
+    """Field name -> column index for the recognised columns of ``header``."""
+    columns = {}
+    for index, name in enumerate(header):
+        field = HEADER_ALIASES.get(header_key(name))
+        if field and field not in columns:
+            columns[field] = index
+    if 'email' not in columns and 'phone' not in columns:
+        raise ValueError('The file needs an email or a phone column')
+    return columns
+
+
+def parse_row(fields, columns):
+    """``((first_name, last_name, email, phone), error)`` for one CSV row."""
+    def get(field):
+        index = columns.get(field)
+        return fields[index] if index is not None and index < len(fields) else ''
+
+    email, email_error = normalize_email(get('email'))
+    phone, phone_error = normalize_phone(get('phone'))
+    if email_error or phone_error:
+        return None, email_error or phone_error
+    if not email and not phone:
+        return None, 'no email or phone'
+    first_name, last_name = get('first_name').strip(), get('last_name').strip()
+    if not (first_name or last_name) and get('name').strip():
+        first_name, _, last_name = get('name').strip().partition(' ')
+    return (first_name[:100], last_name.strip()[:100], email, phone), None
+
+
+def insert_contacts(plan_id, contacts):
+    Contact.objects.bulk_create(
+        [
+            Contact(plan_id=plan_id, first_name=first_name, last_name=last_name, email=email, phone=phone)
+            for first_name, last_name, email, phone in contacts
+        ],
+        batch_size=settings.SMARTPLAN_CONTACT_IMPORT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+@retry_on_lock
+def save_batch(job, contacts, counts):
+    """Insert the contacts not already on the plan and commit them with the job's progress."""
+    with transaction.atomic():
+        plan_contacts = Contact.objects.filter(plan_id=job.plan_id)
+        emails = [email for _, _, email, _ in contacts if email]
+        phones = [phone for _, _, _, phone in contacts if phone]
+        # The exclude() repeats the partial indexes' condition, which SQLite needs to use them
+        existing_emails = set(
+            plan_contacts.filter(email__in=emails).exclude(email='').values_list('email', flat=True)
+        ) if emails else set()
+        existing_phones = set(
+            plan_contacts.filter(phone__in=phones).exclude(phone='').values_list('phone', flat=True)
+        ) if phones else set()
+        fresh = [
+            contact for contact in contacts
+            if contact[2] not in existing_emails and contact[3] not in existing_phones
+        ]
+        if fresh:
+            # Conflicts are ignored in case two imports into one plan race
+            insert_contacts(job.plan_id, fresh)
+
+        job.processed_rows += counts['rows']
+        job.processed_bytes = min(counts['bytes'], job.size)
+        job.created_count += len(fresh)
+        job.duplicate_count += counts['duplicates'] + len(contacts) - len(fresh)
+        job.invalid_count += len(counts['invalid'])
+        job.invalid_rows = (job.invalid_rows + counts['invalid'])[:MAX_INVALID_ROWS]
+        job.save(update_fields=[
+            'processed_rows', 'processed_bytes', 'created_count', 'duplicate_count', 'invalid_count', 'invalid_rows',
+        ])
+
+
+def detect_encoding(raw):
+    """``'utf-8-sig'`` if all of ``raw`` decodes as UTF-8, else ``'cp1252'`` (Excel's plain "CSV" on Windows)."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    try:
+        while chunk := raw.read(64 * 1024):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    finally:
+        raw.seek(0)
+    return 'utf-8-sig'
+
+
+def decoded_lines(text):
+    try:
+        yield from text
+    except UnicodeDecodeError as e:
+        raise ValueError(
+            f'The file is neither UTF-8 nor Windows-1252 text (unreadable byte {e.object[e.start:e.end]!r}); '
+            'save it as "CSV UTF-8" and upload it again'
+        ) from e
+
+
+def import_contacts(job):
+    """Stream ``job.file`` into ``Contact`` rows, skipping the rows earlier runs committed."""
+    batch_size = settings.SMARTPLAN_CONTACT_IMPORT_BATCH_SIZE
+    with job.file.open('rb') as raw:
+        # Decoded strictly: a wrong guess fails the import instead of saving mangled names
+        text = io.TextIOWrapper(raw, encoding=detect_encoding(raw), newline='')
+        reader = csv.reader(decoded_lines(text))
+        columns = map_columns(next(reader, []))
+        rows = islice(reader, job.processed_rows, None)
+        # Repeats within the file; rows committed by an earlier run are caught by save_batch
+        seen = set()
+        while batch := [(reader.line_num, fields) for fields in islice(rows, batch_size)]:
+            contacts = []
+            counts = {'rows': len(batch), 'duplicates': 0, 'invalid': [], 'bytes': raw.tell()}
+            for line, fields in batch:
+                if not any(field.strip() for field in fields):
+                    continue
+                contact, error = parse_row(fields, columns)
+                if error:
+                    counts['invalid'].append({'line': line, 'error': error})
+                    continue
+                _, _, email, phone = contact
+                keys = [key for key in (email and 'e:' + email, phone and 'p:' + phone) if key]
+                if any(key in seen for key in keys):
+                    counts['duplicates'] += 1
+                    continue
+                seen.update(keys)
+                contacts.append(contact)
+            save_batch(job, contacts, counts)
+
+
+def run_import(import_id, statuses=('pending',)):
+    """Load one contact import (runs on the contacts pool).
+
+    The import is claimed with a conditional UPDATE out of ``statuses``, so
+    it runs once even if it was queued twice.
+    """
+    close_old_connections()
+    try:
+        claimed = ContactImport.objects.filter(pk=import_id, status__in=statuses).update(
+            status='processing', started_at=timezone.now()
+        )
+        job = ContactImport.objects.get(pk=import_id)
+        if not claimed:
+            return job
+        try:
+            import_contacts(job)
+        except (OSError, ValueError, csv.Error) as e:
+            logger.warning("Contact import %s failed: %s", import_id, e)
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = timezone.now()
+            job.save(update_fields=['status', 'error', 'finished_at'])
+            return job
+
+        name = job.file.name
+        job.status = 'completed'
+        job.error = ''
+        job.file = ''
+        job.processed_bytes = job.size
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'file', 'processed_bytes', 'finished_at'])
+        job.file.storage.delete(name)
+        return job
+    except Exception:
+        logger.exception("Contact import %s failed", import_id)
+        raise
+    finally:
+        close_old_connections()
+
+
+def queue_import(plan, upload):
+    """Store ``upload`` and load it in the background once the transaction commits."""
+    with transaction.atomic():
+        job = ContactImport.objects.create(plan=plan, file=upload, size=upload.size)
+        transaction.on_commit(lambda: get_executor().submit(run_import, job.pk))
+    return job
+
+
+def import_payload(job):
+    if job.status == 'completed':
+        progress = 1.0
+    else:
+        progress = round(job.processed_bytes / job.size, 3) if job.size else 0.0
+    return {
+        'id': job.id,
+        'plan': job.plan_id,
+        'status': job.status,
+        'progress': progress,
+        'processed_rows': job.processed_rows,
+        'created': job.created_count,
+        'duplicates': job.duplicate_count,
+        'invalid': job.invalid_count,
+        'invalid_rows': job.invalid_rows,
+        'error': job.error,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': job.finished_at,
+    }
@@ -0,0 +1,55 @@
+"""Retrying writes that lose the SQLite write lock.
+
+With WAL, ``busy_timeout`` and ``BEGIN IMMEDIATE`` (see ``DATABASES`` in
+settings) a writer normally just waits for the lock, but a burst longer
+than the timeout still ends in "database is locked". ``retry_on_lock``
+runs the whole unit of work again with exponential backoff. It only
+retries at the outermost level: inside an ``atomic()`` block the failed
+statement has already broken the enclosing transaction, so the error is
+left for whoever owns that transaction.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from .instrumentation import DB_LOCK_RETRIES, log_event
+
+logger = logging.getLogger(__name__)
+
+LOCK_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_lock_error(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc) for message in LOCK_MESSAGES)
+
+
+def retry_on_lock(func=None, *, using=DEFAULT_DB_ALIAS, attempts=None, backoff=None):
+    """Decorator retrying ``func`` when the database reports a lock error.
+
+    Waits ``backoff * 2**n`` seconds (with jitter) before the n-th retry and
+    gives up after ``attempts`` tries; both default to the
+    ``SMARTPLAN_DB_LOCK_*`` settings.
+    """
+    if func is None:
+        return functools.partial(retry_on_lock, using=using, attempts=attempts, backoff=backoff)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connections[using].in_atomic_block:
+            return func(*args, **kwargs)
+        tries = attempts or settings.SMARTPLAN_DB_LOCK_RETRIES
+        delay = settings.SMARTPLAN_DB_LOCK_BACKOFF if backoff is None else backoff
+        for attempt in range(tries):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if attempt + 1 >= tries or not is_lock_error(e):
+                    raise
+                DB_LOCK_RETRIES.inc(func.__qualname__)
+                log_event(logger, 'db_lock_retry', logging.WARNING, function=func.__qualname__, attempt=attempt + 1)
+                time.sleep(delay * 2 ** attempt * (0.5 + random.random()))
+    return wrapper
@@ -0,0 +1,132 @@
+"""Streaming export of plans and their generations as NDJSON or CSV.
+
+Plans are read with ``QuerySet.iterator()`` and handled a chunk at a time;
+each chunk's generations come from a second iterator merged in by plan id.
+Nothing holds more than ``chunk_size`` rows, so memory use stays flat
+however large the export. Every ``plan`` record is followed by its
+``generated_plan`` records.
+"""
+import csv
+import json
+import zlib
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .fields import resolve
+from .models import GeneratedPlan
+from .serializers import PlanReadSerializer
+from .steps import attach_step_content
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+CSV_COLUMNS = [
+    'record', 'id', 'plan', 'user', 'title', 'description', 'plan_type', 'channels', 'timeline', 'status',
+    'content', 'created_at', 'updated_at',
+]
+BLOCK_SIZE = 64 * 1024  # bytes handed to the server (or compressor) at a time
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def export_records(plans, using=None, chunk_size=None):
+    """Yield a dict per plan, each followed by one per ``GeneratedPlan`` of it."""
+    chunk_size = chunk_size or settings.SMARTPLAN_EXPORT_CHUNK_SIZE
+    reader = PlanReadSerializer()
+    tz = timezone.get_current_timezone()
+    rows = plans.using(using).order_by('id').values(*reader.columns(), 'description')
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        attach_step_content(chunk, using)
+        generated = (
+            GeneratedPlan.objects.using(using).filter(plan_id__in=[row['id'] for row in chunk])
+            .order_by('plan_id', 'id').values('id', 'plan_id', 'user_id', 'content', 'created_at')
+            .iterator(chunk_size=chunk_size)
+        )
+        pending = next(generated, None)
+        for row in chunk:
+            yield {'record': 'plan', **reader.to_representation(row, tz), 'description': row['description']}
+            while pending is not None and pending['plan_id'] == row['id']:
+                yield {
+                    'record': 'generated_plan',
+                    'id': pending['id'],
+                    'plan': pending['plan_id'],
+                    'user': pending['user_id'],
+                    'content': resolve(pending['content']),
+                    'created_at': reader.format_datetime(pending['created_at'], tz),
+                }
+                pending = next(generated, None)
+
+
+def ndjson_lines(records):
+    for record in records:
+        yield json.dumps(record, separators=(',', ':'), default=str) + '\n'
+
+
+class Echo:
+    """File-like object whose ``write`` returns the line, so ``csv.writer`` can feed a generator."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(records):
+    writer = csv.DictWriter(Echo(), CSV_COLUMNS)
+    yield writer.writeheader()
+    for record in records:
+        # Lists are kept as JSON inside their cell
+        yield writer.writerow({
+            key: json.dumps(value) if isinstance(value, list) else value for key, value in record.items()
+        })
+
+
+def blocks(lines, size=BLOCK_SIZE):
+    """Join text lines into encoded blocks of about ``size`` bytes."""
+    buffer = []
+    length = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(plans, format='ndjson', gzip=False, using=None, chunk_size=None):
+    """Bytes of the export of ``plans``, as an iterator suited to ``StreamingHttpResponse``."""
+    lines = csv_lines if format == 'csv' else ndjson_lines
+    stream = blocks(lines(export_records(plans, using, chunk_size)))
+    return gzipped(stream) if gzip else stream
+
+
+async def aiterate(iterator):
+    """Serve a sync iterator that queries the database from an async response, one item per thread hop.
+
+    ``StreamingHttpResponse`` would otherwise read a sync iterator to the
+    end with ``list()`` before sending anything under ASGI.
+    """
+    next_item = sync_to_async(next)
+    while (item := await next_item(iterator, None)) is not None:
+        yield item
+
+
+def filename(format, gzip=False):
+    stamp = timezone.localdate().isoformat()
+    return f"smartplan-plans-{stamp}.{format}" + ('.gz' if gzip else '')
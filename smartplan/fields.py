@@ -0,0 +1,207 @@
+import json
+import zlib
+from functools import lru_cache
+
+from django import forms
+from django.conf import settings
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Every stored value starts with a one byte codec tag
+ZLIB = b'Z'
+ZSTD = b'S'
+ZSTD_DICT = b'D'  # followed by a 1 byte key length and the dictionary key
+
+
+@lru_cache(maxsize=None)
+def load_dictionary(key):
+    path = settings.SMARTPLAN_COMPRESSION_DICTIONARIES.get(key)
+    if not path or zstandard is None:
+        return None
+    with open(path, 'rb') as f:
+        return zstandard.ZstdCompressionDict(f.read())
+
+
+def compress(data, dictionary_key=None):
+    level = settings.SMARTPLAN_COMPRESSION_LEVEL
+    if settings.SMARTPLAN_COMPRESSION_CODEC == 'zstd' and zstandard is not None:
+        dictionary = load_dictionary(dictionary_key) if dictionary_key else None
+        if dictionary is not None:
+            key = dictionary_key.encode('utf-8')
+            compressor = zstandard.ZstdCompressor(level=level, dict_data=dictionary)
+            return ZSTD_DICT + bytes([len(key)]) + key + compressor.compress(data)
+        return ZSTD + zstandard.ZstdCompressor(level=level).compress(data)
+    return ZLIB + zlib.compress(data, min(level, 9))
+
+
+def decompress(blob):
+    blob = bytes(blob)
+    tag, body = blob[:1], blob[1:]
+    if tag == ZLIB:
+        return zlib.decompress(body)
+    if zstandard is None:
+        raise RuntimeError('zstandard is required to read zstd-compressed content')
+    if tag == ZSTD:
+        return zstandard.ZstdDecompressor().decompress(body)
+    if tag == ZSTD_DICT:
+        key = body[1:1 + body[0]].decode('utf-8')
+        dictionary = load_dictionary(key)
+        if dictionary is None:
+            raise RuntimeError(f"Compression dictionary '{key}' is not configured")
+        return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(body[1 + body[0]:])
+    raise ValueError('Unknown compression tag')
+
+
+class CompressedValue:
+    """Raw compressed column value; decoded on first attribute access."""
+
+    __slots__ = ('blob', 'field')
+
+    def __init__(self, blob, field):
+        self.blob = blob
+        self.field = field
+
+    def decode(self):
+        return self.field.decode(self.blob)
+
+
+def resolve(value):
+    """Decode values loaded through ``QuerySet.values()``, which bypass the lazy descriptor."""
+    return value.decode() if isinstance(value, CompressedValue) else value
+
+
+class CompressedAttribute(DeferredAttribute):
+    # A data descriptor (unlike DeferredAttribute), so reads go through
+    # __get__ even once the raw value is in the instance __dict__.
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, CompressedValue):
+            value = value.decode()
+            instance.__dict__[self.field.attname] = value
+        return value
+
+
+class CompressedFieldMixin:
+    """Stores the value compressed in a BLOB column and decodes it lazily.
+
+    Loading a row only keeps the compressed bytes; they are decompressed the
+    first time the attribute is read. ``dictionary_key`` names an attribute
+    path on the instance (e.g. ``'plan_type'`` or ``'plan.plan_type'``) whose
+    value picks a trained zstd dictionary from
+    ``SMARTPLAN_COMPRESSION_DICTIONARIES``.
+
+    Columns written before compression was introduced come back from SQLite
+    as ``str`` and are read as plain text.
+    """
+
+    descriptor_class = CompressedAttribute
+
+    def __init__(self, *args, dictionary_key=None, **kwargs):
+        self.dictionary_key = dictionary_key
+        kwargs.setdefault('editable', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.dictionary_key:
+            kwargs['dictionary_key'] = self.dictionary_key
+        kwargs.pop('editable', None)
+        return name, path, args, kwargs
+
+    def to_bytes(self, value):
+        raise NotImplementedError
+
+    def from_bytes(self, data):
+        raise NotImplementedError
+
+    def encode(self, value, dictionary_key=None):
+        if value is None:
+            return None
+        return compress(self.to_bytes(value), dictionary_key)
+
+    def decode(self, blob):
+        if blob is None:
+            return None
+        if isinstance(blob, str):
+            return self.from_bytes(blob.encode('utf-8'))
+        return self.from_bytes(decompress(blob))
+
+    def instance_dictionary_key(self, instance):
+        if not self.dictionary_key:
+            return None
+        value = instance
+        for attr in self.dictionary_key.split('.'):
+            value = getattr(value, attr, None)
+            if value is None:
+                return None
+        return str(value)
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        return CompressedValue(self.encode(value, self.instance_dictionary_key(model_instance)), self)
+
+    def get_default(self):
+        # BinaryField turns the implicit empty default into b''
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def to_python(self, value):
+        if isinstance(value, CompressedValue):
+            return value.decode()
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return CompressedValue(value, self)
+
+    def get_prep_value(self, value):
+        if isinstance(value, CompressedValue):
+            return value.blob
+        return self.encode(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        return connection.Database.Binary(value)
+
+
+class CompressedTextField(CompressedFieldMixin, models.BinaryField):
+    def to_bytes(self, value):
+        return str(value).encode('utf-8')
+
+    def from_bytes(self, data):
+        return data.decode('utf-8')
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.CharField, 'widget': forms.Textarea, **kwargs})
+
+
+class CompressedJSONField(CompressedFieldMixin, models.BinaryField):
+    def to_bytes(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def from_bytes(self, data):
+        return json.loads(data)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.JSONField, **kwargs})
@@ -0,0 +1,355 @@
+import asyncio
+import json
+import logging
+import re
+import socket
+import os
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db import retry_on_lock
+from .models import GeneratedPlan, GenerationJob, Plan, Template
+from .prompts import COERCERS, CompiledTemplate, compile_template
+from .steps import (
+    diff_segments, drop_stale_steps, merge_plan_steps, plan_segments, replace_plan_steps, segment_title,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT_TEMPLATE = (
+    "Write a {timeline} {plan_type} marketing SmartPlan for {business_name}.\n"
+    "Channels: {channels}\n"
+    "Target market: {target_market}\n"
+    "Value proposition: {value_proposition}\n"
+    "Brand voice: {brand_voice}\n"
+    "Additional context: {additional_context}\n"
+    "Start every section with a '## ' heading."
+)
+
+# Appended to the prompt when only part of a plan is regenerated
+SEGMENTS_INSTRUCTION = "\nOnly write the following sections, using exactly these headings: {headings}."
+
+DEFAULT_PROMPT = CompiledTemplate(DEFAULT_PROMPT_TEMPLATE)
+
+SECTION_HEADING = re.compile(r'^##\s+(.+?)\s*$', re.MULTILINE)
+TOKEN = re.compile(r'\S+\s*|\s+')
+
+
+class LLMClient:
+    """Base class for the model backends used by the generation worker.
+
+    Subclasses implement ``complete``; ``stream`` and ``astream`` fall back
+    to yielding the whole completion as a single chunk.
+    """
+
+    def complete(self, prompt, **params):
+        raise NotImplementedError
+
+    def stream(self, prompt, **params):
+        yield self.complete(prompt, **params)
+
+    async def astream(self, prompt, **params):
+        yield await sync_to_async(self.complete, thread_sensitive=False)(prompt, **params)
+
+
+class StubLLMClient(LLMClient):
+    """Deterministic local client for development and tests.
+
+    ``astream`` emits the completion word by word, sleeping ``token_delay``
+    seconds between tokens to imitate a real model.
+    """
+
+    def __init__(self, token_delay=None):
+        if token_delay is None:
+            token_delay = getattr(settings, 'SMARTPLAN_STUB_TOKEN_DELAY', 0.0)
+        self.token_delay = token_delay
+
+    def complete(self, prompt, channels=(), timeline='30days', segments=None, **params):
+        sections = []
+        for day_offset, channel in segments or plan_segments(channels, timeline):
+            sections.append(
+                f"## {segment_title(day_offset, channel)}\n"
+                f"Week {day_offset // 7 + 1} {channel} touchpoint.\n"
+            )
+        return '\n'.join(sections)
+
+    async def astream(self, prompt, **params):
+        for token in TOKEN.findall(self.complete(prompt, **params)):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+
+def get_llm_client():
+    client = import_string(settings.SMARTPLAN_LLM_CLIENT)()
+    if settings.SMARTPLAN_RESPONSE_CACHE:
+        from .response_cache import CachedLLMClient
+        client = CachedLLMClient(client)
+    return client
+
+
+def build_context(plan):
+    user = plan.user
+    # Template option values; the plan's own fields take precedence
+    return {
+        **(plan.options or {}),
+        'title': plan.title,
+        'description': plan.description,
+        'plan_type': plan.get_plan_type_display(),
+        'timeline': plan.get_timeline_display(),
+        'channels': ', '.join(plan.channels or []),
+        'full_name': user.full_name,
+        'business_name': user.business_name or user.full_name,
+        'target_market': user.target_market or '',
+        'value_proposition': user.value_proposition or '',
+        'additional_context': user.additional_context or '',
+        'brand_voice': user.brand_voice or '',
+        'brand_description': user.brand_description or '',
+    }
+
+
+def render_prompt(template, context, segments=None):
+    compiled = compile_template(template) if template else DEFAULT_PROMPT
+    prompt = compiled.render(context)
+    if segments:
+        headings = '; '.join(segment_title(day_offset, channel) for day_offset, channel in segments)
+        prompt += SEGMENTS_INSTRUCTION.format(headings=headings)
+    return prompt
+
+
+def parse_sections(text):
+    """Split model output on ``## `` headings into the section list stored in ``Plan.content``."""
+    matches = list(SECTION_HEADING.finditer(text))
+    if not matches:
+        return [{'title': 'Plan', 'content': text.strip()}]
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        sections.append({
+            'title': match.group(1),
+            'content': text[match.end():end].strip(),
+        })
+    return sections
+
+
+def active_template(value):
+    """The active ``Template`` with id ``value`` (``None`` when not given); ``ValueError`` if there is none."""
+    if value in (None, ''):
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f'Invalid template: {value!r}')
+    try:
+        return Template.objects.get(pk=int(value), is_active=True)
+    except (TypeError, ValueError, Template.DoesNotExist):
+        raise ValueError(f'Invalid template: {value!r}')
+
+
+def template_options(template, values):
+    """``values`` checked against ``template``'s options, for ``Plan.options``; ``ValueError`` if they don't fit.
+
+    Required options without a default must be given, since nothing else
+    fills them in when the prompt is rendered.
+    """
+    if values in (None, ''):
+        values = {}
+    if isinstance(values, str):
+        # Form-encoded requests send the object as JSON text
+        try:
+            values = json.loads(values)
+        except ValueError:
+            raise ValueError('options must be a JSON object')
+    if not isinstance(values, dict):
+        raise ValueError('options must be an object')
+    if template is None:
+        if values:
+            raise ValueError('options need a template')
+        return {}
+
+    options = {option.name: option for option in template.options.all()}
+    unknown = sorted(set(values) - set(options))
+    if unknown:
+        raise ValueError(f"Unknown options: {', '.join(unknown)}")
+    missing = [
+        name for name, option in options.items()
+        if option.is_required and option.default_value is None and values.get(name) in (None, '')
+    ]
+    if missing:
+        raise ValueError(f"Missing required options: {', '.join(missing)}")
+    for name, value in values.items():
+        try:
+            COERCERS.get(options[name].option_type, str)(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid value for option {name}: {value!r}')
+    return values
+
+
+@retry_on_lock
+def enqueue_generation(plan, template=None, bypass_cache=False, segments=None):
+    with transaction.atomic():
+        job = GenerationJob.objects.create(
+            plan=plan, template=template, bypass_cache=bypass_cache, segments=segments
+        )
+        Plan.objects.filter(pk=plan.pk).update(status='generating', updated_at=timezone.now())
+        plan.status = 'generating'
+    return job
+
+
+def enqueue_generations(plans, bypass_cache=False):
+    """Bulk variant of ``enqueue_generation`` for plans already saved with status 'generating'."""
+    return GenerationJob.objects.bulk_create(
+        [GenerationJob(plan=plan, template_id=plan.template_id, bypass_cache=bypass_cache) for plan in plans]
+    )
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@retry_on_lock
+def queued_job_ids(limit):
+    return list(GenerationJob.objects.filter(status='queued').values_list('id', flat=True)[:limit])
+
+
+@retry_on_lock
+def claim_job(job_id, worker_id):
+    """Move one queued job to ``running``; ``False`` if another worker got it first."""
+    return bool(GenerationJob.objects.filter(id=job_id, status='queued').update(
+        status='running',
+        worker=worker_id,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    ))
+
+
+def claim_jobs(limit, worker_id):
+    """Atomically move up to ``limit`` queued jobs to ``running`` and return their ids.
+
+    Claiming is a conditional UPDATE on ``status='queued'``, so two workers
+    racing for the same row can never both win it. The attempt is counted
+    here, so it is on record even if the worker dies during it. Each claim
+    is retried on its own, so a lock error never loses a job already claimed.
+    """
+    claimed = []
+    for job_id in queued_job_ids(limit * 2):
+        if claim_job(job_id, worker_id):
+            claimed.append(job_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+@retry_on_lock
+def requeue_stale_jobs(timeout):
+    """Put ``running`` jobs whose worker died back on the queue.
+
+    A job that has used up ``max_attempts`` fails instead, along with its
+    plan, so a job that keeps killing its worker is not retried forever.
+    Returns ``(requeued, failed)``.
+    """
+    now = timezone.now()
+    stale = GenerationJob.objects.filter(status='running', started_at__lt=now - timedelta(seconds=timeout))
+    exhausted = dict(stale.filter(attempts__gte=F('max_attempts')).values_list('id', 'plan_id'))
+    failed = 0
+    if exhausted:
+        with transaction.atomic():
+            failed = stale.filter(id__in=exhausted).update(
+                status='failed', worker='', error='Worker stopped before finishing the job', finished_at=now
+            )
+            Plan.objects.filter(pk__in=exhausted.values()).update(status='failed', updated_at=now)
+    requeued = stale.filter(attempts__lt=F('max_attempts')).update(status='queued', worker='')
+    return requeued, failed
+
+
+def model_params(plan, client, bypass_cache=False, segments=None):
+    from .response_cache import CachedLLMClient
+
+    params = {'channels': plan.channels, 'timeline': plan.timeline}
+    if segments:
+        params['segments'] = [list(segment) for segment in segments]
+    if isinstance(client, CachedLLMClient):
+        params['bypass_cache'] = bypass_cache
+    return params
+
+
+@retry_on_lock
+def save_generation(plan, text, segments=None):
+    with transaction.atomic():
+        generated = GeneratedPlan.objects.create(user=plan.user, plan=plan, content=text)
+        # Sections live in PlanStep; Plan.content only holds in-progress output
+        if segments:
+            merge_plan_steps(plan, parse_sections(text))
+        else:
+            replace_plan_steps(plan, parse_sections(text))
+        plan.content = None
+        plan.status = 'completed'
+        plan.save(update_fields=['content', 'status', 'updated_at'])
+    return generated
+
+
+def generate_plan(plan, template=None, client=None, bypass_cache=False, segments=None):
+    """Generate the whole plan, or only ``segments`` (``(day_offset, channel)`` pairs) of it."""
+    client = client or get_llm_client()
+    prompt = render_prompt(template, build_context(plan), segments)
+    text = client.complete(prompt, **model_params(plan, client, bypass_cache, segments))
+    return save_generation(plan, text, segments)
+
+
+def regenerate_changed_segments(plan, old_channels, old_timeline, template=None):
+    """Bring a generated plan in line with edited ``channels``/``timeline``.
+
+    Steps for dropped channels or weeks past the new timeline are deleted and
+    a job is queued for just the segments the old settings did not cover, so
+    the rest of the plan is kept as it is. Returns the job, or ``None`` when
+    nothing needs generating.
+    """
+    added, removed = diff_segments(old_channels, old_timeline, plan.channels, plan.timeline)
+    if not added and not removed:
+        return None
+    with transaction.atomic():
+        drop_stale_steps(plan)
+        if not added:
+            return None
+        return enqueue_generation(plan, template or plan.template, segments=added)
+
+
+@retry_on_lock
+def finish_job(job, error=None):
+    """Record the outcome of an attempt, requeueing failed jobs until ``max_attempts``."""
+    if error is None:
+        job.status = 'completed'
+        job.error = ''
+        job.finished_at = timezone.now()
+    else:
+        job.error = str(error)
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.worker = ''
+        else:
+            job.status = 'failed'
+            job.finished_at = timezone.now()
+            Plan.objects.filter(pk=job.plan_id).update(status='failed', updated_at=timezone.now())
+    job.save(update_fields=['attempts', 'status', 'worker', 'error', 'finished_at'])
+    return job.status
+
+
+def run_job(job_id, client=None):
+    close_old_connections()
+    try:
+        # claim_jobs already counted this attempt
+        job = GenerationJob.objects.select_related('plan__user', 'template').get(id=job_id)
+        try:
+            generate_plan(
+                job.plan, job.template, client=client, bypass_cache=job.bypass_cache, segments=job.segments
+            )
+        except Exception as e:
+            logger.exception("Generation job %s failed", job_id)
+            return finish_job(job, e)
+        return finish_job(job)
+    finally:
+        close_old_connections()
@@ -0,0 +1,237 @@
+"""Per-request timings and process-wide request metrics.
+
+``RequestMetricsMiddleware`` opens a ``RequestTimings`` for each request in
+a context variable, so it follows the request into ``sync_to_async``
+threads. Code marks the phases it wants broken out with ``phase()``; every
+ORM query is timed by an execute wrapper installed on each new database
+connection. When the response is ready the timings are added to the
+histograms below, which ``/api/metrics`` serves in the Prometheus text
+format. The metrics are per process, so scrape every worker.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('smartplan_request_timings', default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.active = set()
+        self.queries = 0
+        self.query_time = 0.0
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+def current():
+    return _current.get()
+
+
+def begin():
+    """Start timing a request; pass the returned token to ``end()``."""
+    timings = RequestTimings()
+    return timings, _current.set(timings)
+
+
+def end(token):
+    _current.reset(token)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to phase ``name`` of the current request.
+
+    Nested blocks of the same phase (a serializer inside a serializer) are
+    only counted once.
+    """
+    timings = _current.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - started
+
+
+def query_timer(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.query_time += time.perf_counter() - started
+
+
+def install_query_timer(connection):
+    if query_timer not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_timer)
+
+
+def sampled(rate=None):
+    """Whether to emit a sampled log line (``SMARTPLAN_LOG_SAMPLE_RATE`` by default)."""
+    rate = settings.SMARTPLAN_LOG_SAMPLE_RATE if rate is None else rate
+    return rate >= 1 or random.random() < rate
+
+
+def log_event(log, event, level=logging.INFO, **fields):
+    """Log ``event`` as a logfmt line; the fields are also attached as record attributes."""
+    text = ' '.join(f'{key}={format_value(value)}' for key, value in fields.items())
+    log.log(level, f'event={event} {text}'.rstrip(), extra={'event': event, **fields})
+
+
+def format_value(value):
+    value = str(value)
+    if not value or any(char in value for char in ' ="'):
+        return '"%s"' % value.replace('\\', '\\\\').replace('"', '\\"')
+    return value
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=''):
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{%s}' % ','.join(pairs) if pairs else ''
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def total(self):
+        with self._lock:
+            return sum(self._values.values())
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.labels, labels)} {value}'
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [per-bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f'{self.name}_bucket{format_labels(self.labels, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labels, labels)} {counts[-1]}'
+            yield f'{self.name}_count{format_labels(self.labels, labels)} {cumulative}'
+
+
+REQUESTS = Counter('smartplan_requests_total', 'Requests by route, method and status.', ('route', 'method', 'status'))
+DURATION = Histogram('smartplan_request_duration_seconds', 'Time to produce the response.', ('route', 'method'))
+PHASES = Histogram('smartplan_request_phase_seconds', 'Time spent in each instrumented phase.', ('route', 'phase'))
+QUERIES = Histogram('smartplan_request_db_queries', 'Database queries per request.', ('route',), QUERY_BUCKETS)
+QUERY_TIME = Histogram('smartplan_request_db_seconds', 'Database time per request.', ('route',))
+RESPONSE_SIZE = Histogram('smartplan_response_size_bytes', 'Response body size (non-streaming responses).',
+                          ('route',), SIZE_BUCKETS)
+DB_LOCK_RETRIES = Counter('smartplan_db_lock_retries_total', 'Writes retried after a database lock error.', ('function',))
+METRICS = [REQUESTS, DURATION, PHASES, QUERIES, QUERY_TIME, RESPONSE_SIZE, DB_LOCK_RETRIES]
+
+
+def route_label(request):
+    # The URL pattern, not the path, so plan ids don't multiply the series
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+def server_timing(timings, total):
+    entries = [f'total;dur={total * 1000:.2f}']
+    entries += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.phases.items()]
+    entries.append(f'db;dur={timings.query_time * 1000:.2f};desc="{timings.queries} queries"')
+    return ', '.join(entries)
+
+
+def record(request, response, timings):
+    """Add a finished request to the metrics and annotate its response."""
+    total = timings.elapsed()
+    route = route_label(request)
+    REQUESTS.inc(route, request.method, str(response.status_code))
+    DURATION.observe(total, route, request.method)
+    for name, seconds in timings.phases.items():
+        PHASES.observe(seconds, route, name)
+    QUERIES.observe(timings.queries, route)
+    QUERY_TIME.observe(timings.query_time, route)
+    size = None if response.streaming else len(response.content)
+    if size is not None:
+        RESPONSE_SIZE.observe(size, route)
+
+    if settings.SMARTPLAN_SERVER_TIMING:
+        response['Server-Timing'] = server_timing(timings, total)
+    if sampled():
+        log_event(
+            logger, 'request', method=request.method, route=route, status=response.status_code,
+            duration_ms=round(total * 1000, 2), queries=timings.queries,
+            db_ms=round(timings.query_time * 1000, 2), bytes=size if size is not None else '-',
+            **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in timings.phases.items()},
+        )
+    return response
+
+
+def render_prometheus():
+    lines = []
+    for metric in METRICS:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
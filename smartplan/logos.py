@@ -0,0 +1,199 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections, transaction
+from PIL import Image
+
+from .models import CustomUser, LogoAsset
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {'PNG': 'png', 'WEBP': 'webp', 'JPEG': 'jpg'}
+# Formats accepted for uploads; anything else (HTML, SVG, ...) is rejected
+UPLOAD_FORMATS = {**FORMAT_EXTENSIONS, 'GIF': 'gif'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SMARTPLAN_LOGO_WORKERS, thread_name_prefix='smartplan-logos'
+            )
+    return _executor
+
+
+def submit_on_commit(func, *args):
+    transaction.on_commit(lambda: get_executor().submit(func, *args))
+
+
+def detect_format(upload):
+    """Return the Pillow format of ``upload``, raising ``ValueError`` unless it is an accepted image."""
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format = image.format
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise ValueError('Logo must be a PNG, JPEG, WebP or GIF image') from e
+    finally:
+        upload.seek(0)
+    if image_format not in UPLOAD_FORMATS:
+        raise ValueError('Logo must be a PNG, JPEG, WebP or GIF image')
+    return image_format
+
+
+def store_logo(upload):
+    """Return ``(asset, created)`` for an uploaded logo, keyed by its SHA-256.
+
+    The upload is hashed and then written to storage chunk by chunk; a logo
+    that is already stored (e.g. one brokerage logo used by every agent) is
+    not written again. The stored extension comes from the detected image
+    format, never from the client's file name.
+    """
+    extension = UPLOAD_FORMATS[detect_format(upload)]
+    digest = hashlib.sha256()
+    size = 0
+    for chunk in upload.chunks():
+        digest.update(chunk)
+        size += len(chunk)
+    sha256 = digest.hexdigest()
+
+    asset = LogoAsset.objects.filter(sha256=sha256).first()
+    if asset is not None:
+        return asset, False
+
+    upload.seek(0)
+    name = default_storage.save(f"logos/{sha256[:2]}/{sha256}.{extension}", upload)
+    try:
+        with transaction.atomic():
+            return LogoAsset.objects.create(sha256=sha256, original=name, size=size), True
+    except IntegrityError:
+        # A concurrent upload of the same logo won the race
+        default_storage.delete(name)
+        return LogoAsset.objects.get(sha256=sha256), False
+
+
+def render_variant(image, max_width, max_height, image_format):
+    variant = image.copy()
+    variant.thumbnail((max_width, max_height), Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode not in ('RGB', 'L'):
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    options = {'quality': 85, 'method': 6} if image_format == 'WEBP' else {'optimize': True}
+    variant.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def process_logo(asset_id, statuses=('pending',)):
+    """Render the configured variants for one asset (runs on the logo pool).
+
+    The asset is claimed with a conditional UPDATE out of ``statuses``, so
+    it is processed once even if several uploads queued it.
+    """
+    close_old_connections()
+    try:
+        claimed = LogoAsset.objects.filter(pk=asset_id, status__in=statuses).update(status='processing')
+        asset = LogoAsset.objects.get(pk=asset_id)
+        if not claimed:
+            return asset
+        try:
+            with asset.original.open('rb') as f:
+                image = Image.open(f)
+                image.load()
+            if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                image = image.convert('RGBA')
+            variants = {}
+            for name, (max_width, max_height, image_format) in settings.SMARTPLAN_LOGO_VARIANTS.items():
+                path = f"logos/variants/{asset.sha256}/{name}.{FORMAT_EXTENSIONS.get(image_format, image_format.lower())}"
+                if default_storage.exists(path):
+                    default_storage.delete(path)
+                data = render_variant(image, max_width, max_height, image_format)
+                variants[name] = default_storage.save(path, ContentFile(data))
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            logger.warning("Logo %s could not be processed: %s", asset.sha256, e)
+            asset.status = 'failed'
+            asset.error = str(e)
+            asset.save(update_fields=['status', 'error'])
+            return asset
+
+        asset.width, asset.height = image.size
+        asset.variants = variants
+        asset.status = 'ready'
+        asset.error = ''
+        asset.save(update_fields=['width', 'height', 'variants', 'status', 'error'])
+        return asset
+    except Exception:
+        logger.exception("Processing logo asset %s failed", asset_id)
+        raise
+    finally:
+        close_old_connections()
+
+
+def release_logo(asset_id=None, legacy_name=None):
+    """Delete a replaced logo's files once no user references them any more."""
+    close_old_connections()
+    try:
+        if asset_id is not None:
+            with transaction.atomic():
+                asset = LogoAsset.objects.filter(pk=asset_id, users__isnull=True).first()
+                if asset is None:
+                    return
+                paths = [asset.original.name, *asset.variants.values()]
+                asset.delete()
+            for path in paths:
+                default_storage.delete(path)
+        elif legacy_name and not CustomUser.objects.filter(logo=legacy_name).exists():
+            # Uploads from before content-hash storage belong to one user only
+            default_storage.delete(legacy_name)
+    finally:
+        close_old_connections()
+
+
+def set_user_logo(user, upload):
+    """Point ``user`` at the stored copy of ``upload`` and save it; variants and cleanup run after commit."""
+    previous_asset_id = user.logo_asset_id
+    previous_name = user.logo.name if user.logo else None
+
+    with transaction.atomic():
+        asset, created = store_logo(upload)
+        user.logo_asset = asset
+        user.logo = asset.original.name
+        # Saved here so the release below never sees the old reference
+        user.save(update_fields=['logo', 'logo_asset'])
+
+        if created:
+            submit_on_commit(process_logo, asset.pk)
+        if previous_asset_id and previous_asset_id != asset.pk:
+            submit_on_commit(release_logo, previous_asset_id)
+        elif previous_name and not previous_asset_id:
+            submit_on_commit(release_logo, None, previous_name)
+    return asset
+
+
+def logo_payload(user):
+    """Logo fields of the settings response: the original URL plus any ready variants."""
+    payload = {
+        'logo': user.logo.url if user.logo else None,
+        'logo_status': None,
+        'logo_variants': {},
+    }
+    if user.logo_asset_id is None:
+        return payload
+    # Query by id: request.user may be a cached instance with a stale relation cache
+    asset = LogoAsset.objects.filter(pk=user.logo_asset_id).values('status', 'variants').first()
+    if asset is not None:
+        payload['logo_status'] = asset['status']
+        payload['logo_variants'] = {
+            name: default_storage.url(path) for name, path in asset['variants'].items()
+        }
+    return payload
@@ -0,0 +1,130 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from smartplan import contacts
+from smartplan.benchmarks.dataset import seed
+from smartplan.benchmarks.runner import (
+    ClientTransport, ServerTransport, build_report, compare_reports, run_scenario, write_report,
+)
+from smartplan.benchmarks.scenarios import SCENARIOS, uncovered_routes
+
+TRANSPORTS = {'client': ClientTransport, 'server': ServerTransport}
+
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic dataset in a throwaway database, drive every API route with concurrent '
+            'clients and report throughput, latency percentiles and queries per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--plans-per-user', type=int, default=20)
+        parser.add_argument('--generated-per-plan', type=int, default=1)
+        parser.add_argument('--templates', type=int, default=5)
+        parser.add_argument('--contacts-per-plan', type=int, default=50,
+                            help="contacts on each user's first plan, which the contact scenarios use")
+        parser.add_argument('--seed', type=int, default=0, help='random seed for the synthetic dataset')
+        parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per scenario')
+        parser.add_argument('--transport', choices=sorted(TRANSPORTS), default='client',
+                            help="'client' uses the Django test client and counts queries; "
+                                 "'server' sends real HTTP to a local threaded server")
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='only run scenarios whose name contains NAME')
+        parser.add_argument('--output', help='results file (default: var/benchmarks/api-<time>-<commit>.json)')
+        parser.add_argument('--compare', metavar='BASELINE', help='results file of an earlier run to compare against')
+        parser.add_argument('--list', action='store_true', help='list the scenarios and exit')
+
+    def handle(self, *args, **options):
+        scenarios = [
+            scenario for scenario in SCENARIOS
+            if not options['only'] or any(name in scenario.name for name in options['only'])
+        ]
+        if options['list']:
+            for scenario in scenarios:
+                self.stdout.write(f"{scenario.method:<7} {scenario.url_name:<22} {scenario.name}")
+            return
+        if not scenarios:
+            raise CommandError('No scenario matches --only')
+        uncovered = uncovered_routes()
+        if uncovered:
+            raise CommandError(f"Routes without a benchmark scenario: {', '.join(uncovered)}")
+
+        baseline = None
+        if options['compare']:
+            baseline = json.loads(Path(options['compare']).read_text())
+
+        old_name = connection.settings_dict['NAME']
+        old_test_name = connection.settings_dict['TEST'].get('NAME')
+        # Uploaded files (contact imports) and, on SQLite, the database itself
+        tempdir = tempfile.TemporaryDirectory()
+        if connection.vendor == 'sqlite':
+            # A file database, so concurrent clients (and the server threads) share it like production
+            connection.settings_dict['TEST']['NAME'] = str(Path(tempdir.name) / 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write('Seeding dataset...')
+            dataset = seed(options['users'], options['plans_per_user'], options['generated_per_plan'],
+                           options['templates'], options['seed'], options['contacts_per_plan'])
+            self.stdout.write(', '.join(f"{count} {name}" for name, count in dataset.counts.items()))
+
+            # The metrics scenario reads them as the staff user, not with a scrape token
+            with override_settings(ALLOWED_HOSTS=['testserver', 'localhost'], SMARTPLAN_METRICS_TOKEN='',
+                                   MEDIA_ROOT=str(Path(tempdir.name) / 'media')):
+                transport = TRANSPORTS[options['transport']]()
+                try:
+                    results = self.run(scenarios, dataset, transport, options)
+                finally:
+                    transport.close()
+                    # Let queued contact imports finish before their database goes away
+                    contacts.get_executor().shutdown(wait=True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            connection.settings_dict['TEST']['NAME'] = old_test_name
+            tempdir.cleanup()
+
+        report = build_report(results, dataset, transport, {
+            key: options[key] for key in (
+                'users', 'plans_per_user', 'generated_per_plan', 'templates', 'contacts_per_plan', 'seed',
+                'requests', 'concurrency', 'warmup', 'transport', 'only',
+            )
+        })
+        path = write_report(report, options['output'])
+        self.stdout.write(self.style.SUCCESS(f"Results written to {path}"))
+        if baseline is not None:
+            self.print_comparison(baseline, report)
+
+    def run(self, scenarios, dataset, transport, options):
+        self.stdout.write(
+            f"{'scenario':<26} {'method':<7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+            f"{'queries':>8} {'errors':>7}"
+        )
+        results = []
+        for scenario in scenarios:
+            result = run_scenario(scenario, dataset, transport, options['requests'], options['concurrency'],
+                                  options['warmup'])
+            latency = result['latency_ms']
+            queries = f"{result['queries']['mean']:.1f}" if result['queries'] else '-'
+            line = (
+                f"{result['name']:<26} {result['method']:<7} {result['throughput']:>9.1f} {latency['p50']:>8.2f} "
+                f"{latency['p95']:>8.2f} {latency['p99']:>8.2f} {queries:>8} {result['errors']:>7}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['errors'] else line)
+            results.append(result)
+        return results
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+        for key in ('transport', 'database', 'dataset'):
+            if baseline.get(key) != report[key]:
+                self.stderr.write(self.style.WARNING(f"The baseline used a different {key}; numbers are not comparable"))
+        self.stdout.write(f"{'scenario':<26} {'metric':<8} {'before':>10} {'after':>10} {'change':>8}")
+        for name, metric, before, after, change in compare_reports(baseline, report):
+            # Higher is better only for throughput
+            worse = change < -10 if metric == 'req/s' else change > 10
+            line = f"{name:<26} {metric:<8} {before:>10.2f} {after:>10.2f} {change:>+7.1f}%"
+            self.stdout.write(self.style.WARNING(line) if worse else line)
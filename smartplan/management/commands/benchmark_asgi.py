@@ -0,0 +1,157 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.urls import include, path
+from rest_framework.authtoken.models import Token
+
+from smartplan import async_views, views
+from smartplan.models import CustomUser, Plan
+
+SAMPLE_CONTENT = [{'title': f'Week {week} - Email', 'content': 'Touchpoint copy. ' * 20} for week in range(1, 13)]
+HOST = 'testserver'
+PASSWORD = 'benchmark-password'
+
+
+def urlconf(api):
+    """A root URLconf serving the hot endpoints from ``api`` (``views`` or ``async_views``)."""
+    # A class rather than a module: URL resolvers are cached by (hashable) urlconf
+    return type('URLConf', (), {'urlpatterns': [path('api/', include([
+        path('auth/login/', api.login_user),
+        path('auth/user/', api.get_user),
+        path('users/settings/', api.user_settings),
+        path('plans/', api.plan_list_create),
+        path('plans/<int:plan_id>/', api.plan_detail),
+    ]))]})
+
+
+def percentile(timings, pct):
+    timings = sorted(timings)
+    return timings[min(len(timings) - 1, int(len(timings) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = ('Compare requests/sec and p99 latency of the sync views under WSGI with the async views '
+            'under ASGI, driving both handlers in-process on a throwaway test database')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--login-requests', type=int, default=40,
+                            help='login requests (each one hashes a password)')
+        parser.add_argument('--wsgi-threads', type=int, default=8,
+                            help='worker threads standing in for the WSGI server')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = CustomUser.objects.create_user(email='bench@example.com', password=PASSWORD)
+            token = Token.objects.create(user=user).key
+            Plan.objects.bulk_create([
+                Plan(user=user, title=f'Plan {i}', plan_type='past-clients', channels=['email', 'text'],
+                     timeline='90days', status='completed', content=SAMPLE_CONTENT)
+                for i in range(100)
+            ])
+            plan_id = Plan.objects.filter(user=user).values_list('id', flat=True).first()
+            login = json.dumps({'email': user.email, 'password': PASSWORD}).encode()
+
+            endpoints = [
+                ('GET /auth/user/', 'GET', '/api/auth/user/', b'', options['requests']),
+                ('GET /users/settings/', 'GET', '/api/users/settings/', b'', options['requests']),
+                ('GET /plans/', 'GET', '/api/plans/', b'', options['requests']),
+                ('GET /plans/<id>/', 'GET', f'/api/plans/{plan_id}/', b'', options['requests']),
+                ('POST /auth/login/', 'POST', '/api/auth/login/', login, options['login_requests']),
+            ]
+
+            self.stdout.write(f"{'endpoint':<22} {'server':<6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+            for label, method, url, body, count in endpoints:
+                request = (method, url, body, token)
+                with override_settings(ROOT_URLCONF=urlconf(views), ALLOWED_HOSTS=[HOST]):
+                    wsgi = self.run_wsgi(request, count, options['concurrency'], options['wsgi_threads'])
+                with override_settings(ROOT_URLCONF=urlconf(async_views), ALLOWED_HOSTS=[HOST]):
+                    asgi = asyncio.run(self.run_asgi(request, count, options['concurrency']))
+                for server, (elapsed, timings, errors) in (('wsgi', wsgi), ('asgi', asgi)):
+                    self.stdout.write(
+                        f"{label:<22} {server:<6} {len(timings) / elapsed:>9.1f} "
+                        f"{statistics.median(timings):>9.2f} {percentile(timings, 99):>9.2f} {errors:>7}"
+                    )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run_wsgi(self, request, count, concurrency, threads):
+        method, url, body, token = request
+        handler = WSGIHandler()
+
+        def call(_):
+            environ = {
+                'REQUEST_METHOD': method, 'PATH_INFO': url, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST, 'SERVER_PROTOCOL': 'HTTP/1.1',
+                'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(body)),
+                'HTTP_AUTHORIZATION': f'Token {token}',
+                'wsgi.input': BytesIO(body), 'wsgi.url_scheme': 'http', 'wsgi.errors': BytesIO(),
+                'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+            }
+            statuses = []
+            started = time.perf_counter()
+            response = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            response.close()
+            return (time.perf_counter() - started) * 1000, int(statuses[0][:3])
+
+        # A WSGI server can only have as many requests in flight as it has threads
+        started = time.perf_counter()
+        with ThreadPoolExecutor(min(threads, concurrency)) as pool:
+            results = list(pool.map(call, range(count)))
+        return self.summarize(started, results)
+
+    async def run_asgi(self, request, count, concurrency):
+        method, url, body, token = request
+        handler = ASGIHandler()
+        slots = asyncio.Semaphore(concurrency)
+
+        async def call():
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                'scheme': 'http', 'path': url, 'raw_path': url.encode(), 'root_path': '', 'query_string': b'',
+                'server': (HOST, 80), 'client': ('127.0.0.1', 50000),
+                'headers': [
+                    (b'host', HOST.encode()), (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()), (b'authorization', f'Token {token}'.encode()),
+                ],
+            }
+            messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            status = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                # Nothing more to read; the handler waits here for a disconnect that never comes
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with slots:
+                started = time.perf_counter()
+                await handler(scope, receive, send)
+                return (time.perf_counter() - started) * 1000, status[0]
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(call() for _ in range(count)))
+        return self.summarize(started, results)
+
+    def summarize(self, started, results):
+        elapsed = time.perf_counter() - started
+        timings = [ms for ms, _ in results]
+        errors = sum(1 for _, code in results if code >= 400)
+        return elapsed, timings, errors
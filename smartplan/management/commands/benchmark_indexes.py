@@ -0,0 +1,117 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from smartplan.models import CustomUser, GeneratedPlan, Plan
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database and compare query plans and timings of the '
+        'per-user Plan/GeneratedPlan queries with and without the composite indexes'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--plans', type=int, default=1_000_000)
+        parser.add_argument('--generated', type=int, default=None,
+                            help='GeneratedPlan rows to seed (defaults to --plans)')
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.seed(options['users'], options['plans'], options['generated'] or options['plans'])
+            user = CustomUser.objects.order_by('?').first()
+            plan = Plan.objects.filter(user=user).first()
+            queries = self.queries(user, plan)
+
+            indexes = [(Plan, index) for index in Plan._meta.indexes]
+            indexes += [(GeneratedPlan, index) for index in GeneratedPlan._meta.indexes]
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.remove_index(model, index)
+            before = self.measure(queries, options['repeat'])
+
+            with connection.schema_editor() as editor:
+                for model, index in indexes:
+                    editor.add_index(model, index)
+            if connection.vendor == 'sqlite':
+                with connection.cursor() as cursor:
+                    cursor.execute('ANALYZE')
+            after = self.measure(queries, options['repeat'])
+
+            for name in queries:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                for label, results in (('without indexes', before), ('with indexes', after)):
+                    plan_text, median_ms = results[name]
+                    self.stdout.write(f"  {label}: {median_ms:.3f} ms (median of {options['repeat']})")
+                    for line in plan_text.splitlines():
+                        self.stdout.write(f"    {line}")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, user_count, plan_count, generated_count):
+        self.stdout.write(f"Seeding {user_count} users, {plan_count} plans, {generated_count} generated plans...")
+        users = CustomUser.objects.bulk_create(
+            [CustomUser(email=f"bench{i}@example.com", password='!') for i in range(user_count)],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = [u.id for u in users]
+        statuses = [choice[0] for choice in Plan.STATUS_CHOICES]
+        start = timezone.now() - timedelta(days=365)
+
+        for offset in range(0, plan_count, BATCH_SIZE):
+            Plan.objects.bulk_create([
+                Plan(
+                    user_id=random.choice(user_ids),
+                    title=f"Plan {i}",
+                    plan_type='past-clients',
+                    channels=['email'],
+                    timeline='30days',
+                    status=random.choice(statuses),
+                )
+                for i in range(offset, min(offset + BATCH_SIZE, plan_count))
+            ])
+        # auto_now_add ignores explicit values, so spread created_at out afterwards
+        for offset in range(0, plan_count, BATCH_SIZE):
+            Plan.objects.filter(id__gt=offset, id__lte=offset + BATCH_SIZE).update(
+                created_at=start + timedelta(seconds=offset)
+            )
+
+        plan_rows = list(Plan.objects.values_list('id', 'user_id'))
+        for offset in range(0, generated_count, BATCH_SIZE):
+            batch = []
+            for i in range(offset, min(offset + BATCH_SIZE, generated_count)):
+                plan_id, user_id = random.choice(plan_rows)
+                batch.append(GeneratedPlan(plan_id=plan_id, user_id=user_id, content='## Week 1 - Email\n...'))
+            GeneratedPlan.objects.bulk_create(batch)
+
+    def queries(self, user, plan):
+        return {
+            'plan list (user, -created_at)': lambda: Plan.objects.filter(user=user).order_by('-created_at', '-id')[:20],
+            'plans by status (user, status)': lambda: Plan.objects.filter(user=user, status='generating').order_by(),
+            'plan detail (id, user)': lambda: Plan.objects.filter(id=plan.id, user=user),
+            'generations by user (user, created_at)': lambda: GeneratedPlan.objects.filter(user=user).order_by('-created_at')[:20],
+            'generations by plan (plan, created_at)': lambda: GeneratedPlan.objects.filter(plan=plan).order_by('-created_at')[:20],
+        }
+
+    def measure(self, queries, repeat):
+        results = {}
+        for name, build in queries.items():
+            plan_text = build().explain()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(build())
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (plan_text, statistics.median(timings))
+        return results
@@ -0,0 +1,61 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.renderers import JSONRenderer
+
+from smartplan.models import CustomUser, Plan
+from smartplan.serializers import PlanReadSerializer, PlanSerializer
+from smartplan.steps import attach_step_content
+
+SAMPLE_CONTENT = [{'title': f'Week {week} - Email', 'content': 'Touchpoint copy. ' * 20} for week in range(1, 13)]
+
+
+class Command(BaseCommand):
+    help = 'Compare PlanSerializer with the values()-based PlanReadSerializer on a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 10_000])
+        parser.add_argument('--repeat', type=int, default=10)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = CustomUser.objects.create_user(email='bench@example.com', password=None)
+            renderer = JSONRenderer()
+            seeded = 0
+            self.stdout.write(f"{'rows':>8} {'PlanSerializer ms':>18} {'PlanReadSerializer ms':>22} {'speedup':>8}")
+            for size in sorted(options['sizes']):
+                Plan.objects.bulk_create([
+                    Plan(user=user, title=f'Plan {i}', plan_type='past-clients', channels=['email', 'text'],
+                         timeline='90days', status='completed', content=SAMPLE_CONTENT)
+                    for i in range(seeded, size)
+                ], batch_size=500)
+                seeded = max(seeded, size)
+                plans = Plan.objects.filter(user=user).order_by('-created_at', '-id')[:size]
+
+                # Timings cover query + serialization; JSON rendering is identical for both
+                def drf():
+                    return PlanSerializer(plans.all(), many=True).data
+
+                def fast():
+                    reader = PlanReadSerializer()
+                    return reader.many(attach_step_content(list(plans.values(*reader.columns()))))
+
+                if renderer.render(drf()) != renderer.render(fast()):
+                    self.stderr.write(self.style.ERROR(f"Output mismatch at {size} rows"))
+                drf_ms = self.time(drf, options['repeat'])
+                fast_ms = self.time(fast, options['repeat'])
+                self.stdout.write(f"{size:>8} {drf_ms:>18.2f} {fast_ms:>22.2f} {drf_ms / fast_ms:>7.1f}x")
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
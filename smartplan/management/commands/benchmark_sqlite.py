@@ -0,0 +1,161 @@
+import copy
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection, transaction
+
+from smartplan.benchmarks.runner import percentile
+from smartplan.db import is_lock_error, retry_on_lock
+from smartplan.instrumentation import DB_LOCK_RETRIES
+from smartplan.models import Plan, PlanStep
+
+# The settings before the production profile: rollback journal, deferred
+# transactions, a new connection per request and no retries
+BASELINE = {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'OPTIONS': {}}
+
+
+class Command(BaseCommand):
+    help = ('Run concurrent plan writers (and readers) against a throwaway SQLite file with the old '
+            'settings and with the production profile from DATABASES, and compare throughput')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--duration', type=float, default=5.0, help='seconds per profile')
+        parser.add_argument('--steps', type=int, default=12, help='PlanStep rows written with each plan')
+        parser.add_argument('--profile', choices=['baseline', 'tuned', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to SQLite')
+        tuned = settings.DATABASES[connection.alias]
+        profiles = {
+            'baseline': (BASELINE, False),
+            'tuned': ({key: copy.deepcopy(tuned.get(key)) for key in BASELINE}, True),
+        }
+        names = list(profiles) if options['profile'] == 'both' else [options['profile']]
+
+        self.stdout.write(
+            f"{'profile':<9} {'writes/s':>9} {'reads/s':>9} {'write p50':>10} {'write p99':>10} "
+            f"{'failed':>7} {'retries':>8}"
+        )
+        results = {}
+        for name in names:
+            overrides, retry = profiles[name]
+            result = results[name] = self.run_profile(overrides, retry, options)
+            line = (
+                f"{name:<9} {result['writes_per_second']:>9.1f} {result['reads_per_second']:>9.1f} "
+                f"{result['write_p50']:>8.2f}ms {result['write_p99']:>8.2f}ms {result['failed']:>7} "
+                f"{result['retries']:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if result['failed'] else line)
+        if len(results) == 2 and results['baseline']['writes_per_second']:
+            gain = results['tuned']['writes_per_second'] / results['baseline']['writes_per_second']
+            self.stdout.write(self.style.SUCCESS(f"Tuned profile: {gain:.2f}x the baseline write throughput"))
+
+    def run_profile(self, overrides, retry, options):
+        # Other threads open their connections from this same settings dict
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in overrides}
+        old_name = settings_dict['NAME']
+        old_test_name = settings_dict['TEST'].get('NAME')
+        connection.close()
+        settings_dict.update(copy.deepcopy(overrides))
+        with tempfile.TemporaryDirectory() as tempdir:
+            settings_dict['TEST']['NAME'] = str(Path(tempdir) / 'benchmark.sqlite3')
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                user = get_user_model().objects.create_user(email='bench-sqlite@example.com', password=None)
+                return self.drive(user.pk, retry, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                settings_dict.update(saved)
+                settings_dict['TEST']['NAME'] = old_test_name
+
+    def drive(self, user_id, retry, options):
+        steps = options['steps']
+
+        def write_plan(i):
+            # Read, then write in one transaction, like the plan views do
+            with transaction.atomic():
+                Plan.objects.filter(user_id=user_id).count()
+                plan = Plan.objects.create(
+                    user_id=user_id, title=f'Bench plan {i}', plan_type='past-clients',
+                    channels=['email', 'text'], timeline='30days', status='draft',
+                )
+                PlanStep.objects.bulk_create(
+                    PlanStep(plan=plan, position=n, day_offset=n * 2, channel='email', title=f'Day {n * 2}')
+                    for n in range(steps)
+                )
+                Plan.objects.filter(pk=plan.pk).update(status='completed')
+
+        if retry:
+            write_plan = retry_on_lock(write_plan)
+
+        deadline = time.perf_counter() + options['duration']
+        lock = threading.Lock()
+        latencies = []
+        counts = {'reads': 0, 'failed': 0}
+        errors = []
+
+        def writer(n):
+            i = 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        write_plan(n * 1000000 + i)
+                    except OperationalError as e:
+                        if not is_lock_error(e):
+                            raise
+                        with lock:
+                            counts['failed'] += 1
+                    else:
+                        with lock:
+                            latencies.append((time.perf_counter() - started) * 1000)
+                    i += 1
+                    # End of "request": closes the connection unless CONN_MAX_AGE keeps it
+                    close_old_connections()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        def reader():
+            try:
+                while time.perf_counter() < deadline:
+                    list(Plan.objects.filter(user_id=user_id).order_by('-id').values('id', 'title', 'status')[:20])
+                    with lock:
+                        counts['reads'] += 1
+                    close_old_connections()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        retries_before = DB_LOCK_RETRIES.total()
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise errors[0]
+
+        return {
+            'writes_per_second': len(latencies) / elapsed,
+            'reads_per_second': counts['reads'] / elapsed,
+            'write_p50': statistics.median(latencies) if latencies else 0.0,
+            'write_p99': percentile(latencies, 99) if latencies else 0.0,
+            'failed': counts['failed'],
+            'retries': DB_LOCK_RETRIES.total() - retries_before,
+        }
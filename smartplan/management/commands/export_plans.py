@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from smartplan.export import CONTENT_TYPES, export_stream
+from smartplan.models import CustomUser, Plan
+
+
+class Command(BaseCommand):
+    help = "Export every user's plans and generated plans (or one user's) as NDJSON or CSV, streamed in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=sorted(CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--gzip', action='store_true', help='gzip the output')
+        parser.add_argument('--user', help='only export this user (id or email)')
+        parser.add_argument('--output', '-o', help='file to write (default: stdout)')
+        parser.add_argument('--chunk-size', type=int, help='plans read per query (default: SMARTPLAN_EXPORT_CHUNK_SIZE)')
+        parser.add_argument('--database', default=None, help='database alias to read from (default: routed)')
+
+    def handle(self, *args, **options):
+        plans = Plan.objects.all()
+        if options['user']:
+            lookup = {'pk': options['user']} if options['user'].isdigit() else {'email__iexact': options['user']}
+            user = CustomUser.objects.filter(**lookup).first()
+            if user is None:
+                raise CommandError(f"No user matches '{options['user']}'")
+            plans = plans.filter(user=user)
+
+        stream = export_stream(plans, options['format'], options['gzip'], options['database'], options['chunk_size'])
+        written = 0
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for chunk in stream:
+                out.write(chunk)
+                written += len(chunk)
+        finally:
+            if options['output']:
+                out.close()
+            else:
+                out.flush()
+        if options['output']:
+            self.stdout.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
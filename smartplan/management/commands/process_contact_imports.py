@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from smartplan.contacts import run_import
+from smartplan.models import ContactImport
+
+
+class Command(BaseCommand):
+    help = 'Run contact imports left pending or processing (e.g. by a restart); --failed also retries failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also retry imports that failed')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'processing', 'failed'] if options['failed'] else ['pending', 'processing']
+        counts = {'completed': 0, 'failed': 0}
+        for import_id in ContactImport.objects.filter(status__in=statuses).values_list('id', flat=True).iterator():
+            job = run_import(import_id, statuses)
+            counts[job.status] = counts.get(job.status, 0) + 1
+            self.stdout.write(
+                f"Import {job.id}: {job.status}, {job.created_count} created, {job.duplicate_count} duplicates, "
+                f"{job.invalid_count} invalid"
+            )
+        self.stdout.write(f"Processed imports: {counts['completed']} completed, {counts['failed']} failed")
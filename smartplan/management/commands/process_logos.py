@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from smartplan.logos import process_logo
+from smartplan.models import LogoAsset
+
+
+class Command(BaseCommand):
+    help = 'Render variants for logos left pending or processing (e.g. by a restart); --failed also retries failures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--failed', action='store_true', help='Also retry logos that failed to process')
+
+    def handle(self, *args, **options):
+        statuses = ['pending', 'processing', 'failed'] if options['failed'] else ['pending', 'processing']
+        counts = {'ready': 0, 'failed': 0}
+        for asset_id in LogoAsset.objects.filter(status__in=statuses).values_list('id', flat=True).iterator():
+            asset = process_logo(asset_id, statuses)
+            counts[asset.status] = counts.get(asset.status, 0) + 1
+        self.stdout.write(f"Processed logos: {counts['ready']} ready, {counts['failed']} failed")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from smartplan import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the FTS5 full-text index over plans and generated content'
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            raise CommandError('Full-text search requires the SQLite backend')
+        counts = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {counts['Plan']} plans and {counts['GeneratedPlan']} generated plans"
+        ))
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from smartplan import schedule
+
+
+class Command(BaseCommand):
+    help = "Re-expand every plan's channels and timeline into dated calendar touchpoints"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        plans, added, removed = schedule.expand_all(options['database'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f"Expanded {plans} plans in {time.perf_counter() - started:.2f}s: "
+            f"{added} touchpoints added, {removed} removed"
+        ))
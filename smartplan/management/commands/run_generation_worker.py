@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from smartplan.generation import claim_jobs, default_worker_id, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Claim queued plan generation jobs and run them on a thread or process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.SMARTPLAN_WORKER_CONCURRENCY)
+        parser.add_argument('--mode', choices=['thread', 'process'], default='thread')
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--stale-after', type=int, default=settings.SMARTPLAN_JOB_TIMEOUT,
+                            help='Seconds after which a running job is assumed dead and requeued')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is drained instead of polling forever')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        worker_id = default_worker_id()
+        if options['mode'] == 'process':
+            # Forked children must not inherit the parent's sqlite handle.
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.stdout.write(f"Worker {worker_id} started ({options['mode']} x {workers})")
+        pending = set()
+        processed = 0
+        try:
+            with executor:
+                while True:
+                    requeue_stale_jobs(options['stale_after'])
+                    if len(pending) < workers:
+                        claimed = claim_jobs(workers - len(pending), worker_id)
+                        pending.update(executor.submit(run_job, job_id) for job_id in claimed)
+
+                    if not pending:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                    done, pending = wait(pending, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                    for future in done:
+                        processed += 1
+                        if future.exception():
+                            self.stderr.write(f"Job crashed: {future.exception()}")
+        except KeyboardInterrupt:
+            self.stdout.write('Shutting down')
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
@@ -0,0 +1,40 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from smartplan.fields import zstandard
+from smartplan.models import GeneratedPlan, Plan
+
+
+class Command(BaseCommand):
+    help = 'Train a zstd dictionary per plan_type from existing plan content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', required=True)
+        parser.add_argument('--plan-type', choices=[choice[0] for choice in Plan.PLAN_TYPES])
+        parser.add_argument('--samples', type=int, default=2000)
+        parser.add_argument('--size', type=int, default=112 * 1024, help='Dictionary size in bytes')
+
+    def handle(self, *args, **options):
+        if zstandard is None:
+            raise CommandError('The zstandard package is required to train dictionaries')
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+        plan_types = [options['plan_type']] if options['plan_type'] else [choice[0] for choice in Plan.PLAN_TYPES]
+        paths = {}
+        for plan_type in plan_types:
+            generations = GeneratedPlan.objects.filter(plan__plan_type=plan_type).order_by('-id')
+            samples = [generation.content.encode('utf-8') for generation in generations[:options['samples']]]
+            if len(samples) < 10:
+                self.stderr.write(f"Skipping {plan_type}: only {len(samples)} samples")
+                continue
+            dictionary = zstandard.train_dictionary(options['size'], samples)
+            path = os.path.join(options['output_dir'], f"{plan_type}.zdict")
+            with open(path, 'wb') as f:
+                f.write(dictionary.as_bytes())
+            paths[plan_type] = path
+            self.stdout.write(f"Trained {plan_type} dictionary from {len(samples)} samples -> {path}")
+
+        if paths:
+            self.stdout.write('Add to settings (existing rows keep their codec until rewritten):')
+            self.stdout.write(f"SMARTPLAN_COMPRESSION_CODEC = 'zstd'\nSMARTPLAN_COMPRESSION_DICTIONARIES = {paths!r}")
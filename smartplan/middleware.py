@@ -0,0 +1,118 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import instrumentation, routers
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """``WhiteNoiseMiddleware`` that can sit in an async middleware chain.
+
+    WhiteNoise is sync-only, which makes Django run every request under ASGI
+    (including async views) through a thread. Looking up a static file is an
+    in-memory dict lookup once files are indexed at startup, so it is safe to
+    do on the event loop; everything else is awaited directly.
+    """
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """Time each request, add a ``Server-Timing`` header and feed the ``/api/metrics`` histograms."""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings, token = instrumentation.begin()
+        try:
+            return instrumentation.record(request, self.get_response(request), timings)
+        finally:
+            instrumentation.end(token)
+
+    async def __acall__(self, request):
+        timings, token = instrumentation.begin()
+        try:
+            return instrumentation.record(request, await self.get_response(request), timings)
+        finally:
+            instrumentation.end(token)
+
+
+class ReplicaRoutingMiddleware:
+    """Let ``smartplan.routers`` send this request's reads to a replica, and pin clients that write."""
+
+    async_capable = True
+    sync_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not settings.SMARTPLAN_DB_REPLICAS:
+            return self.get_response(request)
+        state, response = self.route(request, routers.is_pinned(request))
+        if routers.retry_on_primary(request, state):
+            response.close()
+            state, response = self.route(request, pinned=True)
+        if state.wrote:
+            routers.pin(request, response)
+        return response
+
+    def route(self, request, pinned):
+        state, token = routers.begin(request, pinned)
+        try:
+            return state, self.get_response(request)
+        finally:
+            routers.end(token)
+
+    async def __acall__(self, request):
+        if not settings.SMARTPLAN_DB_REPLICAS:
+            return await self.get_response(request)
+        state, response = await self.aroute(request, await routers.ais_pinned(request))
+        if routers.retry_on_primary(request, state):
+            response.close()
+            state, response = await self.aroute(request, pinned=True)
+        if state.wrote:
+            await routers.apin(request, response)
+        return response
+
+    async def aroute(self, request, pinned):
+        state, token = routers.begin(request, pinned)
+        try:
+            return state, await self.get_response(request)
+        finally:
+            routers.end(token)
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0003_generationjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='bypass_cache',
+            field=models.BooleanField(default=False),
+        ),
+    ]
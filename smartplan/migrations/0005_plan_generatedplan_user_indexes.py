@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0004_generationjob_bypass_cache'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedplan',
+            index=models.Index(fields=['user', 'created_at'], name='genplan_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='generatedplan',
+            index=models.Index(fields=['plan', 'created_at'], name='genplan_plan_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='plan_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['user', 'status'], name='plan_user_status_idx'),
+        ),
+    ]
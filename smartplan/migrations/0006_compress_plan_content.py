@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:15
+
+import smartplan.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0005_plan_generatedplan_user_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='generatedplan',
+            name='content',
+            field=smartplan.fields.CompressedTextField(dictionary_key='plan.plan_type'),
+        ),
+        migrations.AlterField(
+            model_name='plan',
+            name='content',
+            field=smartplan.fields.CompressedJSONField(blank=True, dictionary_key='plan_type', null=True),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:15
+
+from django.db import migrations
+
+from smartplan.fields import compress, decompress
+
+CHUNK_SIZE = 1000
+COLUMNS = [
+    ('smartplan_plan', 'content'),
+    ('smartplan_generatedplan', 'content'),
+]
+
+
+def convert(schema_editor, should_convert, transform):
+    connection = schema_editor.connection
+    for table, column in COLUMNS:
+        last_id = 0
+        while True:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT id, {column} FROM {table} WHERE id > %s AND {column} IS NOT NULL ORDER BY id LIMIT %s',
+                    [last_id, CHUNK_SIZE],
+                )
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                updates = [(transform(value), pk) for pk, value in rows if should_convert(value)]
+                if updates:
+                    cursor.executemany(f'UPDATE {table} SET {column} = %s WHERE id = %s', updates)
+            last_id = rows[-1][0]
+
+
+def compress_rows(apps, schema_editor):
+    # Rows written before 0006 are still plain text (JSON for Plan.content)
+    binary = schema_editor.connection.Database.Binary
+    convert(
+        schema_editor,
+        lambda value: isinstance(value, str),
+        lambda value: binary(compress(value.encode('utf-8'))),
+    )
+
+
+def decompress_rows(apps, schema_editor):
+    convert(
+        schema_editor,
+        lambda value: not isinstance(value, str),
+        lambda value: decompress(value).decode('utf-8'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0006_compress_plan_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(compress_rows, decompress_rows),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0007_compress_existing_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanStep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('day_offset', models.PositiveIntegerField()),
+                ('channel', models.CharField(blank=True, choices=[('email', 'Email'), ('voicemail', 'Voicemail'), ('video', 'Video'), ('text', 'Text')], max_length=20)),
+                ('title', models.CharField(max_length=255)),
+                ('content', models.TextField(blank=True)),
+                ('plan', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='steps', to='smartplan.plan')),
+            ],
+            options={
+                'ordering': ['plan', 'position'],
+                'indexes': [models.Index(fields=['plan', 'day_offset', 'channel'], name='planstep_plan_day_idx'), models.Index(fields=['plan', 'channel', 'day_offset'], name='planstep_plan_channel_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'position'), name='planstep_plan_position_uniq')],
+            },
+        ),
+    ]
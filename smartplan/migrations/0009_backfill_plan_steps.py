@@ -0,0 +1,71 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:40
+
+from django.db import migrations
+
+from smartplan.steps import parse_step_title
+
+CHUNK_SIZE = 1000
+
+
+def plans_in_chunks(queryset):
+    last_id = 0
+    while True:
+        plans = list(queryset.filter(id__gt=last_id).order_by('id')[:CHUNK_SIZE])
+        if not plans:
+            break
+        yield plans
+        last_id = plans[-1].id
+
+
+def content_to_steps(apps, schema_editor):
+    Plan = apps.get_model('smartplan', 'Plan')
+    PlanStep = apps.get_model('smartplan', 'PlanStep')
+    queryset = Plan.objects.exclude(status='generating').exclude(content__isnull=True)
+    for plans in plans_in_chunks(queryset):
+        steps = []
+        moved = []
+        for plan in plans:
+            if not isinstance(plan.content, list):
+                continue
+            day_offset = 0
+            for position, section in enumerate(plan.content):
+                if not isinstance(section, dict):
+                    section = {'title': '', 'content': str(section)}
+                day_offset, channel = parse_step_title(section.get('title'), day_offset)
+                steps.append(PlanStep(
+                    plan_id=plan.id,
+                    position=position,
+                    day_offset=day_offset,
+                    channel=channel,
+                    title=(section.get('title') or '')[:255],
+                    content=section.get('content') or '',
+                ))
+            moved.append(plan.id)
+        PlanStep.objects.bulk_create(steps)
+        Plan.objects.filter(id__in=moved).update(content=None)
+
+
+def steps_to_content(apps, schema_editor):
+    Plan = apps.get_model('smartplan', 'Plan')
+    PlanStep = apps.get_model('smartplan', 'PlanStep')
+    queryset = Plan.objects.filter(content__isnull=True, steps__isnull=False).distinct()
+    for plans in plans_in_chunks(queryset):
+        sections = {plan.id: [] for plan in plans}
+        steps = PlanStep.objects.filter(plan_id__in=sections).order_by('plan_id', 'position')
+        for plan_id, title, content in steps.values_list('plan_id', 'title', 'content'):
+            sections[plan_id].append({'title': title, 'content': content})
+        for plan in plans:
+            plan.content = sections[plan.id]
+        Plan.objects.bulk_update(plans, ['content'])
+        steps.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0008_planstep'),
+    ]
+
+    operations = [
+        migrations.RunPython(content_to_steps, steps_to_content),
+    ]
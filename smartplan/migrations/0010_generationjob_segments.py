@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0009_backfill_plan_steps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationjob',
+            name='segments',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
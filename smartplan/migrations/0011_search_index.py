@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 14:20
+
+from django.db import migrations
+
+# Content is stored compressed, so the index is a regular (not external
+# content) FTS5 table kept in sync from Python; fill it for existing rows
+# with `manage.py rebuild_search_index`.
+CREATE = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS smartplan_plan_fts USING fts5("
+    "owner, title, description, content, tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS smartplan_generatedplan_fts USING fts5("
+    "content, tokenize='porter unicode61')",
+]
+DROP = [
+    "DROP TABLE IF EXISTS smartplan_plan_fts",
+    "DROP TABLE IF EXISTS smartplan_generatedplan_fts",
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0010_generationjob_segments'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(CREATE), run(DROP)),
+    ]
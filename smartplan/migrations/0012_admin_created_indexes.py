@@ -0,0 +1,21 @@
+# Generated by Django 5.1.6 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0011_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='generatedplan',
+            index=models.Index(fields=['created_at'], name='genplan_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='plan',
+            index=models.Index(fields=['created_at'], name='plan_created_idx'),
+        ),
+    ]
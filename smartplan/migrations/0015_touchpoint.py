@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from smartplan.schedule import expand_all
+
+
+def expand_existing_plans(apps, schema_editor):
+    expand_all(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0014_contacts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Touchpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('day_offset', models.PositiveIntegerField()),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('voicemail', 'Voicemail'), ('video', 'Video'), ('text', 'Text')], max_length=20)),
+                ('plan', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='touchpoints', to='smartplan.plan')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='touchpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'date', 'plan'], name='touchpoint_user_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('plan', 'day_offset', 'channel'), name='touchpoint_plan_day_channel_uniq')],
+            },
+        ),
+        migrations.RunPython(expand_existing_plans, migrations.RunPython.noop),
+    ]
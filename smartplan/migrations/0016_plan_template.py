@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0015_touchpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='plans', to='smartplan.template'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:30
+
+import smartplan.fields
+from django.db import migrations
+
+from smartplan.fields import compress, decompress
+
+CHUNK_SIZE = 1000
+
+
+def convert(schema_editor, should_convert, transform):
+    connection = schema_editor.connection
+    last_id = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT id, content FROM smartplan_planstep WHERE id > %s ORDER BY id LIMIT %s',
+                [last_id, CHUNK_SIZE],
+            )
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            updates = [(transform(value), pk) for pk, value in rows if should_convert(value)]
+            if updates:
+                cursor.executemany('UPDATE smartplan_planstep SET content = %s WHERE id = %s', updates)
+        last_id = rows[-1][0]
+
+
+def compress_rows(apps, schema_editor):
+    # The table rebuild keeps the existing plain text values
+    binary = schema_editor.connection.Database.Binary
+    convert(
+        schema_editor,
+        lambda value: isinstance(value, str),
+        lambda value: binary(compress(value.encode('utf-8'))),
+    )
+
+
+def decompress_rows(apps, schema_editor):
+    convert(
+        schema_editor,
+        lambda value: not isinstance(value, str),
+        lambda value: decompress(value).decode('utf-8'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0016_plan_template'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='planstep',
+            name='content',
+            field=smartplan.fields.CompressedTextField(blank=True, dictionary_key='plan.plan_type'),
+        ),
+        migrations.RunPython(compress_rows, decompress_rows),
+    ]
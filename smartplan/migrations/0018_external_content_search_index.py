@@ -0,0 +1,99 @@
+# Generated by Django 5.1.6 on 2026-10-18 12:45
+
+from django.db import migrations
+
+from smartplan.fields import decompress
+
+# The indexes become external-content tables over these views, so the text
+# is no longer stored a second time, uncompressed, inside the FTS tables.
+# VIEWS is a frozen copy of smartplan.search.VIEWS as of this migration, so
+# that it keeps building the same index whatever search.py later becomes;
+# the app's current views and index triggers are created on post_migrate.
+# smartplan_text() decodes compressed columns; the app registers it on
+# every connection (smartplan.search.register_functions). The views are
+# dropped again at the end: table rebuilds in later migrations fail while
+# they exist, and post_migrate creates the app's current ones.
+VIEWS = [
+    "CREATE VIEW smartplan_plan_search AS "
+    "SELECT p.id, 'u' || p.user_id AS owner, p.title, p.description, ("
+    "SELECT group_concat(s.title || char(10) || smartplan_text(s.content), char(10) || char(10)) FROM ("
+    "SELECT title, content FROM smartplan_planstep WHERE plan_id = p.id ORDER BY position) s"
+    ") AS content FROM smartplan_plan p",
+    "CREATE VIEW smartplan_generatedplan_search AS "
+    "SELECT id, smartplan_text(content) AS content FROM smartplan_generatedplan",
+]
+TABLES = [
+    "CREATE VIRTUAL TABLE smartplan_plan_fts USING fts5("
+    "owner, title, description, content, content='smartplan_plan_search', content_rowid='id', "
+    "tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE smartplan_generatedplan_fts USING fts5("
+    "content, content='smartplan_generatedplan_search', content_rowid='id', tokenize='porter unicode61')",
+]
+REGULAR_TABLES = [
+    "CREATE VIRTUAL TABLE smartplan_plan_fts USING fts5("
+    "owner, title, description, content, tokenize='porter unicode61')",
+    "CREATE VIRTUAL TABLE smartplan_generatedplan_fts USING fts5("
+    "content, tokenize='porter unicode61')",
+]
+DROP_TABLES = [
+    "DROP TABLE IF EXISTS smartplan_plan_fts",
+    "DROP TABLE IF EXISTS smartplan_generatedplan_fts",
+]
+DROP_VIEWS = [
+    "DROP VIEW IF EXISTS smartplan_plan_search",
+    "DROP VIEW IF EXISTS smartplan_generatedplan_search",
+]
+
+
+def stored_text(value):
+    if value is None or isinstance(value, str):
+        return value
+    return decompress(value).decode('utf-8')
+
+
+def prepare(schema_editor):
+    connection = schema_editor.connection
+    connection.ensure_connection()
+    connection.connection.create_function('smartplan_text', 1, stored_text, deterministic=True)
+
+
+def to_external_content(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    prepare(schema_editor)
+    for sql in DROP_TABLES + VIEWS + TABLES:
+        schema_editor.execute(sql)
+    # Index the rows that already exist
+    for table in ('smartplan_plan_fts', 'smartplan_generatedplan_fts'):
+        schema_editor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+    for sql in DROP_VIEWS:
+        schema_editor.execute(sql)
+
+
+def to_regular(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    prepare(schema_editor)
+    for sql in DROP_VIEWS + VIEWS + DROP_TABLES + REGULAR_TABLES:
+        schema_editor.execute(sql)
+    schema_editor.execute(
+        "INSERT INTO smartplan_plan_fts (rowid, owner, title, description, content) "
+        "SELECT id, owner, title, description, coalesce(content, '') FROM smartplan_plan_search"
+    )
+    schema_editor.execute(
+        "INSERT INTO smartplan_generatedplan_fts (rowid, content) "
+        "SELECT id, coalesce(content, '') FROM smartplan_generatedplan_search"
+    )
+    for sql in DROP_VIEWS:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0017_compress_plan_step_content'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_external_content, to_regular),
+    ]
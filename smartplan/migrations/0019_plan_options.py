@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 13:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smartplan', '0018_external_content_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='plan',
+            name='options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.contrib.auth.models import User, AbstractUser, BaseUserManager
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.conf import settings
 
+from .fields import CompressedJSONField, CompressedTextField
+
 # Create your models here.
 
 class Template(models.Model):
@@ -44,11 +46,20 @@ class GeneratedPlan(models.Model):
         related_name='generated_plans'
     )
     plan = models.ForeignKey('Plan', on_delete=models.CASCADE, related_name='generated_plans')
-    content = models.TextField()
+    content = CompressedTextField(dictionary_key='plan.plan_type')
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='genplan_user_created_idx'),
+            models.Index(fields=['plan', 'created_at'], name='genplan_plan_created_idx'),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['created_at'], name='genplan_created_idx'),
+        ]
+
     def __str__(self):
-        return f"Plan for {self.user.username} using {self.plan.title}"
+        # Only local columns, so listing generated plans never loads their relations
+        return f"Generated plan {self.pk} for plan {self.plan_id}"
 
 class UserProfile(models.Model):
     user = models.OneToOneField(
@@ -95,6 +106,12 @@ class Plan(models.Model):
         ('completed', 'Completed'),
         ('failed', 'Failed')
     ]
+    CHANNEL_CHOICES = [
+        ('email', 'Email'),
+        ('voicemail', 'Voicemail'),
+        ('video', 'Video'),
+        ('text', 'Text')
+    ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='plans')
     title = models.CharField(max_length=255)
@@ -103,16 +120,179 @@ class Plan(models.Model):
     channels = models.JSONField(default=list)
     timeline = models.CharField(max_length=20, choices=TIMELINE_CHOICES)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
-    content = models.JSONField(null=True, blank=True)
+    # Prompt template chosen at creation; generation and regeneration render it
+    template = models.ForeignKey(Template, on_delete=models.SET_NULL, null=True, blank=True, related_name='plans')
+    # Values for the template's options, checked against it at creation
+    options = models.JSONField(default=dict, blank=True)
+    content = CompressedJSONField(null=True, blank=True, dictionary_key='plan_type')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Matches the (created_at, id) keyset used by the plan list
+            models.Index(fields=['user', '-created_at', '-id'], name='plan_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='plan_user_status_idx'),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['created_at'], name='plan_created_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+class PlanStep(models.Model):
+    """One touchpoint of a generated plan, so a day window or a channel can be read without the whole plan."""
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='steps')
+    position = models.PositiveIntegerField()
+    day_offset = models.PositiveIntegerField()
+    channel = models.CharField(max_length=20, choices=Plan.CHANNEL_CHOICES, blank=True)
+    title = models.CharField(max_length=255)
+    content = CompressedTextField(blank=True, dictionary_key='plan.plan_type')
+
+    class Meta:
+        ordering = ['plan', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'position'], name='planstep_plan_position_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['plan', 'day_offset', 'channel'], name='planstep_plan_day_idx'),
+            models.Index(fields=['plan', 'channel', 'day_offset'], name='planstep_plan_channel_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.plan_id} day {self.day_offset} {self.channel}"
+
+class Touchpoint(models.Model):
+    """A dated (week, channel) slot of a plan's schedule; ``smartplan.schedule`` keeps these in sync with the plan."""
+    # The unique constraint and touchpoint_user_date_idx lead with these, so
+    # neither needs an index of its own
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='touchpoints', db_index=False)
+    # The plan's owner, so a calendar range is one index range scan
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='touchpoints',
+                             db_index=False)
+    date = models.DateField()
+    day_offset = models.PositiveIntegerField()
+    channel = models.CharField(max_length=20, choices=Plan.CHANNEL_CHOICES)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['plan', 'day_offset', 'channel'], name='touchpoint_plan_day_channel_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'date', 'plan'], name='touchpoint_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.plan_id} {self.date} {self.channel}"
+
+class GenerationJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='generation_jobs')
+    template = models.ForeignKey(Template, on_delete=models.SET_NULL, null=True, blank=True, related_name='generation_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    bypass_cache = models.BooleanField(default=False)
+    # (day_offset, channel) pairs to generate; null regenerates the whole plan
+    segments = models.JSONField(null=True, blank=True)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='genjob_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} for plan {self.plan_id} ({self.status})"
+
+class Contact(models.Model):
+    """A past client on a plan's contact list; ``email`` and ``phone`` are stored normalized."""
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='contacts')
+    first_name = models.CharField(max_length=100, blank=True)
+    last_name = models.CharField(max_length=100, blank=True)
+    email = models.CharField(max_length=254, blank=True)  # lowercased
+    phone = models.CharField(max_length=16, blank=True)  # E.164
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Also the indexes imports deduplicate against
+            models.UniqueConstraint(fields=['plan', 'email'], condition=~models.Q(email=''),
+                                    name='contact_plan_email_uniq'),
+            models.UniqueConstraint(fields=['plan', 'phone'], condition=~models.Q(phone=''),
+                                    name='contact_plan_phone_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['plan', '-created_at', '-id'], name='contact_plan_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.email or self.phone
+
+class ContactImport(models.Model):
+    """An uploaded contact CSV and the progress of loading it into ``Contact``."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed')
+    ]
+
+    plan = models.ForeignKey(Plan, on_delete=models.CASCADE, related_name='contact_imports')
+    file = models.FileField(upload_to='contact_imports/', max_length=255, blank=True)
+    size = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    # Updated with each committed batch, so an interrupted import resumes after them
+    processed_rows = models.PositiveIntegerField(default=0)
+    processed_bytes = models.PositiveBigIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    duplicate_count = models.PositiveIntegerField(default=0)
+    invalid_count = models.PositiveIntegerField(default=0)
+    invalid_rows = models.JSONField(default=list, blank=True)  # first few {'line', 'error'}
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Import {self.id} for plan {self.plan_id} ({self.status})"
+
+class LogoAsset(models.Model):
+    """An uploaded logo stored once per content hash, plus its resized variants."""
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed')
+    ]
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.FileField(upload_to='logos/', max_length=255)
+    size = models.PositiveIntegerField(default=0)
+    width = models.PositiveIntegerField(null=True, blank=True)
+    height = models.PositiveIntegerField(null=True, blank=True)
+    variants = models.JSONField(default=dict, blank=True)  # variant name -> storage path
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256[:12]
+
 class CustomUserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
@@ -156,6 +336,7 @@ class CustomUser(AbstractUser):
     brand_voice = models.CharField(max_length=50, blank=True, null=True)
     brand_description = models.TextField(blank=True, null=True)
     logo = models.ImageField(upload_to='logos/', blank=True, null=True)
+    logo_asset = models.ForeignKey(LogoAsset, on_delete=models.SET_NULL, null=True, blank=True, related_name='users')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
@@ -0,0 +1,90 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Newest-first keyset pagination on ``(created_at, id)``.
+
+    Unlike offset pagination every page is a single index range scan, so
+    page N costs the same as page 1. The cursor is an opaque encoding of the
+    last row's ``created_at`` and ``id``.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        params = getattr(request, 'query_params', request.GET)
+        try:
+            size = int(params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, obj):
+        # Pages may hold model instances or ``values()`` rows
+        if isinstance(obj, dict):
+            created_at, pk = obj['created_at'], obj['id']
+        else:
+            created_at, pk = obj.created_at, obj.pk
+        raw = f"{created_at.isoformat()}|{pk}"
+        return urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            created_at, pk = urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').rsplit('|', 1)
+            created_at = parse_datetime(created_at)
+            pk = int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def page_queryset(self, queryset, request):
+        """The queryset for the requested page, one row longer to detect a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by('-created_at', '-id')
+
+        # Plain Django requests (async views) have GET instead of query_params
+        params = getattr(request, 'query_params', request.GET)
+        cursor = params.get(self.cursor_query_param)
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request):
+        return self.set_page([row async for row in self.page_queryset(queryset, request)])
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
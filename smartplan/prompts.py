@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+from string import Formatter
+
+from django.conf import settings
+
+
+class PromptRenderError(ValueError):
+    pass
+
+
+def _coerce_text(value):
+    return '' if value is None else str(value)
+
+
+def _coerce_number(value):
+    if value in (None, ''):
+        return ''
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _coerce_boolean(value):
+    if isinstance(value, str):
+        value = value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return 'Yes' if value else 'No'
+
+
+COERCERS = {
+    'text': _coerce_text,
+    'number': _coerce_number,
+    'boolean': _coerce_boolean,
+    'select': _coerce_text,
+}
+
+
+class CompiledTemplate:
+    """A prompt template parsed once into literal chunks and resolved fields.
+
+    ``render`` only does dict lookups, coercion and a single join, so it can
+    be called many times per template without touching the source string.
+    """
+
+    def __init__(self, source, options=()):
+        self.source = source
+        segments = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(source):
+            field = None
+            if field_name is not None:
+                if not field_name.isidentifier():
+                    raise PromptRenderError(f"Unsupported placeholder: {{{field_name}}}")
+                field = (field_name, format_spec or '', conversion)
+            segments.append((literal, field))
+        self.segments = tuple(segments)
+        self.variables = frozenset(field[0] for _, field in segments if field)
+
+        self.coercers = {}
+        self.defaults = {}
+        self.required = []
+        for option in options:
+            self.coercers[option.name] = COERCERS.get(option.option_type, _coerce_text)
+            if option.default_value is not None:
+                self.defaults[option.name] = option.default_value
+            elif option.is_required:
+                self.required.append(option.name)
+
+    def render(self, context):
+        missing = [name for name in self.required if context.get(name) in (None, '')]
+        if missing:
+            raise PromptRenderError(f"Missing required options: {', '.join(missing)}")
+
+        defaults = self.defaults
+        coercers = self.coercers
+        parts = []
+        for literal, field in self.segments:
+            parts.append(literal)
+            if field is None:
+                continue
+            name, format_spec, conversion = field
+            value = context.get(name)
+            if value is None:
+                value = defaults.get(name, '')
+            coerce = coercers.get(name)
+            if coerce is not None:
+                value = coerce(value)
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            parts.append(format(value, format_spec) if format_spec else str(value))
+        return ''.join(parts)
+
+    def render_many(self, contexts, shared=None):
+        if shared:
+            return [self.render({**shared, **context}) for context in contexts]
+        return [self.render(context) for context in contexts]
+
+
+class TemplateCache:
+    """Thread-safe LRU of compiled templates keyed on ``(template.id, updated_at)``."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template):
+        key = (template.pk, template.updated_at)
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+
+        compiled = CompiledTemplate(template.prompt_template, template.options.all())
+        with self._lock:
+            self._entries[key] = compiled
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+template_cache = TemplateCache(getattr(settings, 'SMARTPLAN_PROMPT_CACHE_SIZE', 256))
+
+
+def compile_template(template):
+    return template_cache.get(template)
+
+
+def render_template(template, context):
+    return compile_template(template).render(context)
+
+
+def render_many(template, contexts, shared=None):
+    """Render one template against many contexts, e.g. fanning out to a client list."""
+    return compile_template(template).render_many(contexts, shared=shared)
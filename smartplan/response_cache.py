@@ -0,0 +1,122 @@
+import hashlib
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+from .caching import LRUCache
+from .generation import LLMClient
+
+
+def cache_key(prompt, params):
+    """Content address for a generation: sha256 of the rendered prompt plus model parameters."""
+    payload = json.dumps({'prompt': prompt, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Two-tier cache for model responses.
+
+    The first tier is an in-process LRU with a TTL; the second is a Django
+    cache alias (file based by default) that survives restarts and is shared
+    between workers on the same host.
+    """
+
+    def __init__(self, maxsize, ttl, alias):
+        self.ttl = ttl
+        self.alias = alias
+        self.memory = LRUCache(maxsize, ttl)
+        self._lock = threading.Lock()
+        self.stats = {'memory_hits': 0, 'persistent_hits': 0, 'misses': 0, 'bypassed': 0}
+
+    @property
+    def persistent(self):
+        return caches[self.alias] if self.alias else None
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value
+
+        if self.persistent is not None:
+            value = self.persistent.get(key)
+            if value is not None:
+                self._count('persistent_hits')
+                self.memory.set(key, value)
+                return value
+
+        self._count('misses')
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.persistent is not None:
+            self.persistent.set(key, value, timeout=self.ttl)
+
+    def clear(self):
+        self.memory.clear()
+        with self._lock:
+            for name in self.stats:
+                self.stats[name] = 0
+        if self.persistent is not None:
+            self.persistent.clear()
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats, memory_entries=len(self.memory))
+        lookups = stats['memory_hits'] + stats['persistent_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['persistent_hits']) / lookups if lookups else 0.0
+        return stats
+
+
+response_cache = ResponseCache(
+    maxsize=settings.SMARTPLAN_RESPONSE_CACHE_SIZE,
+    ttl=settings.SMARTPLAN_RESPONSE_CACHE_TTL,
+    alias=settings.SMARTPLAN_RESPONSE_CACHE_ALIAS,
+)
+
+
+class CachedLLMClient(LLMClient):
+    """Wraps another client and serves repeated generations from ``response_cache``."""
+
+    def __init__(self, client, cache=None):
+        self.client = client
+        self.cache = cache or response_cache
+
+    def key_for(self, prompt, params):
+        client_class = type(self.client)
+        return cache_key(prompt, dict(params, client=f"{client_class.__module__}.{client_class.__qualname__}"))
+
+    def complete(self, prompt, bypass_cache=False, **params):
+        key = self.key_for(prompt, params)
+        if bypass_cache:
+            self.cache._count('bypassed')
+        else:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        text = self.client.complete(prompt, **params)
+        self.cache.set(key, text)
+        return text
+
+    async def astream(self, prompt, bypass_cache=False, **params):
+        key = self.key_for(prompt, params)
+        if bypass_cache:
+            self.cache._count('bypassed')
+        else:
+            cached = await sync_to_async(self.cache.get, thread_sensitive=False)(key)
+            if cached is not None:
+                yield cached
+                return
+        chunks = []
+        async for chunk in self.client.astream(prompt, **params):
+            chunks.append(chunk)
+            yield chunk
+        await sync_to_async(self.cache.set, thread_sensitive=False)(key, ''.join(chunks))
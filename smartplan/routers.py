@@ -0,0 +1,214 @@
+"""Primary/replica database routing.
+
+Reads made while handling a safe (GET/HEAD/OPTIONS) request go to a random
+available alias from ``SMARTPLAN_DB_REPLICAS``. Everything else uses
+``default``: writes, reads in unsafe requests, and every query outside a
+request (workers, management commands). ``ReplicaRoutingMiddleware`` opens
+the routing state for each request.
+
+A client that writes is pinned to the primary for
+``SMARTPLAN_DB_PIN_SECONDS`` so it reads its own writes while the replicas
+catch up. The pin is kept both in a cookie and in a cache entry keyed on the
+request's credential (token header or session cookie), so API clients that
+ignore cookies are pinned too. Models in ``SMARTPLAN_DB_PRIMARY_MODELS`` are
+always read from the primary; a token issued a moment ago must authenticate.
+
+Replicas are checked with a cheap query at most every
+``SMARTPLAN_DB_REPLICA_CHECK_INTERVAL`` seconds. A replica that fails the
+check, cannot be connected to, or fails a query is skipped until it passes
+again. A safe request whose replica query failed is served again from the
+primary by the middleware, so the client never sees the error.
+"""
+import hashlib
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, OperationalError, connections
+
+from .instrumentation import log_event
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'smartplan_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = ContextVar('smartplan_db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self, safe, pinned):
+        self.safe = safe
+        self.pinned = pinned
+        self.wrote = False
+        self.replica_failed = False
+
+    @property
+    def use_primary(self):
+        return not self.safe or self.pinned or self.wrote
+
+
+def begin(request, pinned):
+    """Start routing a request's queries; pass the returned token to ``end()``."""
+    state = RoutingState(request.method in SAFE_METHODS, pinned)
+    return state, _state.set(state)
+
+
+def end(token):
+    _state.reset(token)
+
+
+def retry_on_primary(request, state):
+    """Whether a request whose replica read failed should be run again on the primary."""
+    if not state.replica_failed or state.wrote:
+        return False
+    log_event(logger, 'replica_read_retried', logging.WARNING, method=request.method, path=request.path)
+    return True
+
+
+def pin_cache():
+    return caches[settings.SMARTPLAN_DB_PIN_CACHE_ALIAS]
+
+
+def pin_key(request):
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'smartplan:db-pin:%s' % hashlib.sha256(credential.encode()).hexdigest()[:32]
+
+
+def is_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    key = pin_key(request)
+    return key is not None and pin_cache().get(key) is not None
+
+
+async def ais_pinned(request):
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    key = pin_key(request)
+    return key is not None and await pin_cache().aget(key) is not None
+
+
+def set_pin_cookie(response):
+    response.set_cookie(
+        PIN_COOKIE, '1', max_age=settings.SMARTPLAN_DB_PIN_SECONDS, httponly=True, samesite='Lax',
+        secure=settings.SESSION_COOKIE_SECURE,
+    )
+
+
+def pin(request, response):
+    key = pin_key(request)
+    if key is not None:
+        pin_cache().set(key, True, timeout=settings.SMARTPLAN_DB_PIN_SECONDS)
+    set_pin_cookie(response)
+
+
+async def apin(request, response):
+    key = pin_key(request)
+    if key is not None:
+        await pin_cache().aset(key, True, timeout=settings.SMARTPLAN_DB_PIN_SECONDS)
+    set_pin_cookie(response)
+
+
+_health = {}  # replica alias -> (available, checked at)
+_health_lock = threading.Lock()
+
+
+def check_replica(alias):
+    connection = connections[alias]
+    try:
+        connection.ensure_connection()
+        # Straight to the driver, past watch_replica: a failed check is not a failed read
+        with connection.wrap_database_errors:
+            connection.connection.execute('SELECT 1 FROM django_migrations LIMIT 1')
+    except DatabaseError as e:
+        connection.close()
+        log_event(logger, 'replica_unavailable', logging.WARNING, alias=alias, error=e)
+        return False
+    return True
+
+
+def mark_unavailable(alias):
+    with _health_lock:
+        _health[alias] = (False, time.monotonic())
+
+
+def replica_available(alias):
+    now = time.monotonic()
+    available, checked_at = _health.get(alias, (False, None))
+    if checked_at is not None and now - checked_at < settings.SMARTPLAN_DB_REPLICA_CHECK_INTERVAL:
+        return available
+    available = check_replica(alias)
+    with _health_lock:
+        _health[alias] = (available, now)
+    return available
+
+
+def available_replicas():
+    return [alias for alias in settings.SMARTPLAN_DB_REPLICAS if replica_available(alias)]
+
+
+def connectable(alias):
+    # A no-op on an open connection; a replica that vanished since its last
+    # check fails here, before any query is routed to it
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as e:
+        mark_unavailable(alias)
+        log_event(logger, 'replica_unavailable', logging.WARNING, alias=alias, error=e)
+        return False
+    return True
+
+
+def watch_replica(connection):
+    """Install an execute wrapper that takes ``connection``'s replica out of rotation when a query fails."""
+    alias = connection.alias
+    if alias not in settings.SMARTPLAN_DB_REPLICAS:
+        return
+
+    def guard(execute, sql, params, many, context):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError:
+            # Missing file, locked or stale schema; integrity errors can't happen on a read
+            mark_unavailable(alias)
+            state = _state.get()
+            if state is not None:
+                state.replica_failed = True
+            raise
+
+    connection.execute_wrappers.append(guard)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.use_primary or model._meta.label_lower in settings.SMARTPLAN_DB_PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        replicas = available_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        alias = random.choice(replicas)
+        return alias if connectable(alias) else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Only the primary is migrated; the replicas are copies of its file
+        return db == DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {DEFAULT_DB_ALIAS, *settings.SMARTPLAN_DB_REPLICAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
@@ -0,0 +1,128 @@
+"""Dated touchpoints of every plan, for calendar queries across plans.
+
+A plan's schedule is one touchpoint per week of its timeline and channel
+(``steps.plan_segments``), dated from the day the plan was created, the same
+anchor ``plan_steps`` uses. ``expand_plans`` syncs the ``Touchpoint`` rows of
+many plans with their current channels and timeline in two statements per
+chunk. On SQLite both are set-based: each plan is joined to its channels
+(``json_each``) and to its weeks (a recursive CTE), so no Python loop runs
+per touchpoint. Rows that still match are left alone; only the slots an edit
+added or dropped are written.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Plan, Touchpoint
+from .search import chunked
+from .steps import TIMELINE_WEEKS, plan_segments
+
+DEFAULT_WEEKS = 4  # plan_segments' fallback for an unknown timeline
+DEFAULT_CHANNELS = '["email"]'  # and for a plan without channels
+COLUMNS = ('plan_id', 'user_id', 'date', 'day_offset', 'channel')
+
+
+def expansion_sql(connection, plan_ids):
+    """A ``SELECT`` of the ``COLUMNS`` of every touchpoint ``plan_ids`` should have."""
+    start_sql, start_params = connection.ops.datetime_cast_date_sql(
+        'created_at', (), timezone.get_current_timezone_name()
+    )
+    weeks = ' '.join(['WHEN %s THEN %s'] * len(TIMELINE_WEEKS))
+    # The start date is a Python function on SQLite; MATERIALIZED has it run once per plan, not per row
+    sql = f"""
+        WITH RECURSIVE weeks(week) AS (
+            SELECT 0 UNION ALL SELECT week + 1 FROM weeks WHERE week < %s
+        ),
+        plans(id, user_id, channels, timeline, start) AS MATERIALIZED (
+            SELECT id, user_id, channels, timeline, {start_sql}
+            FROM {connection.ops.quote_name(Plan._meta.db_table)}
+            WHERE id IN ({', '.join(['%s'] * len(plan_ids))})
+        )
+        SELECT p.id, p.user_id, date(p.start, '+' || (weeks.week * 7) || ' days'), weeks.week * 7, c.value
+        FROM plans p
+        JOIN weeks ON weeks.week < CASE p.timeline {weeks} ELSE %s END
+        JOIN json_each(CASE WHEN json_array_length(p.channels) > 0 THEN p.channels ELSE %s END) c
+    """
+    params = [
+        max(TIMELINE_WEEKS.values()) - 1,
+        *start_params,
+        *plan_ids,
+        *[value for item in TIMELINE_WEEKS.items() for value in item],
+        DEFAULT_WEEKS,
+        DEFAULT_CHANNELS,
+    ]
+    return sql, params
+
+
+def expand_sqlite(connection, plan_ids):
+    table = connection.ops.quote_name(Touchpoint._meta.db_table)
+    columns = ', '.join(COLUMNS)
+    expanded, params = expansion_sql(connection, plan_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE plan_id IN ({', '.join(['%s'] * len(plan_ids))}) "
+            f"AND ({columns}) NOT IN ({expanded})",
+            [*plan_ids, *params],
+        )
+        removed = cursor.rowcount
+        cursor.execute(f"INSERT OR IGNORE INTO {table} ({columns}) {expanded}", params)
+        return cursor.rowcount, removed
+
+
+def expand_python(connection, plan_ids):
+    """The same sync as ``expand_sqlite`` for backends without ``json_each``."""
+    plans = Plan.objects.using(connection.alias).filter(id__in=plan_ids).values_list(
+        'id', 'user_id', 'created_at', 'channels', 'timeline'
+    )
+    wanted = {
+        (plan_id, day_offset, channel, timezone.localdate(created_at) + timedelta(days=day_offset)): user_id
+        for plan_id, user_id, created_at, channels, timeline in plans
+        for day_offset, channel in plan_segments(channels, timeline)
+    }
+    touchpoints = Touchpoint.objects.using(connection.alias).filter(plan_id__in=plan_ids)
+    existing = {
+        (plan_id, day_offset, channel, date): pk
+        for pk, plan_id, day_offset, channel, date
+        in touchpoints.values_list('pk', 'plan_id', 'day_offset', 'channel', 'date')
+    }
+    stale = [pk for key, pk in existing.items() if key not in wanted]
+    if stale:
+        Touchpoint.objects.using(connection.alias).filter(pk__in=stale).delete()
+    added = Touchpoint.objects.using(connection.alias).bulk_create([
+        Touchpoint(plan_id=plan_id, user_id=user_id, date=date, day_offset=day_offset, channel=channel)
+        for (plan_id, day_offset, channel, date), user_id in wanted.items()
+        if (plan_id, day_offset, channel, date) not in existing
+    ], ignore_conflicts=True)
+    return len(added), len(stale)
+
+
+def expand_plans(plan_ids, using=DEFAULT_DB_ALIAS):
+    """Sync the touchpoints of ``plan_ids`` with their plans; returns ``(added, removed)`` row counts."""
+    connection = connections[using]
+    expand = expand_sqlite if connection.vendor == 'sqlite' else expand_python
+    added = removed = 0
+    for ids in chunked(plan_ids, settings.SMARTPLAN_TOUCHPOINT_BATCH_SIZE):
+        with transaction.atomic(using=using):
+            chunk_added, chunk_removed = expand(connection, ids)
+        added += chunk_added
+        removed += chunk_removed
+    return added, removed
+
+
+def expand_all(using=DEFAULT_DB_ALIAS, stdout=None):
+    """Sync every plan's touchpoints, a batch of plans at a time; returns ``(plans, added, removed)``."""
+    batch_size = settings.SMARTPLAN_TOUCHPOINT_BATCH_SIZE
+    plans = Plan.objects.using(using).order_by('id').values_list('id', flat=True)
+    last_id = 0
+    total = added = removed = 0
+    while ids := list(plans.filter(id__gt=last_id)[:batch_size]):
+        batch_added, batch_removed = expand_plans(ids, using)
+        total += len(ids)
+        added += batch_added
+        removed += batch_removed
+        last_id = ids[-1]
+        if stdout is not None:
+            stdout.write(f"Plans: {total}")
+    return total, added, removed
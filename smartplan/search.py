@@ -0,0 +1,231 @@
+"""Full-text search over plans and generated plans (SQLite FTS5).
+
+Both indexes are external-content FTS5 tables over SQL views of the source
+tables, so they hold only the inverted index and no second, uncompressed
+copy of the text. The views read compressed columns through
+``smartplan_text()``, a function registered on every SQLite connection
+(``register_functions``).
+
+FTS5 removes a document by re-tokenizing the values it was indexed with,
+which an external-content table reads back from the view. A document must
+therefore be unindexed while the source rows still hold the old text.
+Triggers on the source tables (``TRIGGERS``) do that around every insert,
+update and delete, so ``QuerySet.update()``, ``bulk_create`` and raw SQL
+keep the index current as well as ``save()``. Writers need the
+``smartplan_text()`` function, which every Django connection has.
+
+SQLite will not rename a table while a view or trigger refers to a
+missing one, and that is how Django rebuilds tables in migrations, so the
+views and triggers are dropped before ``migrate`` and created again after
+it; the index is then rebuilt, as migrations change rows untracked (see
+signals).
+"""
+import html
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .fields import decompress
+from .models import Plan
+
+PLAN_TABLE = 'smartplan_plan_fts'
+PLAN_SOURCE = 'smartplan_plan_search'  # view the index is built from
+PLAN_COLUMNS = ('owner', 'title', 'description', 'content')
+GENERATED_TABLE = 'smartplan_generatedplan_fts'
+GENERATED_SOURCE = 'smartplan_generatedplan_search'
+GENERATED_COLUMNS = ('content',)
+
+VIEWS = {
+    PLAN_SOURCE: (
+        "SELECT p.id, 'u' || p.user_id AS owner, p.title, p.description, ("
+        "SELECT group_concat(s.title || char(10) || smartplan_text(s.content), char(10) || char(10)) FROM ("
+        "SELECT title, content FROM smartplan_planstep WHERE plan_id = p.id ORDER BY position) s"
+        ") AS content FROM smartplan_plan p"
+    ),
+    GENERATED_SOURCE: "SELECT id, smartplan_text(content) AS content FROM smartplan_generatedplan",
+}
+
+# bm25 column weights for PLAN_TABLE: owner, title, description, content
+PLAN_WEIGHTS = (0.0, 10.0, 4.0, 1.0)
+TEXT_COLUMNS = '{title description content}'
+SNIPPET_TOKENS = 16
+# Control characters can't come out of the tokenizer, so they mark matches
+# until the snippet is escaped
+MATCH_START, MATCH_END = '\x02', '\x03'
+SEARCH_TERM = re.compile(r'\w+', re.UNICODE)
+
+
+def is_enabled():
+    # The FTS5 tables only exist on SQLite; other backends fall back to LIKE
+    return connection.vendor == 'sqlite'
+
+
+def stored_text(value):
+    """``smartplan_text(column)``: the text of a ``CompressedTextField`` column."""
+    if value is None or isinstance(value, str):
+        return value
+    return decompress(value).decode('utf-8')
+
+
+def register_functions(db_connection):
+    db_connection.connection.create_function('smartplan_text', 1, stored_text, deterministic=True)
+
+
+def index_sql(table, source, columns, ids):
+    """SQL indexing the rows of ``source`` with ``ids`` (an SQL list) that are not in ``table`` yet."""
+    names = ', '.join(columns)
+    return (
+        f"INSERT INTO {table} (rowid, {names}) SELECT id, {names} FROM {source} "
+        f"WHERE id IN ({ids}) AND id NOT IN (SELECT id FROM {table}_docsize)"
+    )
+
+
+def unindex_sql(table, source, columns, ids):
+    """SQL unindexing ``ids``; must run before their source rows change or go away."""
+    names = ', '.join(columns)
+    # Deleting a document that was never indexed would corrupt the index
+    return (
+        f"INSERT INTO {table} ({table}, rowid, {names}) SELECT 'delete', id, {names} FROM {source} "
+        f"WHERE id IN (SELECT id FROM {table}_docsize WHERE id IN ({ids}))"
+    )
+
+
+PLAN_INDEX = (PLAN_TABLE, PLAN_SOURCE, PLAN_COLUMNS)
+GENERATED_INDEX = (GENERATED_TABLE, GENERATED_SOURCE, GENERATED_COLUMNS)
+PLAN_CHANGED = (
+    "UPDATE OF user_id, title, description ON smartplan_plan "
+    "WHEN old.user_id IS NOT new.user_id OR old.title IS NOT new.title OR old.description IS NOT new.description"
+)
+STEP_CHANGED = (
+    "UPDATE OF plan_id, position, title, content ON smartplan_planstep "
+    "WHEN old.plan_id IS NOT new.plan_id OR old.position IS NOT new.position "
+    "OR old.title IS NOT new.title OR old.content IS NOT new.content"
+)
+GENERATED_CHANGED = "UPDATE OF content ON smartplan_generatedplan WHEN old.content IS NOT new.content"
+
+# name -> (when, statement); BEFORE triggers unindex while the old text is still there
+TRIGGERS = {
+    'smartplan_plan_search_ai': ("AFTER INSERT ON smartplan_plan", index_sql(*PLAN_INDEX, 'new.id')),
+    'smartplan_plan_search_bu': (f"BEFORE {PLAN_CHANGED}", unindex_sql(*PLAN_INDEX, 'old.id')),
+    'smartplan_plan_search_au': (f"AFTER {PLAN_CHANGED}", index_sql(*PLAN_INDEX, 'new.id')),
+    'smartplan_plan_search_bd': ("BEFORE DELETE ON smartplan_plan", unindex_sql(*PLAN_INDEX, 'old.id')),
+    # A plan's document includes its steps
+    'smartplan_planstep_search_bi': ("BEFORE INSERT ON smartplan_planstep", unindex_sql(*PLAN_INDEX, 'new.plan_id')),
+    'smartplan_planstep_search_ai': ("AFTER INSERT ON smartplan_planstep", index_sql(*PLAN_INDEX, 'new.plan_id')),
+    'smartplan_planstep_search_bu': (
+        f"BEFORE {STEP_CHANGED}", unindex_sql(*PLAN_INDEX, 'old.plan_id, new.plan_id'),
+    ),
+    'smartplan_planstep_search_au': (f"AFTER {STEP_CHANGED}", index_sql(*PLAN_INDEX, 'old.plan_id, new.plan_id')),
+    'smartplan_planstep_search_bd': ("BEFORE DELETE ON smartplan_planstep", unindex_sql(*PLAN_INDEX, 'old.plan_id')),
+    # Re-adds the plan without the step; skipped when the plan goes too
+    'smartplan_planstep_search_ad': ("AFTER DELETE ON smartplan_planstep", index_sql(*PLAN_INDEX, 'old.plan_id')),
+    'smartplan_generatedplan_search_ai': (
+        "AFTER INSERT ON smartplan_generatedplan", index_sql(*GENERATED_INDEX, 'new.id'),
+    ),
+    'smartplan_generatedplan_search_bu': (f"BEFORE {GENERATED_CHANGED}", unindex_sql(*GENERATED_INDEX, 'old.id')),
+    'smartplan_generatedplan_search_au': (f"AFTER {GENERATED_CHANGED}", index_sql(*GENERATED_INDEX, 'new.id')),
+    'smartplan_generatedplan_search_bd': (
+        "BEFORE DELETE ON smartplan_generatedplan", unindex_sql(*GENERATED_INDEX, 'old.id'),
+    ),
+}
+
+
+def drop_schema(db_connection):
+    """Drop the views and the triggers that read them."""
+    with db_connection.cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for name in VIEWS:
+            cursor.execute(f"DROP VIEW IF EXISTS {name}")
+
+
+def create_schema(db_connection):
+    drop_schema(db_connection)
+    with db_connection.cursor() as cursor:
+        for name, sql in VIEWS.items():
+            cursor.execute(f"CREATE VIEW {name} AS {sql}")
+        for name, (when, statement) in TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER {name} {when} BEGIN {statement}; END")
+
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every word must match, the last one as a prefix.
+
+    Returns ``None`` when ``text`` has no searchable words.
+    """
+    terms = SEARCH_TERM.findall(text or '')
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def owner_token(user_id):
+    # Owners are an indexed column so per-user searches intersect posting
+    # lists inside FTS5 instead of filtering every match afterwards.
+    # The view builds the same token in SQL.
+    return f"u{user_id}"
+
+
+def chunked(ids, size=500):
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+def highlight(snippet):
+    return html.escape(snippet).replace(MATCH_START, '<mark>').replace(MATCH_END, '</mark>')
+
+
+def search_plans(user, text, limit=20):
+    """Return ``[(plan_id, score, snippet)]`` for the user's plans, best match first.
+
+    Snippets are HTML-escaped, with matched terms wrapped in ``<mark>`` tags.
+    """
+    query = fts_query(text)
+    if query is None:
+        return []
+    weights = ', '.join(str(weight) for weight in PLAN_WEIGHTS)
+    # snippet(-1) would pick the owner column, so take the first text column that matched
+    snippets = [
+        f"snippet({PLAN_TABLE}, {column}, char(2), char(3), '…', {SNIPPET_TOKENS})"
+        for column in (3, 2, 1)
+    ]
+    sql = (
+        f"SELECT rowid, bm25({PLAN_TABLE}, {weights}) AS score, "
+        f"CASE WHEN instr({snippets[0]}, char(2)) THEN {snippets[0]} "
+        f"WHEN instr({snippets[1]}, char(2)) THEN {snippets[1]} ELSE {snippets[2]} END "
+        f"FROM {PLAN_TABLE} WHERE {PLAN_TABLE} MATCH %s "
+        f"ORDER BY score LIMIT %s"
+    )
+    query = f'owner : "{owner_token(user.pk)}" AND {TEXT_COLUMNS} : ({query})'
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, limit])
+        return [(plan_id, score, highlight(snippet or '')) for plan_id, score, snippet in cursor.fetchall()]
+
+
+def match_filter(model, text):
+    """``Q`` restricting ``model`` (Plan or GeneratedPlan) to rows matching ``text`` in the index."""
+    query = fts_query(text)
+    if query is None:
+        return Q()
+    plan_ids = RawSQL(f"SELECT rowid FROM {PLAN_TABLE} WHERE {PLAN_TABLE} MATCH %s", [f"{TEXT_COLUMNS} : ({query})"])
+    if model is Plan:
+        return Q(id__in=plan_ids)
+    generated_ids = RawSQL(f"SELECT rowid FROM {GENERATED_TABLE} WHERE {GENERATED_TABLE} MATCH %s", [query])
+    return Q(id__in=generated_ids) | Q(plan_id__in=plan_ids)
+
+
+def rebuild(db_connection=connection):
+    """Re-read both indexes from their views; returns the number of documents in each."""
+    counts = {}
+    with db_connection.cursor() as cursor:
+        for name, table in (('Plan', PLAN_TABLE), ('GeneratedPlan', GENERATED_TABLE)):
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {table}_docsize")
+            counts[name] = cursor.fetchone()[0]
+    return counts
@@ -1,21 +1,32 @@
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Template, TemplateOption, GeneratedPlan, Plan
 from django.contrib.auth.models import User
 from .models import UserProfile
+from .instrumentation import phase
+from .steps import plan_sections, replace_plan_steps
 
-class TemplateOptionSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """Counts building ``.data`` as the request's ``serialize`` phase."""
+
+    @property
+    def data(self):
+        with phase('serialize'):
+            return super().data
+
+class TemplateOptionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = TemplateOption
         fields = ['id', 'name', 'description', 'is_required', 'option_type', 'default_value']
 
-class TemplateSerializer(serializers.ModelSerializer):
+class TemplateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     options = TemplateOptionSerializer(many=True, read_only=True)
 
     class Meta:
         model = Template
         fields = ['id', 'name', 'description', 'options', 'created_at']
 
-class GeneratedPlanSerializer(serializers.ModelSerializer):
+class GeneratedPlanSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     template_name = serializers.CharField(source='template.name', read_only=True)
 
     class Meta:
@@ -23,29 +34,54 @@ class GeneratedPlanSerializer(serializers.ModelSerializer):
         fields = ['id', 'template_name', 'content', 'options_used', 'created_at']
         read_only_fields = ['content', 'created_at']
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = UserProfile
         exclude = ['user']
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     profile = UserProfileSerializer()
 
     class Meta:
         model = User
         fields = ['id', 'email', 'first_name', 'last_name', 'profile']
 
-class PlanSerializer(serializers.ModelSerializer):
+class PlanSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    content = serializers.JSONField(required=False, allow_null=True)
+
+    def __init__(self, *args, **kwargs):
+        # Optional sparse fieldset, e.g. PlanSerializer(plans, many=True, fields=['id', 'title'])
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
     class Meta:
         model = Plan
         fields = ['id', 'user', 'title', 'plan_type', 'channels', 'timeline', 
                  'status', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if 'content' in data and data['content'] is None:
+            data['content'] = plan_sections(instance.pk)
+        return data
+
+    def update(self, instance, validated_data):
+        # Edited content is stored as steps, like generated content
+        has_content = 'content' in validated_data
+        sections = validated_data.pop('content', None)
+        instance = super().update(instance, validated_data)
+        if has_content:
+            replace_plan_steps(instance, sections)
+        return instance
+
     def validate_channels(self, value):
         if not isinstance(value, list):
             raise serializers.ValidationError("Channels must be a list")
-        valid_channels = ['email', 'voicemail', 'video', 'text']
+        valid_channels = [choice[0] for choice in Plan.CHANNEL_CHOICES]
         for channel in value:
             if channel not in valid_channels:
                 raise serializers.ValidationError(f"Invalid channel: {channel}")
@@ -69,10 +105,45 @@ class PlanSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("Invalid status")
         return value
 
-    def create(self, validated_data):
-        print("Creating plan with validated data:", validated_data)  # Debug print
-        return super().create(validated_data)
 
-    def validate(self, data):
-        print("Validating data:", data)  # Debug print
+class PlanReadSerializer:
+    """Read-only fast path producing the same output as ``PlanSerializer``.
+
+    Rows come straight from ``QuerySet.values()`` and are turned into plain
+    dicts using a field map built once, skipping DRF's per-field machinery.
+    ``content`` must already be resolved (see ``steps.attach_step_content``).
+    Writes and validation stay on ``PlanSerializer``.
+    """
+
+    DATETIME_FIELDS = frozenset(['created_at', 'updated_at'])
+
+    def __init__(self, fields=None):
+        self.fields = [name for name in PlanSerializer.Meta.fields if fields is None or name in fields]
+        self.datetime_fields = [name for name in self.fields if name in self.DATETIME_FIELDS]
+
+    def columns(self):
+        # ``values('user')`` yields the FK id under the 'user' key, like PrimaryKeyRelatedField
+        return self.fields
+
+    def format_datetime(self, value, tz):
+        # Mirrors rest_framework.fields.DateTimeField.to_representation for ISO 8601
+        if not value:
+            return None
+        if timezone.is_aware(value):
+            value = value.astimezone(tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+
+    def to_representation(self, row, tz=None):
+        tz = tz or timezone.get_current_timezone()
+        data = {name: row[name] for name in self.fields}
+        for name in self.datetime_fields:
+            data[name] = self.format_datetime(data[name], tz)
         return data
+
+    def many(self, rows):
+        tz = timezone.get_current_timezone()
+        with phase('serialize'):
+            return [self.to_representation(row, tz) for row in rows]
@@ -0,0 +1,108 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from rest_framework.renderers import JSONRenderer
+
+from .logos import logo_payload
+from .models import CustomUser
+
+# Bump when the settings response changes shape so old snapshots are ignored
+SNAPSHOT_VERSION = 1
+
+# Request keys -> CustomUser fields for each section of a settings PUT
+BUSINESS_FIELDS = {
+    'name': 'business_name',
+    'phone': 'business_phone',
+    'address': 'business_address',
+    'target_market': 'target_market',
+    'value_proposition': 'value_proposition',
+    'additional_context': 'additional_context',
+}
+SOCIAL_FIELDS = {name: name for name in ('instagram', 'facebook', 'tiktok', 'linkedin', 'youtube', 'twitter', 'threads')}
+BRANDING_FIELDS = {
+    'primaryColor': 'primary_color',
+    'secondaryColor': 'secondary_color',
+    'brandVoice': 'brand_voice',
+    'brandDescription': 'brand_description',
+}
+
+
+def settings_cache():
+    return caches[settings.SMARTPLAN_SETTINGS_CACHE_ALIAS]
+
+
+def snapshot_key(user_id):
+    return f'smartplan:user-settings:v{SNAPSHOT_VERSION}:{user_id}'
+
+
+def serialize_settings(user):
+    return {
+        'email': user.email,
+        'full_name': user.full_name,
+        'business_info': {
+            'name': user.business_name,
+            'phone': user.business_phone,
+            'address': user.business_address,
+            'target_market': user.target_market,
+            'value_proposition': user.value_proposition,
+            'additional_context': user.additional_context
+        },
+        'social_media': {
+            'instagram': user.instagram,
+            'facebook': user.facebook,
+            'tiktok': user.tiktok,
+            'linkedin': user.linkedin,
+            'youtube': user.youtube,
+            'twitter': user.twitter,
+            'threads': user.threads
+        },
+        'branding': {
+            'primary_color': user.primary_color,
+            'secondary_color': user.secondary_color,
+            'brand_voice': user.brand_voice,
+            'brand_description': user.brand_description,
+            **logo_payload(user)
+        }
+    }
+
+
+def build_snapshot(user_id):
+    """Render a user's settings response once and cache ``(body, etag)``."""
+    # Read the row fresh from the primary: request.user may come from the
+    # token cache, and a replica may not have the user's last write yet
+    user = CustomUser.objects.using(DEFAULT_DB_ALIAS).get(pk=user_id)
+    body = JSONRenderer().render(serialize_settings(user))
+    etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+    settings_cache().set(snapshot_key(user_id), (body, etag), timeout=settings.SMARTPLAN_SETTINGS_CACHE_TTL)
+    return body, etag
+
+
+def get_snapshot(user_id):
+    return settings_cache().get(snapshot_key(user_id)) or build_snapshot(user_id)
+
+
+def invalidate_snapshots(*user_ids):
+    keys = [snapshot_key(user_id) for user_id in user_ids]
+    if not keys:
+        return
+    settings_cache().delete_many(keys)
+    # A GET racing the write may have re-cached the old row before commit
+    transaction.on_commit(lambda: settings_cache().delete_many(keys))
+
+
+def apply_changes(user, data, field_map):
+    """Copy the keys of ``data`` onto ``user`` and return the fields whose value actually changed."""
+    changed = []
+    for key, field in field_map.items():
+        if key in data and data[key] != getattr(user, field):
+            setattr(user, field, data[key])
+            changed.append(field)
+    return changed
+
+
+async def aget_snapshot(user_id):
+    cached = await settings_cache().aget(snapshot_key(user_id))
+    return cached or await sync_to_async(build_snapshot)(user_id)
@@ -0,0 +1,95 @@
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_migrate
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import instrumentation, routers, schedule, search
+from .authentication import token_cache
+from .catalog import invalidate_catalog
+from .settings_snapshot import invalidate_snapshots
+from .models import CustomUser, LogoAsset, Plan, Template, TemplateOption
+
+
+@receiver([post_save, post_delete], sender=TemplateOption)
+def touch_template_on_option_change(sender, instance, **kwargs):
+    # Compiled prompts are cached on (template.id, updated_at), so option
+    # edits have to bump the parent template's timestamp.
+    Template.objects.filter(pk=instance.template_id).update(updated_at=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=Template)
+@receiver([post_save, post_delete], sender=TemplateOption)
+def rebuild_template_catalog(sender, instance, **kwargs):
+    invalidate_catalog()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    # Cached auth entries hold a copy of the user, so any change (including
+    # is_active=False) must evict them.
+    if not created:
+        token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_settings_snapshot(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_snapshots(instance.pk)
+
+
+@receiver(post_save, sender=LogoAsset)
+def invalidate_logo_users_snapshots(sender, instance, **kwargs):
+    # Variant URLs and status are part of every sharing user's snapshot
+    invalidate_snapshots(*instance.users.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Plan)
+def expand_plan_schedule(sender, instance, using, update_fields=None, **kwargs):
+    # Touchpoints only depend on channels and timeline; a re-save that keeps
+    # them writes nothing
+    if update_fields is None or {'channels', 'timeline'} & set(update_fields):
+        schedule.expand_plans([instance.pk], using)
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Per-request query counts and time for Server-Timing and /api/metrics
+    instrumentation.install_query_timer(connection)
+
+
+@receiver(pre_migrate)
+def drop_search_schema(sender, using, **kwargs):
+    # Table rebuilds in migrations fail while a view or trigger refers to the table
+    if sender.label == 'smartplan' and connections[using].vendor == 'sqlite':
+        search.drop_schema(connections[using])
+
+
+@receiver(post_migrate)
+def create_search_schema(sender, using, plan=None, **kwargs):
+    if sender.label != 'smartplan' or connections[using].vendor != 'sqlite':
+        return
+    # Nothing to create when migrated back to before the index existed
+    if search.PLAN_TABLE not in connections[using].introspection.table_names():
+        return
+    search.create_schema(connections[using])
+    # Rows the migrations changed went past the (dropped) triggers
+    if plan:
+        search.rebuild(connections[using])
+
+
+@receiver(connection_created)
+def register_search_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        search.register_functions(connection)
+
+
+@receiver(connection_created)
+def watch_replica_errors(sender, connection, **kwargs):
+    routers.watch_replica(connection)
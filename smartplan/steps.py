@@ -0,0 +1,148 @@
+import re
+from collections import defaultdict
+
+from django.db import transaction
+
+from .fields import resolve
+from .models import Plan, PlanStep
+
+STEP_TITLE = re.compile(r'^\s*(week|day)\s+(\d+)\s*(?:[-:–—]\s*(.+?))?\s*$', re.IGNORECASE)
+CHANNELS = {choice[0]: choice[0] for choice in Plan.CHANNEL_CHOICES}
+CHANNELS.update({label.lower(): value for value, label in Plan.CHANNEL_CHOICES})
+TIMELINE_WEEKS = {'30days': 4, '60days': 8, '90days': 12}
+
+
+def parse_step_title(title, previous_day=0):
+    """Map a section title like ``'Week 3 - Email'`` or ``'Day 10: Text'`` to ``(day_offset, channel)``."""
+    match = STEP_TITLE.match(title or '')
+    if not match:
+        return previous_day, ''
+    unit, number, rest = match.groups()
+    number = max(int(number) - 1, 0)
+    day_offset = number * 7 if unit.lower() == 'week' else number
+    channel = CHANNELS.get((rest or '').strip().lower(), '')
+    return day_offset, channel
+
+
+def plan_segments(channels, timeline):
+    """The ``(day_offset, channel)`` segments a plan with these settings is made of, one per week and channel."""
+    return [
+        (week * 7, channel)
+        for week in range(TIMELINE_WEEKS.get(timeline, 4))
+        for channel in channels or ['email']
+    ]
+
+
+def segment_title(day_offset, channel):
+    return f"Week {day_offset // 7 + 1} - {dict(Plan.CHANNEL_CHOICES).get(channel, channel.title())}"
+
+
+def diff_segments(old_channels, old_timeline, new_channels, new_timeline):
+    """Return ``(added, removed)`` segment lists between two channel/timeline settings."""
+    old = set(plan_segments(old_channels, old_timeline))
+    new = plan_segments(new_channels, new_timeline)
+    added = [segment for segment in new if segment not in old]
+    removed = sorted(old - set(new))
+    return added, removed
+
+
+def sections_to_steps(plan, sections):
+    steps = []
+    day_offset = 0
+    for position, section in enumerate(sections or []):
+        if not isinstance(section, dict):
+            section = {'title': '', 'content': str(section)}
+        if 'day_offset' in section:
+            day_offset, channel = section['day_offset'], section.get('channel', '')
+        else:
+            day_offset, channel = parse_step_title(section.get('title'), day_offset)
+        steps.append(PlanStep(
+            plan=plan,
+            position=position,
+            day_offset=day_offset,
+            channel=channel,
+            title=(section.get('title') or '')[:255],
+            content=section.get('content') or '',
+        ))
+    return steps
+
+
+def replace_plan_steps(plan, sections):
+    with transaction.atomic():
+        PlanStep.objects.filter(plan=plan).delete()
+        PlanStep.objects.bulk_create(sections_to_steps(plan, sections))
+
+
+def drop_stale_steps(plan):
+    """Delete steps outside the plan's current channels and timeline."""
+    stale = PlanStep.objects.filter(plan=plan).exclude(channel='').exclude(channel__in=plan.channels or ['email'])
+    outside = PlanStep.objects.filter(plan=plan, day_offset__gte=TIMELINE_WEEKS.get(plan.timeline, 4) * 7)
+    with transaction.atomic():
+        return stale.delete()[0] + outside.delete()[0]
+
+
+def merge_plan_steps(plan, sections):
+    """Add newly generated sections to the plan's existing steps, keeping them in timeline order."""
+    order = {channel: i for i, channel in enumerate(plan.channels or [])}
+    existing = PlanStep.objects.filter(plan=plan).order_by('position').values('title', 'content', 'day_offset', 'channel')
+    merged = [{**step, 'content': resolve(step['content'])} for step in existing] + [
+        {'title': step.title, 'content': step.content, 'day_offset': step.day_offset, 'channel': step.channel}
+        for step in sections_to_steps(plan, sections)
+    ]
+    merged.sort(key=lambda step: (step['day_offset'], order.get(step['channel'], len(order))))
+    replace_plan_steps(plan, merged)
+
+
+def sections_for_plans(plan_ids, using=None):
+    """Reassemble the legacy ``content`` section list for several plans in one query."""
+    sections = defaultdict(list)
+    steps = PlanStep.objects.using(using).filter(plan_id__in=plan_ids).order_by('plan_id', 'position')
+    for plan_id, title, content in steps.values_list('plan_id', 'title', 'content'):
+        sections[plan_id].append({'title': title, 'content': resolve(content)})
+    return sections
+
+
+async def asections_for_plans(plan_ids):
+    sections = defaultdict(list)
+    steps = PlanStep.objects.filter(plan_id__in=plan_ids).order_by('plan_id', 'position')
+    async for plan_id, title, content in steps.values_list('plan_id', 'title', 'content'):
+        sections[plan_id].append({'title': title, 'content': resolve(content)})
+    return sections
+
+
+def plan_sections(plan_id):
+    return sections_for_plans([plan_id]).get(plan_id)
+
+
+def resolve_row_content(rows):
+    """Decode ``content`` in place and return the ids whose sections live in ``PlanStep``."""
+    for row in rows:
+        row['content'] = resolve(row['content'])
+    return [row['id'] for row in rows if row['content'] is None]
+
+
+def fill_row_content(rows, sections):
+    for row in rows:
+        if row['content'] is None and row['id'] in sections:
+            row['content'] = sections[row['id']]
+    return rows
+
+
+def attach_step_content(rows, using=None):
+    """Fill ``content`` on ``values()`` rows whose sections live in ``PlanStep``.
+
+    Completed plans keep ``Plan.content`` empty and store their sections as
+    steps; this is the compatibility layer that gives clients the same
+    ``content`` list as before.
+    """
+    missing = resolve_row_content(rows)
+    if missing:
+        fill_row_content(rows, sections_for_plans(missing, using))
+    return rows
+
+
+async def aattach_step_content(rows):
+    missing = resolve_row_content(rows)
+    if missing:
+        fill_row_content(rows, await asections_for_plans(missing))
+    return rows
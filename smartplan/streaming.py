@@ -0,0 +1,195 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CachedTokenAuthentication
+from .db import retry_on_lock
+from .generation import (
+    SECTION_HEADING, build_context, default_worker_id, finish_job, get_llm_client,
+    model_params, parse_sections, render_prompt, save_generation,
+)
+from .models import GenerationJob, Plan
+from .steps import plan_sections
+
+logger = logging.getLogger(__name__)
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+TICKET_SALT = 'smartplan.streaming.ticket'
+
+
+def issue_stream_ticket(user):
+    """A signed, short-lived stand-in for ``user``'s credentials on ``EventSource`` URLs."""
+    return signing.dumps({'user': user.pk}, salt=TICKET_SALT)
+
+
+async def aget_request_user(request):
+    """Resolve the user for a plain async view from a token header, ``?ticket=`` or the session.
+
+    ``EventSource`` cannot send custom headers, so it passes a ticket from
+    ``issue_stream_ticket`` instead, never the API token: URLs end up in
+    access logs and browser history, and a ticket expires after
+    ``SMARTPLAN_STREAM_TICKET_MAX_AGE`` seconds.
+    """
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        try:
+            user, _ = await CachedTokenAuthentication().aauthenticate_credentials(header[6:].strip())
+        except AuthenticationFailed:
+            return None
+        return user
+    ticket = request.GET.get('ticket')
+    if ticket:
+        try:
+            user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=settings.SMARTPLAN_STREAM_TICKET_MAX_AGE)['user']
+        except (signing.BadSignature, KeyError, TypeError):
+            return None
+        return await get_user_model().objects.filter(pk=user_id, is_active=True).afirst()
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+@retry_on_lock
+def queue_regeneration(plan):
+    """Queue a fresh, uncached generation of ``plan`` for its stream to run; ``None`` if it is already generating."""
+    with transaction.atomic():
+        # Conditional, so a plan already generating keeps its job
+        started = Plan.objects.filter(pk=plan.pk).exclude(status='generating').update(
+            status='generating', updated_at=timezone.now()
+        )
+        if not started:
+            return None
+        return GenerationJob.objects.create(plan=plan, template_id=plan.template_id, bypass_cache=True)
+
+
+async def aclaim_plan_job(plan):
+    """Take over the plan's queued job, if it has one; the stream then runs it inline."""
+    worker = f"stream:{default_worker_id()}"
+    async for job_id in GenerationJob.objects.filter(plan=plan, status='queued').values_list('id', flat=True):
+        claimed = await GenerationJob.objects.filter(id=job_id, status='queued').aupdate(
+            status='running', worker=worker, started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return await GenerationJob.objects.select_related('template').aget(id=job_id)
+    return None
+
+
+class SectionTracker:
+    """Turns a token stream into section boundary events."""
+
+    def __init__(self):
+        self.chunks = []
+        self.line = ''
+        self.sections = 0
+
+    @property
+    def text(self):
+        return ''.join(self.chunks)
+
+    def feed(self, token):
+        self.chunks.append(token)
+        self.line += token
+        events = []
+        *complete, self.line = self.line.split('\n')
+        for line in complete:
+            match = SECTION_HEADING.match(line)
+            if match:
+                events.append(('section', {'index': self.sections, 'title': match.group(1)}))
+                self.sections += 1
+        events.append(('token', {'text': token}))
+        return events
+
+
+async def stream_generation(plan, job, client=None):
+    """Run ``job`` inline, yielding SSE frames as tokens arrive.
+
+    Parsed sections are flushed to ``Plan.content`` at section boundaries (at
+    most once per ``SMARTPLAN_STREAM_FLUSH_INTERVAL``). If the client goes
+    away before the model finishes, the job is handed back to the worker queue.
+    """
+    client = client or get_llm_client()
+    flush_interval = settings.SMARTPLAN_STREAM_FLUSH_INTERVAL
+    tracker = SectionTracker()
+    finished = False
+    try:
+        prompt = await sync_to_async(render_prompt)(job.template, build_context(plan), job.segments)
+        yield sse('status', {'status': 'generating', 'plan_id': plan.id})
+
+        last_flush = time.monotonic()
+        async for token in client.astream(prompt, **model_params(plan, client, job.bypass_cache, job.segments)):
+            for event, data in tracker.feed(token):
+                # Partial regenerations are merged into the existing steps only once complete
+                if event == 'section' and not job.segments and time.monotonic() - last_flush >= flush_interval:
+                    await Plan.objects.filter(pk=plan.pk).aupdate(content=parse_sections(tracker.text))
+                    last_flush = time.monotonic()
+                yield sse(event, data)
+
+        generated = await sync_to_async(save_generation)(plan, tracker.text, job.segments)
+        await sync_to_async(finish_job)(job)
+        finished = True
+        yield sse('done', {'status': 'completed', 'generated_plan_id': generated.id})
+    except (asyncio.CancelledError, GeneratorExit):
+        raise
+    except Exception as e:
+        logger.exception("Streaming generation for plan %s failed", plan.id)
+        status = await sync_to_async(finish_job)(job, e)
+        finished = True
+        yield sse('error', {'status': status, 'error': str(e)})
+    finally:
+        if not finished:
+            # Client disconnected mid-generation; let a worker finish the plan
+            # without counting this attempt against it.
+            await GenerationJob.objects.filter(pk=job.pk, status='running').aupdate(
+                status='queued', worker='', attempts=F('attempts') - 1
+            )
+
+
+async def follow_plan(plan_id, poll_interval=1.0, timeout=None):
+    """Replay a plan's sections, polling while another worker is still generating it.
+
+    The last section is held back until generation finishes because it may
+    still be growing. Following ends with an ``error`` event once no new
+    section has arrived for ``timeout`` seconds (``SMARTPLAN_JOB_TIMEOUT``,
+    after which the worker is presumed dead).
+    """
+    timeout = settings.SMARTPLAN_JOB_TIMEOUT if timeout is None else timeout
+    sent = 0
+    seen = 0
+    last_progress = time.monotonic()
+    while True:
+        plan = await Plan.objects.only('status', 'content').aget(pk=plan_id)
+        generating = plan.status == 'generating'
+        sections = plan.content
+        if sections is None and not generating:
+            sections = await sync_to_async(plan_sections)(plan_id)
+        if not isinstance(sections, list):
+            sections = []
+        ready = sections[:-1] if generating else sections
+        for index, section in enumerate(ready[sent:], start=sent):
+            yield sse('section', {'index': index, 'title': section.get('title')})
+            yield sse('token', {'text': section.get('content', '')})
+        sent = max(sent, len(ready))
+        if not generating:
+            yield sse('done', {'status': plan.status})
+            return
+        if len(sections) > seen:
+            seen = len(sections)
+            last_progress = time.monotonic()
+        elif time.monotonic() - last_progress >= timeout:
+            yield sse('error', {'status': 'generating', 'error': 'Generation stopped making progress'})
+            return
+        yield ': keep-alive\n\n'
+        await asyncio.sleep(poll_interval)
@@ -1,3 +1,725 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import sqlite3
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, router
+from django.db.migrations.executor import MigrationExecutor
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import async_views, routers, search
+from .authentication import TokenCache
+from .benchmarks.scenarios import uncovered_routes
+from .contacts import run_import
+from .fields import decompress, load_dictionary, resolve
+from .logos import store_logo
+from .generation import (
+    StubLLMClient, build_context, claim_jobs, enqueue_generation, render_prompt, requeue_stale_jobs, run_job,
+)
+from .models import (
+    Contact, ContactImport, GeneratedPlan, GenerationJob, LogoAsset, Plan, PlanStep, Template, TemplateOption,
+)
+from .steps import plan_segments
+from .streaming import follow_plan
+
+
+def create_plan(user, **fields):
+    fields = {'title': 'Launch', 'plan_type': 'open-house', 'channels': ['email'], 'timeline': '30days', **fields}
+    return Plan.objects.create(user=user, **fields)
+
+
+class FailingLLMClient(StubLLMClient):
+    def complete(self, prompt, **params):
+        raise RuntimeError('model unavailable')
+
+
+@override_settings(SMARTPLAN_DB_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # 'replica' mirrors the test database (TEST['MIRROR']), so it sees the same rows
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        routers._health.clear()
+        self.addCleanup(routers._health.clear)
+        self.user = get_user_model().objects.create_user('replica@example.com', password='secret')
+        self.plan = create_plan(self.user)
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.user).key}'
+
+    def break_replica(self, name):
+        # A new connection: the mirror's in-memory one is never really closed
+        original = connections['replica']
+        broken = connections.create_connection('replica')
+        broken.settings_dict = {**broken.settings_dict, 'NAME': name}
+        connections['replica'] = broken
+
+        def restore():
+            broken.close()
+            connections['replica'] = original
+        self.addCleanup(restore)
+
+    def list_plans(self):
+        queries = {'default': [], 'replica': []}
+
+        def recorder(alias):
+            def record(execute, sql, params, many, context):
+                queries[alias].append(sql)
+                return execute(sql, params, many, context)
+            return record
+
+        # Unlike CaptureQueriesContext, doesn't open the connection itself
+        with connections['default'].execute_wrapper(recorder('default')), \
+                connections['replica'].execute_wrapper(recorder('replica')):
+            response = self.client.get('/api/plans/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([plan['id'] for plan in response.json()['results']], [self.plan.id])
+        return queries['default'], queries['replica']
+
+    @staticmethod
+    def read_plans(queries):
+        return [sql for sql in queries if 'FROM "smartplan_plan"' in sql]
+
+    def test_safe_reads_use_replica(self):
+        primary, replica = self.list_plans()
+        self.assertTrue(self.read_plans(replica))
+        self.assertFalse(self.read_plans(primary))
+
+    def test_pinned_client_reads_primary(self):
+        self.client.cookies[routers.PIN_COOKIE] = '1'
+        primary, replica = self.list_plans()
+        self.assertTrue(self.read_plans(primary))
+        self.assertFalse(self.read_plans(replica))
+
+    def test_unsafe_requests_and_writes_use_primary(self):
+        factory = RequestFactory()
+        state, token = routers.begin(factory.post('/api/plans/'), pinned=False)
+        try:
+            self.assertEqual(Plan.objects.all().db, 'default')
+        finally:
+            routers.end(token)
+
+        state, token = routers.begin(factory.get('/api/plans/'), pinned=False)
+        try:
+            self.assertEqual(Plan.objects.all().db, 'replica')
+            Plan.objects.filter(pk=self.plan.pk).update(title='Relaunch')
+            self.assertTrue(state.wrote)
+            self.assertEqual(Plan.objects.all().db, 'default')
+        finally:
+            routers.end(token)
+
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(router.allow_migrate('replica', 'smartplan'))
+        self.assertTrue(router.allow_migrate('default', 'smartplan'))
+
+    def test_unavailable_replica_falls_back_to_primary(self):
+        self.break_replica('file:/nonexistent/replica.sqlite3?mode=ro')
+        primary, replica = self.list_plans()
+        self.assertTrue(self.read_plans(primary))
+        self.assertFalse(routers._health['replica'][0])
+
+    def test_replica_lost_since_last_check_falls_back_to_primary(self):
+        routers._health['replica'] = (True, time.monotonic())
+        self.break_replica('file:/nonexistent/replica.sqlite3?mode=ro')
+        primary, replica = self.list_plans()
+        self.assertTrue(self.read_plans(primary))
+        self.assertFalse(routers._health['replica'][0])
+
+    def test_failed_replica_read_is_retried_on_primary(self):
+        # Opens fine but lacks the schema, like a replica that fell behind
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'stale.sqlite3'
+        db = sqlite3.connect(path)
+        db.execute('CREATE TABLE django_migrations (id integer)')
+        db.close()
+        routers._health['replica'] = (True, time.monotonic())
+        self.break_replica(f'file:{path}?mode=ro')
+        # The failed attempt's exception is only logged, as it is outside tests
+        self.client.raise_request_exception = False
+        with self.assertLogs('smartplan.routers', 'WARNING') as logs:
+            primary, replica = self.list_plans()
+        self.assertTrue(self.read_plans(replica))
+        self.assertTrue(self.read_plans(primary))
+        self.assertFalse(routers._health['replica'][0])
+        self.assertIn('replica_read_retried', ''.join(logs.output))
+
+
+@override_settings(SMARTPLAN_LLM_CLIENT='smartplan.generation.StubLLMClient', SMARTPLAN_RESPONSE_CACHE=False)
+class GenerationQueueTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('queue@example.com', password='secret')
+
+    def queue(self, count=1):
+        return [enqueue_generation(create_plan(self.user, title=f'Plan {i}')) for i in range(count)]
+
+    def test_concurrent_claims_never_take_the_same_job(self):
+        jobs = self.queue(4)
+        rival = None
+
+        def race(execute, sql, params, many, context):
+            # The other worker claims everything between this one's read and its first UPDATE
+            nonlocal rival
+            if rival is None and sql.startswith('UPDATE'):
+                rival = []
+                rival.extend(claim_jobs(len(jobs), 'rival'))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(race):
+            mine = claim_jobs(len(jobs), 'mine')
+        self.assertEqual(mine, [])
+        self.assertEqual(sorted(rival), sorted(job.id for job in jobs))
+        self.assertEqual(set(GenerationJob.objects.values_list('worker', 'attempts')), {('rival', 1)})
+
+        # Interleaved claims split the queue between the workers
+        more = self.queue(4)
+        first, second = claim_jobs(2, 'mine'), claim_jobs(4, 'rival')
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(sorted(first + second), sorted(job.id for job in more))
+
+    def test_stale_running_job_is_requeued(self):
+        stale, fresh, exhausted = self.queue(3)
+        GenerationJob.objects.update(status='running', worker='gone', attempts=1)
+        GenerationJob.objects.filter(pk__in=[stale.pk, exhausted.pk]).update(
+            started_at=timezone.now() - timedelta(seconds=61)
+        )
+        GenerationJob.objects.filter(pk=fresh.pk).update(started_at=timezone.now())
+        GenerationJob.objects.filter(pk=exhausted.pk).update(attempts=3)
+
+        self.assertEqual(requeue_stale_jobs(60), (1, 1))
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.worker), ('queued', ''))
+        self.assertEqual(GenerationJob.objects.get(pk=fresh.pk).status, 'running')
+        self.assertEqual(GenerationJob.objects.get(pk=exhausted.pk).status, 'failed')
+        self.assertEqual(Plan.objects.get(pk=exhausted.plan_id).status, 'failed')
+        self.assertEqual(claim_jobs(5, 'worker'), [stale.pk])
+
+    def test_failed_job_fails_its_plan(self):
+        job, = self.queue()
+        GenerationJob.objects.filter(pk=job.pk).update(max_attempts=2)
+        client = FailingLLMClient()
+
+        claim_jobs(1, 'worker')
+        with self.assertLogs('smartplan.generation', 'ERROR'):
+            self.assertEqual(run_job(job.pk, client), 'queued')
+        self.assertEqual(Plan.objects.get(pk=job.plan_id).status, 'generating')
+
+        claim_jobs(1, 'worker')
+        with self.assertLogs('smartplan.generation', 'ERROR'):
+            self.assertEqual(run_job(job.pk, client), 'failed')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), ('failed', 2, 'model unavailable'))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(Plan.objects.get(pk=job.plan_id).status, 'failed')
+
+    def test_once_drains_the_queue(self):
+        jobs = self.queue(5)
+        out = io.StringIO()
+        call_command('run_generation_worker', '--once', '--workers', '2', '--poll-interval', '0.05', stdout=out)
+        self.assertIn('Processed 5 jobs', out.getvalue())
+        self.assertEqual(set(GenerationJob.objects.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(set(Plan.objects.values_list('status', flat=True)), {'completed'})
+        self.assertEqual(PlanStep.objects.filter(plan_id=jobs[0].plan_id).count(), len(plan_segments(['email'], '30days')))
+
+
+def parse_events(chunks):
+    events = []
+    for frame in ''.join(chunks).split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in frame.splitlines() if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@override_settings(
+    SMARTPLAN_LLM_CLIENT='smartplan.generation.StubLLMClient', SMARTPLAN_RESPONSE_CACHE=False,
+    SMARTPLAN_STUB_TOKEN_DELAY=0.001,
+)
+class PlanStreamTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('stream@example.com', password='secret')
+        self.plan = create_plan(self.user, status='completed')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=self.user).key}'
+
+    async def stream(self, ticket, **params):
+        response = await self.async_client.get(f'/api/plans/{self.plan.id}/stream/', {'ticket': ticket, **params})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return parse_events([chunk.decode() async for chunk in response.streaming_content])
+
+    def ticket(self, **data):
+        response = self.client.post('/api/stream-tickets/', data, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    async def test_regenerate_streams_tokens_and_sections(self):
+        ticket = await sync_to_async(self.ticket)(plan=self.plan.id, regenerate=True)
+        self.assertIsNotNone(ticket['job'])
+
+        events = await self.stream(ticket['ticket'])
+        names = [name for name, _ in events]
+        self.assertEqual((names[0], names[-1]), ('status', 'done'))
+        self.assertGreater(names.count('token'), names.count('section'))
+        sections = [data['title'] for name, data in events if name == 'section']
+        self.assertEqual(len(sections), len(plan_segments(['email'], '30days')))
+
+        plan = await Plan.objects.aget(pk=self.plan.pk)
+        job = await GenerationJob.objects.aget(pk=ticket['job'])
+        self.assertEqual((plan.status, job.status), ('completed', 'completed'))
+        self.assertEqual(await PlanStep.objects.filter(plan=plan).acount(), len(sections))
+
+    async def test_get_never_starts_a_generation(self):
+        ticket = await sync_to_async(self.ticket)()
+        self.assertNotIn('job', ticket)
+
+        events = await self.stream(ticket['ticket'], regenerate='1')
+        self.assertEqual(events, [('done', {'status': 'completed'})])
+        self.assertFalse(await GenerationJob.objects.aexists())
+
+    def test_regenerate_needs_own_plan(self):
+        other = create_plan(get_user_model().objects.create_user('other@example.com', password='secret'))
+        response = self.client.post('/api/stream-tickets/', {'plan': other.id, 'regenerate': True},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(GenerationJob.objects.exists())
+
+    async def test_follow_gives_up_without_progress(self):
+        # Generating, but no worker holds a job for it
+        await Plan.objects.filter(pk=self.plan.pk).aupdate(status='generating')
+        events = [event async for event in follow_plan(self.plan.id, poll_interval=0.01, timeout=0.05)]
+        self.assertEqual(parse_events(events)[-1][0], 'error')
+
+
+class TokenCacheTests(TransactionTestCase):
+    def setUp(self):
+        caches['shared'].clear()
+        user = get_user_model().objects.create_user('token@example.com', password='secret')
+        self.token = Token.objects.create(user=user)
+
+    def test_callers_get_their_own_user(self):
+        cache = TokenCache(100, 60)
+        cache.set(self.token.key, (self.token.user, self.token))
+        user, token = cache.get(self.token.key)
+        user.business_name = 'Changed by one request'
+        self.assertIsNot(user, self.token.user)
+        self.assertIs(token.user, user)
+        self.assertEqual(cache.get(self.token.key)[0].business_name, self.token.user.business_name)
+
+    def test_invalidation_reaches_other_processes(self):
+        this, other = TokenCache(100, 60, 'shared', local_ttl=0.05), TokenCache(100, 60, 'shared', local_ttl=0.05)
+        this.set(self.token.key, (self.token.user, self.token))
+        self.assertEqual(other.get(self.token.key)[1].key, self.token.key)
+        this.invalidate(self.token.key)
+        time.sleep(0.06)
+        self.assertIsNone(other.get(self.token.key))
+
+
+class SearchIndexTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('search@example.com', password='secret')
+        self.plan = create_plan(self.user, title='Spring open house', description='Neighborhood mailer')
+
+    def search(self, text):
+        return [plan_id for plan_id, _, _ in search.search_plans(self.user, text)]
+
+    def assertIndexIntact(self):
+        with connection.cursor() as cursor:
+            for table in (search.PLAN_TABLE, search.GENERATED_TABLE):
+                cursor.execute(f"INSERT INTO {table} ({table}, rank) VALUES ('integrity-check', 1)")
+
+    def test_queryset_updates_reindex(self):
+        Plan.objects.filter(pk=self.plan.pk).update(title='Autumn open house')
+        self.assertEqual(self.search('autumn'), [self.plan.pk])
+        self.assertEqual(self.search('spring'), [])
+
+        self.plan.refresh_from_db()
+        self.plan.description = 'Postcard drop'
+        Plan.objects.bulk_update([self.plan], ['description'])
+        self.assertEqual(self.search('postcard'), [self.plan.pk])
+        self.assertEqual(self.search('mailer'), [])
+        self.assertIndexIntact()
+
+    def test_step_writes_reindex_their_plan(self):
+        PlanStep.objects.bulk_create([
+            PlanStep(plan=self.plan, position=0, day_offset=0, title='Week 1', content='Call every seller'),
+            PlanStep(plan=self.plan, position=1, day_offset=7, title='Week 2', content='Bake cookies'),
+        ])
+        self.assertEqual(self.search('cookies'), [self.plan.pk])
+        PlanStep.objects.filter(plan=self.plan, position=1).update(content='Hand out flyers')
+        self.assertEqual(self.search('cookies'), [])
+        self.assertEqual(self.search('flyers'), [self.plan.pk])
+        PlanStep.objects.filter(plan=self.plan, position=0).delete()
+        self.assertEqual(self.search('seller'), [])
+        self.assertIndexIntact()
+
+    def test_owner_change_and_delete(self):
+        other = get_user_model().objects.create_user('other@example.com', password='secret')
+        Plan.objects.filter(pk=self.plan.pk).update(user=other)
+        self.assertEqual(self.search('spring'), [])
+        self.assertEqual([plan_id for plan_id, _, _ in search.search_plans(other, 'spring')], [self.plan.pk])
+        other.delete()
+        self.assertIndexIntact()
+        self.assertEqual(search.rebuild(), {'Plan': 0, 'GeneratedPlan': 0})
+
+    def test_generated_plans(self):
+        generated = GeneratedPlan.objects.create(user=self.user, plan=self.plan, content='## Week 1\nDoor knocking')
+        matches = GeneratedPlan.objects.filter(search.match_filter(GeneratedPlan, 'knocking'))
+        self.assertEqual(list(matches), [generated])
+        GeneratedPlan.objects.filter(pk=generated.pk).update(content='## Week 1\nOpen house signs')
+        self.assertFalse(GeneratedPlan.objects.filter(search.match_filter(GeneratedPlan, 'knocking')).exists())
+        self.assertIndexIntact()
+
+
+class ContactImportTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name, SMARTPLAN_CONTACT_IMPORT_BATCH_SIZE=2))
+        user = get_user_model().objects.create_user('contacts@example.com', password='secret')
+        self.plan = create_plan(user, plan_type='past-clients')
+
+    def run_import(self, data):
+        job = ContactImport.objects.create(plan=self.plan, file=SimpleUploadedFile('clients.csv', data), size=len(data))
+        return run_import(job.pk)
+
+    def contacts(self):
+        return list(self.plan.contacts.order_by('id').values_list('first_name', 'last_name', 'email', 'phone'))
+
+    def test_windows_1252_file(self):
+        text = (
+            'First Name,Last Name,Email\nJosé,Müller,jose@example.com\n'
+            'Renée,“Ré” Ñúñez,renee@example.com\n'
+        )
+        job = self.run_import(text.encode('cp1252'))
+        self.assertEqual((job.status, job.created_count), ('completed', 2))
+        self.assertEqual(self.contacts(), [
+            ('José', 'Müller', 'jose@example.com', ''),
+            ('Renée', '“Ré” Ñúñez', 'renee@example.com', ''),
+        ])
+
+    def test_undecodable_file_fails(self):
+        with self.assertLogs('smartplan.contacts', 'WARNING'):
+            job = self.run_import(b'Email\nx\x81@example.com\n')
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('CSV UTF-8', job.error)
+        self.assertFalse(Contact.objects.exists())
+
+    def test_invalid_rows_are_reported(self):
+        job = self.run_import(
+            b'Name,Email,Phone\nAda Lovelace,ADA@Example.com,\nNo Contact,,\nBad Mail,not-an-email,\n'
+            b'Bad Phone,,12\nGrace Hopper,,(415) 555-0100\n'
+        )
+        self.assertEqual((job.status, job.processed_rows), ('completed', 5))
+        self.assertEqual((job.created_count, job.invalid_count), (2, 3))
+        self.assertEqual([row['line'] for row in job.invalid_rows], [3, 4, 5])
+        self.assertEqual(self.contacts(), [
+            ('Ada', 'Lovelace', 'ada@example.com', ''),
+            ('Grace', 'Hopper', '', '+14155550100'),
+        ])
+
+    def test_duplicate_rows_are_skipped(self):
+        Contact.objects.create(plan=self.plan, first_name='Existing', email='old@example.com')
+        job = self.run_import(
+            b'Email,Phone\nold@example.com,\nnew@example.com,415-555-0100\nNEW@example.com,\n'
+            b'other@example.com,(415) 555-0100\nlast@example.com,\n'
+        )
+        self.assertEqual((job.status, job.created_count, job.duplicate_count), ('completed', 2, 3))
+        self.assertEqual(
+            [email for _, _, email, _ in self.contacts()], ['old@example.com', 'new@example.com', 'last@example.com'],
+        )
+
+
+@override_settings(SMARTPLAN_LLM_CLIENT='smartplan.generation.StubLLMClient', SMARTPLAN_RESPONSE_CACHE=False)
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class LogoUploadTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        user = get_user_model().objects.create_user('logos@example.com', password='secret')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=user).key}'
+
+    def upload(self, name, data):
+        return self.client.put(
+            '/api/users/settings/', encode_multipart(BOUNDARY, {'logo': SimpleUploadedFile(name, data)}),
+            content_type=MULTIPART_CONTENT,
+        )
+
+    def test_extension_comes_from_the_image_format(self):
+        asset, created = store_logo(SimpleUploadedFile('logo.html', png_bytes()))
+        self.assertTrue(created)
+        self.assertTrue(asset.original.name.endswith(f'{asset.sha256}.png'))
+
+    def test_non_images_are_rejected(self):
+        for name, data in [
+            ('logo.html', b'<script>alert(1)</script>'),
+            ('logo.svg', b'<svg xmlns="http://www.w3.org/2000/svg" onload="alert(1)"/>'),
+            ('logo.png', png_bytes()[:40]),
+        ]:
+            with self.assertLogs('smartplan.views', 'ERROR'):
+                response = self.upload(name, data)
+            self.assertEqual(response.status_code, 400, name)
+            self.assertEqual(response.json()['error'], 'Logo must be a PNG, JPEG, WebP or GIF image')
+        self.assertFalse(LogoAsset.objects.exists())
+        self.assertFalse(get_user_model().objects.get().logo)
+
+
+class TemplateOptionTests(TransactionTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('options@example.com', password='secret')
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {Token.objects.create(user=user).key}'
+        self.template = Template.objects.create(
+            name='Open house', description='', prompt_template='Open house in {neighborhood} with {guests} guests',
+        )
+        TemplateOption.objects.create(
+            template=self.template, name='neighborhood', description='', is_required=True, option_type='text',
+        )
+        TemplateOption.objects.create(
+            template=self.template, name='guests', description='', is_required=True, option_type='number',
+            default_value=20,
+        )
+
+    def create(self, **data):
+        return self.client.post('/api/plans/', {
+            'plan_type': 'open-house', 'channels': ['email'], 'timeline': '30days', 'template': self.template.id,
+            **data,
+        }, content_type='application/json')
+
+    def test_required_option_values_reach_the_prompt(self):
+        response = self.create(options={'neighborhood': 'Noe Valley'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['options'], {'neighborhood': 'Noe Valley'})
+
+        job = GenerationJob.objects.get(plan_id=response.json()['id'])
+        claim_jobs(1, 'worker')
+        self.assertEqual(run_job(job.pk, StubLLMClient()), 'completed')
+        plan = Plan.objects.select_related('user').get(pk=job.plan_id)
+        self.assertEqual(render_prompt(self.template, build_context(plan)), 'Open house in Noe Valley with 20 guests')
+
+    def test_invalid_options_are_rejected(self):
+        for options, error in [
+            (None, 'Missing required options: neighborhood'),
+            ({'neighborhood': ''}, 'Missing required options: neighborhood'),
+            ({'neighborhood': 'Noe Valley', 'pets': 'yes'}, 'Unknown options: pets'),
+            ({'neighborhood': 'Noe Valley', 'guests': 'many'}, "Invalid value for option guests: 'many'"),
+            ('Noe Valley', 'options must be a JSON object'),
+        ]:
+            response = self.create(options=options)
+            self.assertEqual((response.status_code, response.json()['error']), (400, error))
+        self.assertFalse(Plan.objects.exists())
+
+    def test_bulk_specs_are_checked(self):
+        spec = {'plan_type': 'open-house', 'channels': ['email'], 'timeline': '30days', 'template': self.template.id}
+        response = self.client.post('/api/plans/bulk/', {'plans': [
+            dict(spec, options={'neighborhood': 'Noe Valley'}), spec,
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['created']), 1)
+        self.assertEqual(response.json()['errors'], [
+            {'index': 1, 'errors': {'options': ['Missing required options: neighborhood']}},
+        ])
+        self.assertEqual(Plan.objects.get().options, {'neighborhood': 'Noe Valley'})
+
+
+class MetricsAccessTests(TransactionTestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('metrics@example.com', password='secret')
+
+    def test_staff_only_without_a_token(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/metrics').status_code, 403)
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(self.client.get('/api/metrics').status_code, 200)
+
+    def test_staff_api_tokens_without_a_token(self):
+        token = Token.objects.create(user=self.user).key
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Token nope').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION=f'Token {token}').status_code, 403)
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION=f'Token {token}').status_code, 200)
+
+    @override_settings(SMARTPLAN_METRICS_TOKEN='scrape')
+    def test_token_is_required_when_configured(self):
+        self.user.is_staff = True
+        self.user.save(update_fields=['is_staff'])
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/api/metrics').status_code, 401)
+        self.assertEqual(self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        response = self.client.get('/api/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+
+class PlanValidationTests(TransactionTestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user('validation@example.com', password='secret')
+        self.token = Token.objects.create(user=user).key
+        self.client.defaults['HTTP_AUTHORIZATION'] = f'Token {self.token}'
+        self.template = Template.objects.create(name='Default', description='', prompt_template='Plan for {plan_type}')
+
+    invalid = [
+        ({'channels': 'email'}, 'Channels must be a list'),
+        ({'channels': ['email', 'fax']}, 'Invalid channel: fax'),
+        ({'channels': [['email']]}, "Invalid channel: ['email']"),
+        ({'template': True}, 'Invalid template: True'),
+    ]
+
+    def spec(self, **data):
+        return {'plan_type': 'open-house', 'channels': ['email'], 'timeline': '30days', **data}
+
+    def test_single_plan_post(self):
+        for data, error in self.invalid:
+            response = self.client.post('/api/plans/', self.spec(**data), content_type='application/json')
+            self.assertEqual((response.status_code, response.json()['error']), (400, error))
+        self.assertFalse(Plan.objects.exists())
+
+    async def test_async_single_plan_post(self):
+        factory = AsyncRequestFactory()
+        for data, error in self.invalid:
+            request = factory.post(
+                '/api/plans/', self.spec(**data), content_type='application/json',
+                headers={'Authorization': f'Token {self.token}'},
+            )
+            response = await async_views.plan_list_create(request)
+            self.assertEqual((response.status_code, json.loads(response.content)['error']), (400, error))
+        self.assertFalse(await Plan.objects.aexists())
+
+    def test_bulk_rejects_boolean_templates(self):
+        response = self.client.post('/api/plans/bulk/', {'plans': [
+            self.spec(template=True), self.spec(template=self.template.id), self.spec(channels='email'),
+        ]}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['errors'], [
+            {'index': 0, 'errors': {'template': ['Invalid template: True']}},
+            {'index': 2, 'errors': {'channels': ['Channels must be a list']}},
+        ])
+        self.assertEqual(Plan.objects.get().template_id, self.template.id)
+
+
+class CompressedFieldTests(TransactionTestCase):
+    json_values = [None, {}, [], '', 0, 'plain', {'title': 'Café in Zürich', 'steps': ['東京', '🏡', 'naïve']}]
+    text_values = ['', 'Über die Straße', '東京の家 🏡']
+    codecs = {
+        b'Z': {'SMARTPLAN_COMPRESSION_CODEC': 'zlib'},
+        b'S': {'SMARTPLAN_COMPRESSION_CODEC': 'zstd'},
+        b'D': {'SMARTPLAN_COMPRESSION_CODEC': 'zstd', 'SMARTPLAN_COMPRESSION_DICTIONARIES': {'open-house': None}},
+    }
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('fields@example.com', password='secret')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dictionary = Path(directory.name) / 'open-house.dict'
+        self.dictionary.write_bytes('Open house this Sunday in the neighborhood. '.encode() * 20)
+        self.addCleanup(load_dictionary.cache_clear)
+
+    def stored(self, table, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT content FROM {table} WHERE id = %s', [pk])
+            return cursor.fetchone()[0]
+
+    def test_round_trips(self):
+        for tag, codec in self.codecs.items():
+            if 'SMARTPLAN_COMPRESSION_DICTIONARIES' in codec:
+                codec = dict(codec, SMARTPLAN_COMPRESSION_DICTIONARIES={'open-house': str(self.dictionary)})
+            with self.subTest(tag=tag), override_settings(**codec):
+                load_dictionary.cache_clear()
+                for value in self.json_values:
+                    plan = create_plan(self.user, content=value)
+                    self.assertEqual(Plan.objects.get(pk=plan.pk).content, value)
+                    stored = self.stored('smartplan_plan', plan.pk)
+                    self.assertEqual(stored if value is None else bytes(stored)[:1], None if value is None else tag)
+                    self.assertEqual(resolve(Plan.objects.filter(pk=plan.pk).values_list('content', flat=True).get()), value)
+
+                for value in self.text_values:
+                    generated = GeneratedPlan.objects.create(user=self.user, plan=plan, content=value)
+                    step = PlanStep.objects.create(plan=plan, position=generated.pk, day_offset=0, title='Day 1', content=value)
+                    self.assertEqual(GeneratedPlan.objects.get(pk=generated.pk).content, value)
+                    self.assertEqual(PlanStep.objects.get(pk=step.pk).content, value)
+                    self.assertEqual(bytes(self.stored('smartplan_generatedplan', generated.pk))[:1], tag)
+
+                field = GeneratedPlan._meta.get_field('content')
+                self.assertIsNone(field.encode(None))
+                self.assertIsNone(field.decode(None))
+                # While the dictionary is configured: the search triggers read the rows being deleted
+                Plan.objects.all().delete()
+
+    def test_values_stay_readable_after_a_codec_change(self):
+        with override_settings(SMARTPLAN_COMPRESSION_CODEC='zlib'):
+            zlib_plan = create_plan(self.user, content={'text': 'Grüße'})
+        with override_settings(SMARTPLAN_COMPRESSION_CODEC='zstd'):
+            zstd_plan = create_plan(self.user, content={'text': '東京'})
+        self.assertEqual(Plan.objects.get(pk=zstd_plan.pk).content, {'text': '東京'})
+        with override_settings(SMARTPLAN_COMPRESSION_CODEC='zstd'):
+            self.assertEqual(Plan.objects.get(pk=zlib_plan.pk).content, {'text': 'Grüße'})
+
+
+class CompressionMigrationTests(TransactionTestCase):
+    before = ('smartplan', '0005_plan_generatedplan_user_indexes')
+    after = ('smartplan', '0007_compress_existing_content')
+
+    def migrate(self, target):
+        call_command('migrate', *target, verbosity=0)
+
+    def test_existing_rows_survive_compression_and_its_reversal(self):
+        self.addCleanup(call_command, 'migrate', verbosity=0)
+        self.migrate(self.before)
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        user = apps.get_model('smartplan', 'CustomUser').objects.create(email='migrate@example.com', password='x')
+        contents = [None, {}, '', {'title': 'Café 東京 🏡', 'steps': [1, 2.5, None]}, ['naïve']]
+        plans = {
+            apps.get_model('smartplan', 'Plan').objects.create(
+                user=user, title=f'Plan {i}', plan_type='open-house', channels=['email'], timeline='30days',
+                content=content,
+            ).pk: content
+            for i, content in enumerate(contents)
+        }
+        texts = {
+            apps.get_model('smartplan', 'GeneratedPlan').objects.create(
+                user=user, plan_id=pk, content=text,
+            ).pk: text
+            for pk, text in zip(plans, ['', 'Über', '東京 🏡', 'plain', 'x' * 5000])
+        }
+
+        # Small chunks so the keyset paging crosses several batches
+        migration = importlib.import_module('smartplan.migrations.0007_compress_existing_content')
+        with mock.patch.object(migration, 'CHUNK_SIZE', 2):
+            self.migrate(self.after)
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT id, content FROM smartplan_plan')
+                for pk, stored in cursor.fetchall():
+                    expected = plans[pk]
+                    self.assertEqual(None if stored is None else json.loads(decompress(stored)), expected)
+                cursor.execute('SELECT id, content FROM smartplan_generatedplan')
+                self.assertEqual({pk: decompress(stored).decode('utf-8') for pk, stored in cursor.fetchall()}, texts)
+
+            self.migrate(self.before)
+        apps = MigrationExecutor(connection).loader.project_state(self.before).apps
+        self.assertEqual(dict(apps.get_model('smartplan', 'Plan').objects.values_list('pk', 'content')), plans)
+        self.assertEqual(dict(apps.get_model('smartplan', 'GeneratedPlan').objects.values_list('pk', 'content')), texts)
+
+
+class BenchmarkScenarioTests(SimpleTestCase):
+    def test_every_route_has_a_scenario(self):
+        self.assertEqual(uncovered_routes(), [])
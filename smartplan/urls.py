@@ -1,9 +1,13 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from django.conf import settings
+from . import async_views, views
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.http import JsonResponse
 
+# Async-native versions of the hot endpoints for ASGI deployments
+api = async_views if settings.SMARTPLAN_ASYNC_VIEWS else views
+
 router = DefaultRouter()
 router.register(r'templates', views.TemplateViewSet)
 
@@ -13,12 +17,25 @@ def get_csrf_token(request):
 
 urlpatterns = [
     path('', include(router.urls)),
-    path('auth/register/', views.register_user, name='register'),
-    path('auth/login/', views.login_user, name='login'),
+    path('auth/register/', api.register_user, name='register'),
+    path('auth/login/', api.login_user, name='login'),
     path('auth/logout/', views.logout_user, name='logout'),
-    path('auth/user/', views.get_user, name='user'),
-    path('users/settings/', views.user_settings, name='user_settings'),
-    path('plans/', views.plan_list_create, name='plan-list-create'),
-    path('plans/<int:plan_id>/', views.plan_detail, name='plan-detail'),
+    path('auth/user/', api.get_user, name='user'),
+    path('users/settings/', api.user_settings, name='user_settings'),
+    path('plans/', api.plan_list_create, name='plan-list-create'),
+    path('plans/search/', views.plan_search, name='plan-search'),
+    path('plans/bulk/', views.plan_bulk_create, name='plan-bulk-create'),
+    path('plans/export/', views.plan_export, name='plan-export'),
+    path('plans/<int:plan_id>/', api.plan_detail, name='plan-detail'),
+    path('plans/<int:plan_id>/steps/', views.plan_steps, name='plan-steps'),
+    path('plans/<int:plan_id>/stream/', views.plan_stream, name='plan-stream'),
+    path('stream-tickets/', views.stream_ticket, name='stream-ticket'),
+    path('calendar/', views.plan_calendar, name='calendar'),
+    path('plans/<int:plan_id>/contacts/', views.plan_contacts, name='plan-contacts'),
+    path('plans/<int:plan_id>/contacts/imports/', views.contact_import_create, name='contact-import'),
+    path('plans/<int:plan_id>/contacts/imports/<int:import_id>/', views.contact_import_detail,
+         name='contact-import-detail'),
     path('auth/csrf/', get_csrf_token, name='csrf'),
+    path('metrics', views.metrics, name='metrics'),
+    path('metrics/caches/', views.cache_stats, name='cache-stats'),
 ] 
\ No newline at end of file
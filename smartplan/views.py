@@ -1,28 +1,69 @@
 from django.shortcuts import render
+from django.urls import reverse
 from rest_framework import viewsets, status
-from rest_framework.decorators import action, api_view, permission_classes, authentication_classes
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.decorators import action, api_view, parser_classes, permission_classes, authentication_classes
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from .models import Template, GeneratedPlan, UserProfile, Plan
-from .serializers import TemplateSerializer, GeneratedPlanSerializer, UserProfileSerializer, PlanSerializer
+from .models import Template, GeneratedPlan, UserProfile, Plan, PlanStep, Contact, ContactImport, Touchpoint
+from .fields import resolve
+from .bulk import bulk_create_plans, channel_errors
+from .contacts import import_payload, queue_import
+from . import search
+from .catalog import get_catalog
+from .steps import attach_step_content, segment_title
+from .logos import logo_payload, set_user_logo
+from .settings_snapshot import BRANDING_FIELDS, BUSINESS_FIELDS, SOCIAL_FIELDS, apply_changes, get_snapshot
+from .generation import active_template, enqueue_generation, regenerate_changed_segments, template_options
+from .prompts import template_cache
+from .response_cache import response_cache
+from .export import CONTENT_TYPES, aiterate, export_stream, filename
+from .streaming import (
+    aclaim_plan_job, aget_request_user, follow_plan, issue_stream_ticket, queue_regeneration, stream_generation,
+)
+from .serializers import TemplateSerializer, GeneratedPlanSerializer, UserProfileSerializer, PlanSerializer, PlanReadSerializer
+from .pagination import KeysetPagination
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.core.handlers.asgi import ASGIRequest
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, router
+from django.db.models import OuterRef, Q, Subquery
 from django.middleware.csrf import get_token
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth import login, logout, authenticate, get_user_model
 from django.views.decorators.csrf import ensure_csrf_cookie
 import json
-from django.core.files.storage import default_storage
+from datetime import date, timedelta
 from django.utils import timezone
+from django.conf import settings
 from rest_framework.authtoken.models import Token
-from rest_framework.authentication import TokenAuthentication, SessionAuthentication
+from .authentication import CachedTokenAuthentication, SessionAuthentication, token_cache
+from .instrumentation import log_event, render_prometheus, sampled
 from django.utils.decorators import method_decorator
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create your views here.
 
 class TemplateViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Template.objects.filter(is_active=True)
+    queryset = Template.objects.filter(is_active=True).prefetch_related('options')
     serializer_class = TemplateSerializer
 
+    def list(self, request, *args, **kwargs):
+        # The catalog is pre-rendered and rebuilt by signals, so this is a cache read
+        body, etag = get_catalog()
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
 class GeneratedPlanViewSet(viewsets.ModelViewSet):
     serializer_class = GeneratedPlanSerializer
 
@@ -101,11 +142,42 @@ def login_user(request):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def logout_user(request):
+    token_cache.invalidate_user(request.user.pk)
     request.user.auth_token.delete()
     return Response({'message': 'Successfully logged out'})
 
 @api_view(['GET'])
-@authentication_classes([TokenAuthentication])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response({
+        'auth_tokens': token_cache.snapshot(),
+        'prompt_templates': template_cache.snapshot(),
+        'responses': response_cache.snapshot(),
+    })
+
+def metrics(request):
+    """Request histograms of this process in the Prometheus text format.
+
+    Scrapers send ``Bearer <SMARTPLAN_METRICS_TOKEN>``; without a configured
+    token only staff can read them, signed in or with an API token.
+    """
+    token = settings.SMARTPLAN_METRICS_TOKEN
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return HttpResponse(status=401)
+    else:
+        user = request.user
+        if not user.is_authenticated:
+            try:
+                user, _ = CachedTokenAuthentication().authenticate(request) or (user, None)
+            except AuthenticationFailed:
+                pass
+        if not user.is_staff:
+            return HttpResponse(status=403 if user.is_authenticated else 401)
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication])
 @permission_classes([IsAuthenticated])
 def get_user(request):
     try:
@@ -119,7 +191,7 @@ def get_user(request):
             }
         })
     except Exception as e:
-        print(f"Get user error: {str(e)}")
+        logger.exception("Get user failed for user %s", request.user.pk)
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
@@ -129,53 +201,33 @@ def get_user(request):
 @permission_classes([IsAuthenticated])
 @ensure_csrf_cookie
 def user_settings(request):
-    user = request.user
-    
     if request.method == 'GET':
-        return Response({
-            'email': user.email,
-            'full_name': user.full_name,
-            'business_info': {
-                'name': user.business_name,
-                'phone': user.business_phone,
-                'address': user.business_address,
-                'target_market': user.target_market,
-                'value_proposition': user.value_proposition,
-                'additional_context': user.additional_context
-            },
-            'social_media': {
-                'instagram': user.instagram,
-                'facebook': user.facebook,
-                'tiktok': user.tiktok,
-                'linkedin': user.linkedin,
-                'youtube': user.youtube,
-                'twitter': user.twitter,
-                'threads': user.threads
-            },
-            'branding': {
-                'primary_color': user.primary_color,
-                'secondary_color': user.secondary_color,
-                'brand_voice': user.brand_voice,
-                'brand_description': user.brand_description,
-                'logo': user.logo.url if user.logo else None
-            }
-        })
+        # Served from a per-user snapshot that is dropped whenever the user is saved
+        body, etag = get_snapshot(request.user.pk)
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
     
     elif request.method == 'PUT':
         try:
+            # Compare against the stored row, not a possibly cached request.user
+            user = User.objects.get(pk=request.user.pk)
+            changed = []
+
             # Handle multipart form data for file uploads
             if request.content_type and 'multipart/form-data' in request.content_type:
                 if 'branding' in request.data:
                     branding_data = json.loads(request.data['branding'])
-                    user.primary_color = branding_data.get('primaryColor', user.primary_color)
-                    user.secondary_color = branding_data.get('secondaryColor', user.secondary_color)
-                    user.brand_voice = branding_data.get('brandVoice', user.brand_voice)
-                    user.brand_description = branding_data.get('brandDescription', user.brand_description)
+                    changed += apply_changes(user, branding_data, BRANDING_FIELDS)
                 
                 if 'logo' in request.FILES:
-                    if user.logo:
-                        default_storage.delete(user.logo.path)
-                    user.logo = request.FILES['logo']
+                    # Stored by content hash; variants and old-file cleanup run in the background
+                    set_user_logo(user, request.FILES['logo'])
+                    changed += ['logo', 'logo_asset']
             
             # Handle JSON data
             else:
@@ -183,57 +235,66 @@ def user_settings(request):
                 
                 # Update business info
                 if 'business' in data:
-                    business = data['business']
-                    user.business_name = business.get('name', user.business_name)
-                    user.business_phone = business.get('phone', user.business_phone)
-                    user.business_address = business.get('address', user.business_address)
-                    user.target_market = business.get('target_market', user.target_market)
-                    user.value_proposition = business.get('value_proposition', user.value_proposition)
-                    user.additional_context = business.get('additional_context', user.additional_context)
+                    changed += apply_changes(user, data['business'], BUSINESS_FIELDS)
                 
                 # Update social media
                 if 'social' in data:
-                    social = data['social']
-                    user.instagram = social.get('instagram', user.instagram)
-                    user.facebook = social.get('facebook', user.facebook)
-                    user.tiktok = social.get('tiktok', user.tiktok)
-                    user.linkedin = social.get('linkedin', user.linkedin)
-                    user.youtube = social.get('youtube', user.youtube)
-                    user.twitter = social.get('twitter', user.twitter)
-                    user.threads = social.get('threads', user.threads)
+                    changed += apply_changes(user, data['social'], SOCIAL_FIELDS)
             
-            user.save()
-            return Response({
+            # Only write the columns that changed (set_user_logo saves its own)
+            fields = [field for field in changed if field not in ('logo', 'logo_asset')]
+            if fields:
+                user.save(update_fields=fields)
+            response = {
                 'message': 'Settings updated successfully',
-                'updated_fields': request.data.keys()
-            })
+                'updated_fields': request.data.keys(),
+                'changed_fields': changed
+            }
+            if 'logo' in request.FILES:
+                response['branding'] = logo_payload(user)
+            return Response(response)
             
         except Exception as e:
-            print("Error saving settings:", str(e))
+            logger.exception("Saving settings failed for user %s", request.user.pk)
             return Response({
                 'error': str(e)
             }, status=400)
 
 @api_view(['GET', 'POST'])
-@authentication_classes([TokenAuthentication, SessionAuthentication])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def plan_list_create(request):
     if request.method == 'GET':
         plans = Plan.objects.filter(user=request.user)
-        serializer = PlanSerializer(plans, many=True)
-        return Response(serializer.data)
+
+        # Sparse fieldsets: ?fields=id,title,status only loads those columns
+        fields = None
+        if request.query_params.get('fields'):
+            fields = [f.strip() for f in request.query_params['fields'].split(',') if f.strip()]
+            invalid = set(fields) - set(PlanSerializer.Meta.fields)
+            if invalid:
+                return Response({'error': f'Invalid fields: {sorted(invalid)}. Must be among: {PlanSerializer.Meta.fields}'},
+                              status=status.HTTP_400_BAD_REQUEST)
+
+        reader = PlanReadSerializer(fields)
+        # id and created_at are always loaded because the cursor is built from them
+        rows = plans.values(*set(reader.columns()) | {'id', 'created_at'})
+        paginator = KeysetPagination()
+        page = paginator.paginate_queryset(rows, request)
+        if 'content' in reader.fields:
+            attach_step_content(page)
+        return paginator.get_paginated_response(reader.many(page))
     
     elif request.method == 'POST':
         try:
-            # Print everything we can about the request for debugging
-            print("\n=== DEBUG REQUEST ===")
-            print("Headers:", dict(request.headers))
-            print("Body:", request.body.decode('utf-8'))
-            print("Data:", request.data)
-            print("User:", request.user)
-            print("Method:", request.method)
-            print("Content Type:", request.content_type)
-            print("Auth:", request.auth)
+            # Sampled, and never the headers or body: they carry tokens and customer data
+            log_request = sampled()
+            if log_request:
+                log_event(logger, 'plan_create_request', user_id=request.user.pk,
+                          content_type=request.content_type,
+                          # request.body can't be read once DRF has parsed a multipart stream
+                          body_bytes=request.META.get('CONTENT_LENGTH') or 0,
+                          fields=','.join(sorted(request.data)) if isinstance(request.data, dict) else '-')
             
             # Validate required fields
             plan_type = request.data.get('plan_type')
@@ -246,6 +307,8 @@ def plan_list_create(request):
                 return Response({'error': 'channels is required'}, status=status.HTTP_400_BAD_REQUEST)
             if not timeline:
                 return Response({'error': 'timeline is required'}, status=status.HTTP_400_BAD_REQUEST)
+            if channel_errors(channels):
+                return Response({'error': channel_errors(channels)[0]}, status=status.HTTP_400_BAD_REQUEST)
                 
             # Validate plan_type
             if plan_type not in [choice[0] for choice in Plan.PLAN_TYPES]:
@@ -256,6 +319,13 @@ def plan_list_create(request):
             if timeline not in [choice[0] for choice in Plan.TIMELINE_CHOICES]:
                 return Response({'error': f'Invalid timeline. Must be one of: {[choice[0] for choice in Plan.TIMELINE_CHOICES]}'}, 
                               status=status.HTTP_400_BAD_REQUEST)
+
+            # Optional prompt template (and values for its options); generation falls back to the default prompt
+            try:
+                template = active_template(request.data.get('template'))
+                options = template_options(template, request.data.get('options'))
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
             # Create the plan
             plan = Plan.objects.create(
@@ -264,10 +334,17 @@ def plan_list_create(request):
                 plan_type=plan_type,
                 channels=channels,
                 timeline=timeline,
+                template=template,
+                options=options,
                 status='draft'  # Initial status
             )
             
-            print("Plan created:", plan.id)
+            if log_request:
+                log_event(logger, 'plan_created', user_id=request.user.pk, plan_id=plan.id)
+
+            # Hand generation off to the worker pool so the request returns immediately
+            bypass_cache = str(request.data.get('bypass_cache', '')).lower() in ('1', 'true', 'yes')
+            enqueue_generation(plan, template, bypass_cache=bypass_cache)
             
             # Return success response with plan data
             return Response({
@@ -276,37 +353,309 @@ def plan_list_create(request):
                 'plan_type': plan.plan_type,
                 'channels': plan.channels,
                 'timeline': plan.timeline,
+                'template': plan.template_id,
+                'options': plan.options,
                 'status': plan.status,
                 'created_at': plan.created_at,
                 'message': 'Plan created successfully'
             }, status=status.HTTP_201_CREATED)
             
         except Exception as e:
-            print("Error creating plan:", str(e))
+            logger.exception("Creating a plan failed for user %s", request.user.pk)
             return Response({
                 'error': str(e)
             }, status=status.HTTP_400_BAD_REQUEST)
 
+SEARCH_RESULT_FIELDS = ['id', 'title', 'plan_type', 'channels', 'timeline', 'status', 'created_at', 'updated_at']
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def plan_search(request):
+    """Full-text search over the user's plans, best match first, with highlighted snippets."""
+    text = request.query_params.get('q', '').strip()
+    if not text:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), 100))
+    except ValueError:
+        limit = 20
+
+    reader = PlanReadSerializer(fields=SEARCH_RESULT_FIELDS)
+    if not search.is_enabled():
+        plans = Plan.objects.filter(user=request.user).filter(
+            Q(title__icontains=text) | Q(description__icontains=text)
+        )
+        return Response({'results': reader.many(plans.values(*reader.columns())[:limit])})
+
+    hits = search.search_plans(request.user, text, limit)
+    rows = Plan.objects.filter(id__in=[plan_id for plan_id, _, _ in hits]).values(*reader.columns())
+    rows = {row['id']: row for row in rows}
+    results = []
+    for plan_id, score, snippet in hits:
+        if plan_id in rows:
+            results.append(dict(reader.to_representation(rows[plan_id]), score=score, snippet=snippet))
+    return Response({'results': results})
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def plan_bulk_create(request):
+    specs = request.data.get('plans') if isinstance(request.data, dict) else request.data
+    if not isinstance(specs, list) or not specs:
+        return Response({'error': 'plans must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+
+    limit = settings.SMARTPLAN_BULK_PLAN_LIMIT
+    if len(specs) > limit:
+        return Response({'error': f'At most {limit} plans can be created per request'},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    plans, errors = bulk_create_plans(request.user, specs)
+    return Response({
+        'created': [{
+            'id': plan.id,
+            'title': plan.title,
+            'plan_type': plan.plan_type,
+            'channels': plan.channels,
+            'timeline': plan.timeline,
+            'status': plan.status,
+            'created_at': plan.created_at,
+        } for plan in plans],
+        'errors': errors,
+    }, status=status.HTTP_201_CREATED if plans else status.HTTP_400_BAD_REQUEST)
+
 @api_view(['GET', 'PUT', 'DELETE'])
-@authentication_classes([TokenAuthentication, SessionAuthentication])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
 @permission_classes([IsAuthenticated])
 def plan_detail(request, plan_id):
+    if request.method == 'GET':
+        reader = PlanReadSerializer()
+        row = Plan.objects.filter(id=plan_id, user=request.user).values(*reader.columns()).first()
+        if row is None:
+            return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
+        attach_step_content([row])
+        return Response(reader.to_representation(row))
+
     try:
         plan = Plan.objects.get(id=plan_id, user=request.user)
     except Plan.DoesNotExist:
         return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    if request.method == 'GET':
-        serializer = PlanSerializer(plan)
-        return Response(serializer.data)
-
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
+        previous = plan.status, plan.channels, plan.timeline
         serializer = PlanSerializer(plan, data=request.data, partial=True)
         if serializer.is_valid():
-            serializer.save()
+            plan = serializer.save()
+            if previous[0] == 'completed' and 'content' not in serializer.validated_data:
+                # Only generate the (week, channel) segments the edit added
+                regenerate_changed_segments(plan, previous[1], previous[2])
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
         plan.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def plan_steps(request, plan_id):
+    """Touchpoints of one plan, optionally limited to a day window and/or channels.
+
+    ``?day_from=&day_to=`` are day offsets from the plan's start;
+    ``?date=YYYY-MM-DD`` (or ``today``) selects a single calendar day and
+    ``?channel=email,text`` a channel slice.
+    """
+    plan = Plan.objects.filter(id=plan_id, user=request.user).values('id', 'created_at').first()
+    if plan is None:
+        return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    start_date = timezone.localdate(plan['created_at'])
+
+    steps = PlanStep.objects.filter(plan_id=plan_id)
+    try:
+        if request.query_params.get('date'):
+            value = request.query_params['date']
+            day = timezone.localdate() if value == 'today' else date.fromisoformat(value)
+            steps = steps.filter(day_offset=(day - start_date).days)
+        if request.query_params.get('day_from'):
+            steps = steps.filter(day_offset__gte=int(request.query_params['day_from']))
+        if request.query_params.get('day_to'):
+            steps = steps.filter(day_offset__lte=int(request.query_params['day_to']))
+    except ValueError:
+        return Response({'error': 'date must be YYYY-MM-DD and day_from/day_to integers'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    if request.query_params.get('channel'):
+        steps = steps.filter(channel__in=request.query_params['channel'].split(','))
+
+    return Response([{
+        'day_offset': step['day_offset'],
+        'date': start_date + timedelta(days=step['day_offset']),
+        'channel': step['channel'],
+        'title': step['title'],
+        'content': resolve(step['content']),
+    } for step in steps.order_by('day_offset', 'position').values('day_offset', 'channel', 'title', 'content')])
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def plan_calendar(request):
+    """Touchpoints due across all of the user's plans from ``?start=`` to ``?end=`` (inclusive).
+
+    Both are YYYY-MM-DD; ``start`` defaults to today and ``end`` to six days
+    after ``start``. ``?channel=email,text`` selects a channel slice.
+    """
+    try:
+        start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else timezone.localdate()
+        end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else start + timedelta(days=6)
+    except ValueError:
+        return Response({'error': 'start and end must be YYYY-MM-DD'}, status=status.HTTP_400_BAD_REQUEST)
+    if end < start:
+        return Response({'error': 'end must not be before start'}, status=status.HTTP_400_BAD_REQUEST)
+    if (end - start).days >= settings.SMARTPLAN_CALENDAR_MAX_DAYS:
+        return Response({'error': f'The range can cover at most {settings.SMARTPLAN_CALENDAR_MAX_DAYS} days'},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    touchpoints = Touchpoint.objects.filter(user=request.user, date__range=(start, end))
+    if request.query_params.get('channel'):
+        touchpoints = touchpoints.filter(channel__in=request.query_params['channel'].split(','))
+    # Generated plans have a step for each touchpoint; drafts fall back to the segment title
+    step_title = PlanStep.objects.filter(
+        plan_id=OuterRef('plan_id'), day_offset=OuterRef('day_offset'), channel=OuterRef('channel')
+    ).order_by('position').values('title')[:1]
+    rows = touchpoints.order_by('date', 'plan_id', 'id').values(
+        'date', 'day_offset', 'channel', 'plan_id', 'plan__title', 'plan__status', title=Subquery(step_title)
+    )
+    return Response([{
+        'date': row['date'],
+        'plan': row['plan_id'],
+        'plan_title': row['plan__title'],
+        'plan_status': row['plan__status'],
+        'day_offset': row['day_offset'],
+        'channel': row['channel'],
+        'title': row['title'] or segment_title(row['day_offset'], row['channel']),
+    } for row in rows])
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def plan_contacts(request, plan_id):
+    if not Plan.objects.filter(id=plan_id, user=request.user).exists():
+        return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    contacts = Contact.objects.filter(plan_id=plan_id).values(
+        'id', 'first_name', 'last_name', 'email', 'phone', 'created_at'
+    )
+    paginator = KeysetPagination()
+    return paginator.get_paginated_response(paginator.paginate_queryset(contacts, request))
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def contact_import_create(request, plan_id):
+    """Queue a CSV of past clients (``file``) for import; poll the returned import for progress."""
+    plan = Plan.objects.filter(id=plan_id, user=request.user).only('id', 'plan_type').first()
+    if plan is None:
+        return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
+    if plan.plan_type != 'past-clients':
+        return Response({'error': 'Contact lists can only be imported into past-clients plans'},
+                      status=status.HTTP_400_BAD_REQUEST)
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({'error': 'file is required'}, status=status.HTTP_400_BAD_REQUEST)
+    if upload.size > settings.SMARTPLAN_CONTACT_IMPORT_MAX_BYTES:
+        return Response({'error': f'File is larger than {settings.SMARTPLAN_CONTACT_IMPORT_MAX_BYTES} bytes'},
+                      status=status.HTTP_400_BAD_REQUEST)
+
+    job = queue_import(plan, upload)
+    response = Response(import_payload(job), status=status.HTTP_202_ACCEPTED)
+    response['Location'] = reverse('contact-import-detail', kwargs={'plan_id': plan_id, 'import_id': job.id})
+    return response
+
+@api_view(['GET'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def contact_import_detail(request, plan_id, import_id):
+    job = ContactImport.objects.filter(id=import_id, plan_id=plan_id, plan__user=request.user).first()
+    if job is None:
+        return Response({'message': 'Import not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(import_payload(job))
+
+@api_view(['POST'])
+@authentication_classes([CachedTokenAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def stream_ticket(request):
+    """A short-lived ``?ticket=`` for the stream and export URLs, which ``EventSource`` cannot send headers to.
+
+    ``{"plan": <id>, "regenerate": true}`` also queues a fresh generation of
+    that plan for its stream to run. It is done here, on a CSRF-checked POST,
+    because a GET on the stream URL can come from any link or image.
+    """
+    payload = {
+        'ticket': issue_stream_ticket(request.user),
+        'expires_in': settings.SMARTPLAN_STREAM_TICKET_MAX_AGE,
+    }
+    if request.data.get('regenerate') in (True, 'true', '1'):
+        try:
+            plan = Plan.objects.get(id=request.data.get('plan'), user=request.user)
+        except (Plan.DoesNotExist, TypeError, ValueError):
+            return Response({'message': 'Plan not found'}, status=status.HTTP_404_NOT_FOUND)
+        job = queue_regeneration(plan)
+        # None: the plan is already generating and the stream follows that job
+        payload['job'] = job.id if job else None
+    return Response(payload)
+
+async def plan_stream(request, plan_id):
+    """Server-Sent Events feed of a plan's generation.
+
+    Runs the plan's queued generation job inline when there is one, otherwise
+    replays ``content`` (following along if a worker is generating it). A
+    fresh generation is queued through ``stream_ticket``, never by this GET.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await aget_request_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    try:
+        plan = await Plan.objects.select_related('user').aget(id=plan_id, user=user)
+    except Plan.DoesNotExist:
+        return JsonResponse({'message': 'Plan not found'}, status=404)
+
+    job = await aclaim_plan_job(plan)
+    events = stream_generation(plan, job) if job else follow_plan(plan.id)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def plan_export(request):
+    """Download all of the user's plans and their generations.
+
+    ``?format=ndjson`` (the default) or ``csv``; ``?gzip=1`` compresses the
+    file. Rows are streamed as they are read, so any account size exports
+    in constant memory.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+
+    user = await aget_request_user(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    export_format = request.GET.get('format', 'ndjson')
+    if export_format not in CONTENT_TYPES:
+        return JsonResponse({'error': f'Invalid format. Must be one of: {sorted(CONTENT_TYPES)}'}, status=400)
+    gzip = request.GET.get('gzip') in ('1', 'true')
+
+    # Pick the database now: replica routing ends before the body is sent
+    using = await sync_to_async(router.db_for_read)(Plan)
+    stream = export_stream(Plan.objects.filter(user=user), export_format, gzip, using)
+    if isinstance(request, ASGIRequest):
+        stream = aiterate(stream)
+    response = StreamingHttpResponse(stream, content_type='application/gzip' if gzip else CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename(export_format, gzip)}"'
+    response['Cache-Control'] = 'no-store'
+    response['X-Accel-Buffering'] = 'no'
+    return response